@@ -0,0 +1,333 @@
+"""
+Approximate Answers for Agentic BI
+Opt-in fast estimates for aggregate SQL over raw_sales_data, refined toward
+the exact answer: the query is rewritten onto the stratified sample
+(sample_tables.py) with every SUM / COUNT / AVG weighted back up to the
+whole table and a 95% error bound per estimated value; COUNT(DISTINCT) is
+answered from a HyperLogLog sketch where the engine has one (DuckDB)
+
+    plan = plan_approximation(sql, "duckdb", table_rows=catalog_rows)
+    for index, stage in enumerate(plan.stages):   # 10% of the sample, then all of it
+        estimate = estimate_result(run_query(stage.sql), plan, index)
+    exact = run_query(plan.exact_sql)
+
+Estimators are Horvitz-Thompson: a sampled row with weight w stands for w
+rows, so SUM(x) ~ SUM(w * x) with variance ~ SUM(w * (w - 1) * x^2), and
+AVG is the ratio of two such sums (linearized variance). Groups with no
+sampled rows are missing from an estimate; MIN/MAX, HAVING, joins,
+subqueries and window functions are never approximated.
+"""
+import copy
+import os
+
+import pandas as pd
+
+from sample_tables import SAMPLE_TABLE, SAMPLE_FRACTION, SAMPLE_BUCKETS
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # Approximation needs the rewriter - without sqlglot everything runs exactly
+    sqlglot = None
+
+BASE_TABLE = "raw_sales_data"
+# Smaller tables are answered exactly - a full scan is already fast
+APPROX_MIN_ROWS = int(os.getenv("AGENTIC_BI_APPROX_MIN_ROWS", 1_000_000))
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+# Sample buckets read by each stage before the exact answer (see sample_tables.py)
+STAGE_BUCKETS = (1, SAMPLE_BUCKETS)
+# Dialects with a HyperLogLog COUNT(DISTINCT)
+SKETCH_DIALECTS = {"duckdb"}
+# DuckDB's approx_count_distinct is a small sketch: ~13% standard error
+# (measured up to ~20% off), so +/-26% is reported as its 95% bound
+SKETCH_RELATIVE_ERROR = Z_95 * 0.13
+# Below this many distinct values an exact COUNT(DISTINCT) is as fast as the sketch
+SKETCH_MIN_DISTINCT = 100_000
+HELPER_PREFIX = "__approx_"
+
+_WEIGHTED = (exp.Sum, exp.Count, exp.Avg) if sqlglot else ()
+
+
+class _NotApproximable(Exception):
+    pass
+
+
+class Stage:
+    """
+    One approximate execution of a query
+
+    Attributes:
+        sql: SQL to run (estimates plus hidden helper columns for the bounds)
+        estimate_sql: The same without the helper columns (what the result
+            keeps as source_sql, e.g. for paging)
+        method: "sample" or "sketch"
+        fraction: Nominal share of the table's rows read
+        bounds: Output column -> (estimator: "total" / "mean" / "sketch",
+            helper columns)
+    """
+
+    def __init__(self, sql, estimate_sql, method, fraction, bounds):
+        self.sql = sql
+        self.estimate_sql = estimate_sql
+        self.method = method
+        self.fraction = fraction
+        self.bounds = bounds
+
+    @property
+    def helpers(self):
+        return [helper for _, helpers in self.bounds.values() for helper in helpers]
+
+    @property
+    def label(self):
+        if self.method == "sketch":
+            return "HyperLogLog distinct counts"
+        return f"~{self.fraction:.2%} stratified sample"
+
+
+class ApproximatePlan:
+    """Approximate stages of a query, fastest first, and the exact SQL they stand in for"""
+
+    def __init__(self, exact_sql, stages):
+        self.exact_sql = exact_sql
+        self.stages = stages
+
+
+class Approximation:
+    """
+    How an approximate QueryResult was computed (QueryResult.approximation)
+
+    Attributes:
+        plan: The ApproximatePlan
+        stage: Index of the stage that produced the result
+        bounds: Column -> Series of 95% half-widths (estimate +/- bound)
+        relative_error: Largest bound / |estimate| over all bounded values
+    """
+
+    def __init__(self, plan, stage, bounds, relative_error=None):
+        self.plan = plan
+        self.stage = stage
+        self.bounds = bounds
+        self.relative_error = relative_error
+
+    @property
+    def current(self):
+        return self.plan.stages[self.stage]
+
+    @property
+    def final(self):
+        """No faster estimate is left before the exact answer"""
+        return self.stage == len(self.plan.stages) - 1
+
+    def describe(self):
+        text = f"Approximate answer from a {self.current.label}"
+        if self.relative_error is not None:
+            text += f", within ±{self.relative_error:.1%} at 95% confidence"
+        return text
+
+    def with_bounds(self, frame):
+        """`frame` with a "± column" next to every estimated column"""
+        frame = frame.copy()
+        for column, bound in self.bounds.items():
+            frame.insert(frame.columns.get_loc(column) + 1, f"± {column}", bound.values)
+        return frame
+
+
+def _aggregate_of(projection):
+    """The single SUM/COUNT/AVG an output column is (possibly rounded / cast), else None"""
+    node = projection.this if isinstance(projection, exp.Alias) else projection
+    while isinstance(node, (exp.Round, exp.Cast, exp.Paren)):
+        node = node.this
+    return node if isinstance(node, _WEIGHTED) else None
+
+
+def _output_name(projection):
+    return projection.alias if isinstance(projection, exp.Alias) else projection.key
+
+
+def _analyze(tree):
+    """Which method can approximate `tree`, or _NotApproximable"""
+    if not isinstance(tree, exp.Select):
+        raise _NotApproximable("not a plain SELECT")
+    for unsupported in (exp.Join, exp.Subquery, exp.Window, exp.With):
+        if tree.find(unsupported):
+            raise _NotApproximable(f"uses {unsupported.__name__}")
+    if tree.args.get("distinct") or tree.args.get("having"):
+        raise _NotApproximable("uses DISTINCT / HAVING")
+    tables = list(tree.find_all(exp.Table))
+    if len(tables) != 1 or tables[0].name.lower() != BASE_TABLE:
+        raise _NotApproximable(f"does not read only {BASE_TABLE}")
+    aggregates = list(tree.find_all(exp.AggFunc))
+    if not aggregates:
+        raise _NotApproximable("no aggregates (a sample can't list rows)")
+    if any(not isinstance(star.parent, exp.Count) for star in tree.find_all(exp.Star)):
+        raise _NotApproximable("selects *")
+    distinct = [a for a in aggregates if isinstance(a.this, exp.Distinct)]
+    if any(not isinstance(a, exp.Count) for a in distinct):
+        raise _NotApproximable("SUM/AVG(DISTINCT)")
+    if distinct:
+        if any(len(a.this.expressions) != 1 for a in distinct):
+            raise _NotApproximable("multi-column COUNT(DISTINCT)")
+        return "sketch"
+    unsupported = {type(a).__name__ for a in aggregates if not isinstance(a, _WEIGHTED)}
+    if unsupported:
+        raise _NotApproximable(f"uses {', '.join(sorted(unsupported))}")
+    return "sample"
+
+
+def _name_outputs(tree):
+    # Keep the output names stable across the stages and the exact answer
+    for i, projection in enumerate(tree.expressions):
+        if not isinstance(projection, exp.Alias) and _aggregate_of(projection) is not None:
+            tree.expressions[i] = exp.alias_(projection, projection.key)
+
+
+def _sample_stage(tree, dialect, buckets):
+    """Stage reading sample buckets below `buckets`, weights scaled to the whole table"""
+    scale = SAMPLE_BUCKETS / buckets
+    w = "sample_weight" if scale == 1 else f"(sample_weight * {scale!r})"
+    parse = lambda sql: sqlglot.parse_one(sql, read=dialect)  # noqa: E731
+
+    def x_of(node):
+        return f"({node.this.sql(dialect=dialect)})"
+
+    def weighted(node):
+        if isinstance(node, exp.Table):
+            return exp.to_table(SAMPLE_TABLE).as_(node.alias or BASE_TABLE)
+        if isinstance(node, exp.Sum):
+            return parse(f"SUM({x_of(node)} * {w})")
+        if isinstance(node, exp.Count) and isinstance(node.this, exp.Star):
+            return parse(f"SUM({w})")
+        if isinstance(node, exp.Count):
+            return parse(f"SUM(CASE WHEN {x_of(node)} IS NOT NULL THEN {w} END)")
+        if isinstance(node, exp.Avg):
+            x = x_of(node)
+            return parse(f"SUM({x} * {w}) / NULLIF(SUM(CASE WHEN {x} IS NOT NULL THEN {w} END), 0)")
+        return node
+
+    helpers = []
+    bounds = {}
+    for i, projection in enumerate(tree.expressions):
+        aggregate = _aggregate_of(projection)
+        if aggregate is None:
+            continue
+        name = _output_name(projection)
+        if isinstance(aggregate, exp.Count) and isinstance(aggregate.this, exp.Star):
+            kind, terms = "total", [f"SUM({w} * ({w} - 1))"]
+        else:
+            x = x_of(aggregate)
+            notnull = f"CASE WHEN {x} IS NOT NULL THEN {{}} END"
+            if isinstance(aggregate, exp.Sum):
+                kind, terms = "total", [f"SUM({w} * ({w} - 1) * {x} * {x})"]
+            elif isinstance(aggregate, exp.Count):
+                kind, terms = "total", [f"SUM({notnull.format(f'{w} * ({w} - 1)')})"]
+            else:
+                kind, terms = "mean", [f"SUM({w} * ({w} - 1) * {x} * {x})", f"SUM({w} * ({w} - 1) * {x})",
+                                       f"SUM({notnull.format(f'{w} * ({w} - 1)')})",
+                                       f"SUM({notnull.format(w)})"]
+        columns = [f"{HELPER_PREFIX}{i}_{k}" for k in range(len(terms))]
+        helpers.extend(exp.alias_(parse(term), column) for term, column in zip(terms, columns))
+        bounds[name] = (kind, columns)
+
+    estimate = tree.transform(weighted)
+    if buckets < SAMPLE_BUCKETS:
+        estimate = estimate.where(f"sample_bucket < {buckets}", dialect=dialect)
+    with_helpers = estimate.copy()
+    with_helpers.set("expressions", with_helpers.expressions + helpers)
+    return Stage(with_helpers.sql(dialect=dialect), estimate.sql(dialect=dialect), "sample",
+                 SAMPLE_FRACTION * buckets / SAMPLE_BUCKETS, bounds)
+
+
+def _sketch_stage(tree, dialect):
+    """Stage with every COUNT(DISTINCT x) answered by a HyperLogLog sketch over the whole table"""
+    def sketched(node):
+        if isinstance(node, exp.Count) and isinstance(node.this, exp.Distinct):
+            return exp.ApproxDistinct(this=node.this.expressions[0].copy())
+        return node
+
+    bounds = {}
+    for projection in tree.expressions:
+        aggregate = _aggregate_of(projection)
+        if isinstance(aggregate, exp.Count) and isinstance(aggregate.this, exp.Distinct):
+            bounds[_output_name(projection)] = ("sketch", [])
+    sql = tree.transform(sketched).sql(dialect=dialect)
+    return Stage(sql, sql, "sketch", 1.0, bounds)
+
+
+def _few_distinct(tree, distinct_counts):
+    """Every COUNT(DISTINCT) is over a column known to have few values"""
+    for aggregate in tree.find_all(exp.Count):
+        if isinstance(aggregate.this, exp.Distinct):
+            column = aggregate.this.expressions[0]
+            known = distinct_counts.get(column.name) if isinstance(column, exp.Column) else None
+            if known is None or known >= SKETCH_MIN_DISTINCT:
+                return False
+    return True
+
+
+def plan_approximation(sql_query, dialect, table_rows=None, distinct_counts=None, min_rows=APPROX_MIN_ROWS):
+    """
+    Approximate stages for `sql_query`, or None when it should just run
+    exactly (not an approximable aggregate, a table below `min_rows`, or
+    COUNT(DISTINCT) where no sketch helps)
+
+    Args:
+        sql_query: Validated SQL over raw_sales_data
+        dialect: sqlglot dialect of the backend
+        table_rows: Rows in raw_sales_data, if known
+        distinct_counts: Column -> distinct values (from the schema catalog), if known
+        min_rows: Smallest table worth approximating
+    """
+    if sqlglot is None or (table_rows is not None and table_rows < min_rows):
+        return None
+    try:
+        tree = sqlglot.parse_one(sql_query, read=dialect)
+        method = _analyze(tree)
+    except (_NotApproximable, sqlglot.errors.SqlglotError):
+        return None
+    if method == "sketch" and (dialect not in SKETCH_DIALECTS or _few_distinct(tree, distinct_counts or {})):
+        return None
+    _name_outputs(tree)
+    exact_sql = tree.sql(dialect=dialect)
+    if method == "sketch":
+        return ApproximatePlan(exact_sql, [_sketch_stage(tree, dialect)])
+    return ApproximatePlan(exact_sql, [_sample_stage(tree, dialect, buckets) for buckets in STAGE_BUCKETS])
+
+
+def _numbers(series):
+    return pd.to_numeric(series, errors="coerce").astype("float64")
+
+
+def estimate_result(result, plan, index):
+    """
+    The QueryResult of stage `index` with its error bounds worked out and
+    the helper columns dropped (`result` itself, possibly a shared cached
+    entry, is left untouched)
+    """
+    stage = plan.stages[index]
+    frame = result.frame
+    bounds = {}
+    relative = []
+    for column, (kind, helpers) in stage.bounds.items():
+        if column not in frame.columns:
+            continue
+        value = _numbers(frame[column])
+        terms = [_numbers(frame[helper]) for helper in helpers]
+        if kind == "sketch":
+            variance = (SKETCH_RELATIVE_ERROR / Z_95 * value) ** 2
+        elif kind == "total":
+            variance = terms[0]
+        else:
+            squares, sums, weights, rows = terms
+            variance = (squares - 2 * value * sums + value * value * weights) / (rows * rows)
+        bound = Z_95 * variance.clip(lower=0) ** 0.5
+        bounds[column] = bound.reset_index(drop=True)
+        relative.append((bound / value.abs()).replace(float("inf"), float("nan")).max())
+    relative = [r for r in relative if pd.notna(r)]
+
+    estimate = copy.copy(result)
+    estimate.frame = frame.drop(columns=[h for h in stage.helpers if h in frame.columns])
+    estimate.db_types = {k: v for k, v in result.db_types.items() if not k.startswith(HELPER_PREFIX)}
+    estimate.source_sql = stage.estimate_sql
+    estimate.approximation = Approximation(plan, index, bounds, max(relative) if relative else None)
+    return estimate
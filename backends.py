@@ -0,0 +1,222 @@
+"""
+Database Backends for Agentic BI
+One config decides where the data lives: PostgreSQL (server) or an embedded,
+in-process engine - DuckDB over a local columnar file or straight over the
+raw CSVs, or SQLite
+"""
+import glob
+import os
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+
+# Configuration (AGENTIC_BI_BACKEND, AGENTIC_BI_DATABASE_URL, paths, PostgreSQL
+# parts) is read lazily through settings.py when the backend is first built
+from settings import get_settings
+
+BASE_TABLE = "raw_sales_data"
+
+
+class Backend:
+    """
+    Where queries run, plus what the rest of the app needs to know about it
+
+    Attributes:
+        name: Config name (postgres / duckdb / sqlite)
+        label: Human-readable engine name used in the prompt and UI
+        dialect: sqlglot dialect for parsing / generating SQL
+        schema: Schema holding the analytics tables (None = default)
+        embedded: True if the engine runs in-process (no server)
+        supports_rollups: Materialized rollups / index advisor available
+        prompt_hints: Dialect notes appended to the LLM prompt
+    """
+    name = None
+    label = None
+    dialect = None
+    schema = None
+    embedded = False
+    supports_rollups = False
+    prompt_hints = ""
+
+    def __init__(self, url):
+        self.url = url
+        self._engine = None
+
+    @property
+    def engine(self):
+        """SQLAlchemy engine, created on first use"""
+        if self._engine is None:
+            self._engine = self._create_engine()
+        return self._engine
+
+    def _create_engine(self):
+        return create_engine(self.url)
+
+    def rewrite_sql(self, sql_query):
+        """Backend-specific rewrite of generated SQL before it runs (none by default)"""
+        return sql_query
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.url!r})"
+
+
+class PostgresBackend(Backend):
+    name = "postgres"
+    label = "PostgreSQL"
+    dialect = "postgres"
+    schema = "public"
+    supports_rollups = True
+
+
+class DuckDBBackend(Backend):
+    """
+    Embedded vectorized engine over a local DuckDB file
+
+    Until something has been ingested, `raw_sales_data` is a view over the
+    CSV source, so questions can be answered straight from the files with
+    no load step at all. `python ingest_data.py` replaces it with a
+    columnar table. DuckDB allows one writing process per file: stop the
+    app before re-ingesting.
+    """
+    name = "duckdb"
+    label = "DuckDB"
+    dialect = "duckdb"
+    schema = "main"
+    embedded = True
+    prompt_hints = ("Use DuckDB SQL. Cast text dates with CAST(order_date AS DATE); "
+                    "date_trunc('month', ...) and strftime(...) work; ILIKE for case-insensitive matching.")
+
+    def __init__(self, url, csv_source=None):
+        super().__init__(url)
+        self.csv_source = csv_source or get_settings().csv_source
+
+    def _create_engine(self):
+        path = self.url.split("///", 1)[-1]
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        engine = create_engine(self.url)
+        self.attach_csv(engine)
+        return engine
+
+    def attach_csv(self, engine, table=BASE_TABLE):
+        """Expose the CSV source as `table` (a view, queried in place) if nothing was ingested"""
+        if not glob.glob(self.csv_source):
+            return
+        with engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = :table"
+            ), {"table": table}).scalar()
+            if not exists:
+                source = self.csv_source.replace("'", "''")
+                conn.execute(text(
+                    f"CREATE VIEW {table} AS SELECT * FROM read_csv_auto('{source}', normalize_names = true)"))
+
+
+class ParquetBackend(DuckDBBackend):
+    """
+    In-memory DuckDB over the partitioned Parquet tier (parquet_store.py)
+
+    Nothing but files: every connection maps raw_sales_data, the daily
+    summary and the approximate-answer sample onto the current Parquet
+    files, so a new ingestion is visible to the next query without locks
+    between the app and the loader.
+    Generated SQL gets order_month predicates derived from its order_date
+    filters, letting DuckDB skip whole month partitions; row groups are
+    skipped via the order_date statistics and only referenced columns are
+    read.
+    """
+    name = "parquet"
+    label = "DuckDB (Parquet)"
+    prompt_hints = ("Use DuckDB SQL. order_date is text: cast with CAST(order_date AS DATE). "
+                    "order_month is the 'YYYY-MM' partition of order_date; filtering on order_date or "
+                    "order_month ranges keeps queries fast.")
+
+    def __init__(self, url, root=None):
+        # Imported here: pyarrow is only needed when the Parquet tier is in use
+        import parquet_store
+        super().__init__(url)
+        self.root = root or parquet_store.PARQUET_DIR
+
+    def _create_engine(self):
+        # A fresh in-memory database per connection, so views always see the latest files
+        engine = create_engine(self.url, poolclass=NullPool)
+        event.listen(engine, "connect", self._attach_files)
+        return engine
+
+    def _attach_files(self, dbapi_connection, connection_record):
+        import parquet_store
+        cursor = dbapi_connection.cursor()
+        if parquet_store.dataset_exists(root=self.root):
+            cursor.execute(f"CREATE VIEW {BASE_TABLE} AS SELECT * FROM {parquet_store.read_sql(root=self.root)}")
+        for view, path in ((parquet_store.SUMMARY_TABLE, parquet_store.summary_path(self.root)),
+                           (parquet_store.SAMPLE_TABLE, parquet_store.sample_path(self.root))):
+            if os.path.exists(path):
+                cursor.execute(f"CREATE VIEW {view} AS "
+                               f"SELECT * FROM read_parquet('{path.replace(chr(39), chr(39) * 2)}')")
+        cursor.close()
+
+    def rewrite_sql(self, sql_query):
+        import parquet_store
+        return parquet_store.prune_sql(sql_query, dialect=self.dialect)
+
+
+class SQLiteBackend(Backend):
+    name = "sqlite"
+    label = "SQLite"
+    dialect = "sqlite"
+    embedded = True
+    prompt_hints = ("Use SQLite SQL. Dates are text: use date(order_date) / strftime('%Y-%m', order_date); "
+                    "there is no ILIKE or date_trunc.")
+
+    def _create_engine(self):
+        path = self.url.split("///", 1)[-1]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return create_engine(self.url)
+
+
+BACKENDS = {backend.name: backend for backend in (PostgresBackend, DuckDBBackend, ParquetBackend, SQLiteBackend)}
+
+
+def default_url(name, settings=None):
+    """SQLAlchemy URL a backend uses when no AGENTIC_BI_DATABASE_URL is given"""
+    settings = settings or get_settings()
+    return {
+        "postgres": settings.postgres_url,
+        "duckdb": f"duckdb:///{settings.duckdb_path}",
+        "parquet": "duckdb:///:memory:",
+        "sqlite": f"sqlite:///{settings.sqlite_path}",
+    }[name]
+
+
+def make_backend(name=None, url=None):
+    """
+    Backend for a config name and/or URL (defaults: AGENTIC_BI_BACKEND /
+    AGENTIC_BI_DATABASE_URL)
+
+    With only a URL, the backend is picked from its scheme
+    (duckdb:///..., sqlite:///..., anything else is PostgreSQL); the
+    Parquet tier is selected by name.
+    """
+    settings = get_settings()
+    name = (name or settings.backend or "").lower() or None
+    url = url or settings.database_url
+    if name is None:
+        scheme = url.split(":", 1)[0].split("+", 1)[0] if url else "postgres"
+        name = scheme if scheme in BACKENDS else "postgres"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](url or default_url(name, settings))
+
+
+_backend = None
+
+
+def get_backend():
+    """Process-wide backend from the AGENTIC_BI_* environment"""
+    global _backend
+    if _backend is None:
+        _backend = make_backend()
+    return _backend
@@ -0,0 +1,486 @@
+"""
+Offline Benchmark Suite for Agentic BI
+End-to-end numbers for ingestion and question answering against a local
+database, with a deterministic stand-in for Gemini - no network, no API key
+
+Usage:
+    python benchmark.py                                   # DuckDB, 200k rows
+    python benchmark.py --backend sqlite --rows 50000
+    python benchmark.py --backend postgres --database-url postgresql://...
+    python benchmark.py --llm-latency-ms 800 --rate-limit-rate 0.05
+    python benchmark.py --baseline .cache/benchmarks/bench-20260101-120000.json
+
+Results are written as JSON (--output); with --baseline every metric is
+compared against an earlier run and the exit code is 1 on a regression.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import datagen
+
+try:
+    import resource
+except ImportError:  # Windows - peak RSS is not reported
+    resource = None
+
+# Canned question -> SQL workload (portable across PostgreSQL, DuckDB and SQLite)
+WORKLOAD = [
+    ("What is the total sales amount?",
+     "SELECT SUM(sales_amount) AS total_sales FROM raw_sales_data"),
+    ("Sales by region",
+     "SELECT region, SUM(sales_amount) AS total_sales FROM raw_sales_data GROUP BY region ORDER BY total_sales DESC"),
+    ("Top 5 products by revenue",
+     "SELECT product_name, SUM(sales_amount) AS revenue FROM raw_sales_data "
+     "GROUP BY product_name ORDER BY revenue DESC LIMIT 5"),
+    ("Revenue by month",
+     "SELECT substr(CAST(order_date AS VARCHAR), 1, 7) AS month, SUM(sales_amount) AS revenue FROM raw_sales_data "
+     "GROUP BY 1 ORDER BY 1"),
+    ("Orders and average order value per customer type",
+     "SELECT customer_type, COUNT(*) AS orders, AVG(sales_amount) AS avg_order FROM raw_sales_data "
+     "GROUP BY customer_type"),
+    ("Category sales in the North since 2024",
+     "SELECT category, SUM(sales_amount) AS total_sales FROM raw_sales_data "
+     "WHERE region = 'North' AND order_date >= '2024-01-01' GROUP BY category ORDER BY total_sales DESC"),
+    ("Latest large orders",
+     "SELECT order_id, order_date, product_name, sales_amount FROM raw_sales_data "
+     "WHERE sales_amount > 100000 ORDER BY order_date DESC LIMIT 100"),
+    # Misspelled column: exercises the local SQL repair path
+    ("Average order value",
+     "SELECT AVG(sale_amount) AS avg_order FROM raw_sales_data"),
+]
+FALLBACK_SQL = "SELECT COUNT(*) AS orders FROM raw_sales_data"
+
+# Metric name suffix -> True if higher is better (used by --baseline)
+HIGHER_IS_BETTER = {"rows_per_s": True, "qps": True}
+
+
+# ============= DETERMINISTIC GEMINI STAND-IN =============
+
+class _Usage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class _Response:
+    def __init__(self, text, prompt_tokens, output_tokens):
+        self.text = text
+        self.usage_metadata = _Usage(prompt_tokens, output_tokens)
+
+
+class _StubModels:
+    def __init__(self, stub):
+        self._stub = stub
+
+    def generate_content(self, model, contents, **kwargs):
+        delay, response = self._stub._respond(contents)
+        time.sleep(delay)
+        return response
+
+
+class _StubAsyncModels:
+    def __init__(self, stub):
+        self._stub = stub
+
+    async def generate_content(self, model, contents, **kwargs):
+        delay, response = self._stub._respond(contents)
+        await asyncio.sleep(delay)
+        return response
+
+
+class _StubAio:
+    def __init__(self, stub):
+        self.models = _StubAsyncModels(stub)
+
+
+class StubGemini:
+    """
+    Drop-in for `genai.Client` that answers from a question -> SQL map
+
+    The question is read from the last "Question:" line of the prompt.
+    Latency and 429s are drawn from a seeded RNG, so two runs with the same
+    settings see the same delays and the same rate-limited calls.
+
+    Args:
+        answers: {question: sql}; unknown questions get `FALLBACK_SQL`
+        latency_ms: Mean response time
+        jitter_ms: Uniform +/- jitter around the mean
+        rate_limit_rate: Probability of raising a 429 instead of answering
+        seed: RNG seed
+
+    Example:
+        brain.client = StubGemini(dict(WORKLOAD), latency_ms=300)
+    """
+
+    def __init__(self, answers, latency_ms=300.0, jitter_ms=100.0, rate_limit_rate=0.0, seed=42):
+        self.answers = answers
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = _StubModels(self)
+        self.aio = _StubAio(self)
+
+    def _respond(self, prompt):
+        with self._lock:
+            self.calls += 1
+            limited = self._rng.random() < self.rate_limit_rate
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            if limited:
+                self.rate_limited += 1
+        if limited:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED (injected by benchmark stub)")
+        question = prompt.rsplit("Question:", 1)[-1].split("\n", 1)[0].strip()
+        sql = self.answers.get(question, FALLBACK_SQL)
+        return max(self.latency_ms + jitter, 0.0) / 1000, _Response(sql, len(prompt) // 4, len(sql) // 4)
+
+
+# ============= HELPERS =============
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarize(latencies):
+    """count / mean / p50 / p95 / p99 in milliseconds"""
+    ms = [seconds * 1000 for seconds in latencies]
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else None,
+        "p50_ms": _round(percentile(ms, 50)),
+        "p95_ms": _round(percentile(ms, 95)),
+        "p99_ms": _round(percentile(ms, 99)),
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def peak_rss_mb():
+    """Peak resident set size (MB) of this process and of its finished child processes"""
+    if resource is None:
+        return None, None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def configure_environment(args, workdir, csv_path):
+    """
+    Point every store at `workdir` and the chosen backend
+
+    Must run before brain / ingest_data are imported: they read the
+    environment at import time.
+    """
+    os.environ.update({
+        "AGENTIC_BI_BACKEND": args.backend,
+        "AGENTIC_BI_DATABASE_URL": args.database_url or "",
+        "AGENTIC_BI_DUCKDB_PATH": os.path.join(workdir, "bench.duckdb"),
+        "AGENTIC_BI_SQLITE_PATH": os.path.join(workdir, "bench.sqlite"),
+        "AGENTIC_BI_PARQUET_DIR": os.path.join(workdir, "parquet"),
+        "AGENTIC_BI_CSV": csv_path,
+        "AGENTIC_BI_CACHE_DB": os.path.join(workdir, "cache.sqlite"),
+        "AGENTIC_BI_QUERY_LOG": os.path.join(workdir, "query_log.sqlite"),
+        "AGENTIC_BI_USAGE_LOG": os.path.join(workdir, "llm_usage.sqlite"),
+        "AGENTIC_BI_QUOTA_DB": os.path.join(workdir, "quota.sqlite"),
+        "AGENTIC_BI_ROLLUP_LOG": os.path.join(workdir, "rollup_rewrites.jsonl"),
+        "AGENTIC_BI_TRACE_FILE": os.path.join(workdir, "traces.jsonl"),
+        # The stub has no quota; the scheduler must not be the bottleneck
+        "GEMINI_RPM": str(args.rpm),
+        "GEMINI_TPM": str(args.rpm * 100_000),
+    })
+    # The stub never sends it anywhere, but the SDK client wants one
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+
+# ============= BENCHMARKS =============
+
+def bench_ingest(csv_path, workers=None):
+    """Load `csv_path` with the backend's own ingestion path; rows/s and the worker processes used"""
+    import ingest_data
+    from sqlalchemy import text
+
+    backend = ingest_data.backend
+    start = time.perf_counter()
+    if backend.name == "parquet":
+        ingest_data.start_parquet_ingestion(csv_path)
+        workers = 1
+    elif backend.embedded:
+        ingest_data.start_embedded_ingestion(csv_path)
+        workers = 1
+    else:
+        # Same default as ingest_files: one worker per CPU
+        workers = workers or os.cpu_count() or 1
+        ingest_data.ingest_files(csv_path, workers=workers)
+    seconds = time.perf_counter() - start
+    with backend.engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT COUNT(*) FROM {ingest_data.table_name}")).scalar()
+    return {"rows": rows, "workers": workers, "seconds": round(seconds, 3),
+            "rows_per_s": round(rows / max(seconds, 1e-9), 1)}
+
+
+def reset_caches(brain):
+    """Forget translations, repairs and results (the next question is a cold miss)"""
+    brain.translation_cache.clear()
+    brain.repair_cache.clear()
+    brain.result_cache.clear()
+
+
+def ask(brain, question):
+    """(seconds, ok) for one ask_ai_about_data() call"""
+    start = time.perf_counter()
+    answer = brain.ask_ai_about_data(question)
+    return time.perf_counter() - start, not isinstance(answer, str)
+
+
+def bench_latency(brain, questions, iterations):
+    """Sequential latency: cold (every cache cleared first) and warm (cached)"""
+    cold, warm, errors = [], [], 0
+    for _ in range(iterations):
+        for question in questions:
+            reset_caches(brain)
+            seconds, ok = ask(brain, question)
+            cold.append(seconds)
+            errors += not ok
+        for question in questions:
+            ask(brain, question)  # Cache every answer again (the cold pass kept clearing them)
+        for question in questions:
+            seconds, ok = ask(brain, question)
+            warm.append(seconds)
+            errors += not ok
+    return {"cold": summarize(cold), "warm": summarize(warm), "errors": errors}
+
+
+def bench_concurrency(brain, questions, clients, requests_per_client):
+    """
+    `clients` threads (like Streamlit sessions) asking questions at once
+
+    Caches are cleared first, so each level starts cold and warms up as the
+    clients repeat the workload.
+    """
+    reset_caches(brain)
+
+    def client(index):
+        results = []
+        for i in range(requests_per_client):
+            results.append(ask(brain, questions[(index + i) % len(questions)]))
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = [r for batch in pool.map(client, range(clients)) for r in batch]
+    seconds = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "requests": len(results),
+        "seconds": round(seconds, 3),
+        "qps": round(len(results) / max(seconds, 1e-9), 2),
+        "errors": sum(not ok for _, ok in results),
+        **summarize([latency for latency, _ in results]),
+    }
+
+
+# ============= REGRESSION COMPARISON =============
+
+def flatten(results, prefix=""):
+    """Numeric leaves of a results dict as {"a.b.c": value}"""
+    flat = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(results, list):
+        for item in results:
+            label = f"clients={item['clients']}" if isinstance(item, dict) and "clients" in item else ""
+            flat.update(flatten(item, f"{prefix}{label}."))
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        flat[prefix.rstrip(".")] = results
+    return flat
+
+
+def _is_tracked(name):
+    last = name.rsplit(".", 1)[-1]
+    return last.endswith(("_ms", "_mb")) or last in ("seconds",) or last in HIGHER_IS_BETTER
+
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Print per-metric change vs. a baseline run; returns the regressed metric names
+
+    Latencies / seconds / memory regress when they grow by more than
+    `tolerance`, rows/s and qps when they shrink by more than it.
+    """
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    regressions = []
+    print(f"\n{'metric':<45} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(set(old) & set(new)):
+        if not _is_tracked(name) or not old[name]:
+            continue
+        change = (new[name] - old[name]) / old[name]
+        higher_is_better = HIGHER_IS_BETTER.get(name.rsplit(".", 1)[-1], False)
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        marker = "  ❌" if regressed else ""
+        print(f"{name:<45} {old[name]:>12,.2f} {new[name]:>12,.2f} {change:>+8.1%}{marker}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+# ============= MAIN =============
+
+def run(args):
+    # Collected up front: they may fork, and a fork of a big process inflates children's peak RSS
+    meta = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    workdir = args.workdir or tempfile.mkdtemp(prefix="agentic_bi_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    csv_path = args.csv or datagen.generate(args.rows, os.path.join(workdir, "generated"), seed=args.seed,
+                                            files=1, workers=1)[0]
+    configure_environment(args, workdir, csv_path)
+
+    results = {}
+    print(f"--- Ingest benchmark ({args.backend}) ---")
+    results["ingest"] = bench_ingest(csv_path, args.workers)
+    # Only PostgreSQL ingests in worker processes. Read now: creating the Gemini SDK
+    # client forks a helper that would mask them
+    ingest_workers_rss = peak_rss_mb()[1] if args.backend == "postgres" else None
+
+    import brain
+    from tracing import get_tracer
+    stub = StubGemini(dict(WORKLOAD), latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                      rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    brain.client = stub
+    brain.build_context()  # Catalog introspection isn't part of question latency
+
+    questions = [question for question, _ in WORKLOAD]
+    print(f"--- Latency benchmark ({args.iterations} x {len(questions)} questions) ---")
+    results["latency"] = bench_latency(brain, questions, args.iterations)
+
+    results["concurrency"] = []
+    for clients in args.clients:
+        print(f"--- Throughput benchmark ({clients} concurrent clients) ---")
+        results["concurrency"].append(bench_concurrency(brain, questions, clients, args.requests_per_client))
+
+    own, _ = peak_rss_mb()
+    results["memory"] = {"peak_rss_mb": own, "ingest_workers_peak_rss_mb": ingest_workers_rss}
+    results["llm"] = {"calls": stub.calls, "rate_limited": stub.rate_limited}
+    tracer = get_tracer()
+
+    return {
+        "meta": {**meta, "backend": brain.backend.name, "workdir": workdir},
+        "config": {
+            "rows": results["ingest"]["rows"],
+            "ingest_workers": results["ingest"]["workers"],
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "clients": args.clients,
+            "requests_per_client": args.requests_per_client,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "rate_limit_rate": args.rate_limit_rate,
+        },
+        "results": results,
+        # Where the time went, per span name (informational - not compared against baselines)
+        "stages": tracer.stage_stats(window=len(tracer.recent)),
+        # Stub token counts per question class (informational, like stages)
+        "llm_usage": brain.usage_log.report(),
+    }
+
+
+def print_summary(report):
+    results = report["results"]
+    ingest = results["ingest"]
+    print(f"\n📊 Benchmark ({report['meta']['backend']}, {ingest['rows']:,} rows)")
+    workers = f"{ingest['workers']} worker" + ("s" if ingest["workers"] != 1 else "")
+    print(f"   ingest: {ingest['rows_per_s']:,.0f} rows/s ({ingest['seconds']}s, {workers})")
+    for mode in ("cold", "warm"):
+        latency = results["latency"][mode]
+        print(f"   ask_ai_about_data {mode}: p50 {latency['p50_ms']} ms, "
+              f"p95 {latency['p95_ms']} ms, p99 {latency['p99_ms']} ms")
+    for level in results["concurrency"]:
+        print(f"   {level['clients']:>3} clients: {level['qps']} q/s, p95 {level['p95_ms']} ms, "
+              f"{level['errors']} errors")
+    memory = results["memory"]
+    workers_rss = memory["ingest_workers_peak_rss_mb"]
+    # Embedded backends ingest in-process: no worker RSS to show
+    workers_rss = f" (ingest workers {workers_rss} MB)" if workers_rss is not None else ""
+    print(f"   peak RSS: {memory['peak_rss_mb']} MB{workers_rss}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark (no network, no API key)")
+    parser.add_argument("--backend", default="duckdb", choices=["duckdb", "parquet", "sqlite", "postgres"],
+                        help="Database to benchmark against")
+    parser.add_argument("--database-url", help="SQLAlchemy URL (required for postgres)")
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows of generated data (see datagen.py)")
+    parser.add_argument("--csv", help="Use this CSV instead of generated data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, help="Ingest workers (PostgreSQL; default one per CPU)")
+    parser.add_argument("--iterations", type=int, default=5, help="Passes over the workload for latency")
+    parser.add_argument("--clients", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16],
+                        help="Comma-separated concurrent client counts")
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Stub Gemini mean latency")
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0, help="Stub Gemini latency jitter (+/-)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of stub calls returning 429")
+    parser.add_argument("--rpm", type=int, default=100_000, help="Quota scheduler requests/minute during the run")
+    parser.add_argument("--workdir", help="Directory for the database and caches (default: a temp dir)")
+    parser.add_argument("--output", help="JSON results file (default: .cache/benchmarks/bench-<time>.json)")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown vs. baseline")
+    args = parser.parse_args()
+    if args.backend == "postgres" and not args.database_url:
+        parser.error("--backend postgres needs --database-url")
+
+    report = run(args)
+    print_summary(report)
+
+    output = args.output or os.path.join(".cache", "benchmarks", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
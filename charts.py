@@ -0,0 +1,317 @@
+"""
+Chart Planning for Agentic BI
+Turns a QueryResult of any size into a small plot-ready frame: the chart type
+comes from the result's shape, many categories are rolled up into the top N
+plus "Other", numbers are binned, long time series are downsampled with LTTB
+and big scatters are sampled and drawn with WebGL, so the browser never gets
+more than a few thousand points
+
+    plan = plan_chart(result, run_query=brain.run_query, dialect=backend.dialect)
+    if plan is not None:
+        st.plotly_chart(build_figure(plan))
+
+A result cut by the row cap is aggregated in the database over its
+uncapped SQL (QueryResult.source_sql), so the chart covers every row even
+though the table only shows the first ones.
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+from tracing import span
+
+# Upper bounds on what reaches the browser
+MAX_LINE_POINTS = 2_000     # LTTB target for time series
+MAX_CATEGORIES = 30         # Bars; the rest are summed into "Other"
+MAX_SCATTER_POINTS = 5_000  # Sampled beyond this
+HISTOGRAM_BINS = 40
+# Line / scatter traces with more points than this are drawn with WebGL
+WEBGL_THRESHOLD = 1_000
+# Longest series fetched when aggregating a truncated result in the database
+MAX_DB_ROWS = 200_000
+OTHER_LABEL = "Other"
+
+# ISO dates / months / timestamps as text ("2024-03", "2024-03-01 10:00")
+_DATE_RE = re.compile(r"^\d{4}-\d{2}(-\d{2})?([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+
+
+class ChartPlan:
+    """
+    What to draw and how it was derived from the result
+
+    Attributes:
+        kind: 'line', 'bar', 'histogram' or 'scatter'
+        frame: Plot-ready data (bounded by the MAX_* limits)
+        x, y: Column names in `frame`
+        source_rows: Rows the chart summarizes
+        method: How `frame` was made: raw, summed, top_n, lttb, binned or sampled
+        in_database: True if the aggregation ran in the database
+        bar_width: Bin width for histograms
+        notes: Captions explaining any reduction
+    """
+
+    def __init__(self, kind, frame, x, y, source_rows, method="raw", in_database=False, bar_width=None, notes=None):
+        self.kind = kind
+        self.frame = frame
+        self.x = x
+        self.y = y
+        self.source_rows = source_rows
+        self.method = method
+        self.in_database = in_database
+        self.bar_width = bar_width
+        self.notes = notes or []
+
+    @property
+    def points(self):
+        return len(self.frame)
+
+    @property
+    def webgl(self):
+        return self.kind in ("line", "scatter") and self.points > WEBGL_THRESHOLD
+
+    def __repr__(self):
+        return (f"ChartPlan(kind={self.kind!r}, points={self.points}, source_rows={self.source_rows}, "
+                f"method={self.method!r}, in_database={self.in_database})")
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps
+
+    Splits the series into `threshold - 2` buckets and keeps, per bucket,
+    the point forming the largest triangle with the previously kept point
+    and the next bucket's average, so peaks and troughs survive. The first
+    and last points are always kept.
+
+    Args:
+        x: Ascending numeric positions
+        y: Values
+        threshold: Points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _is_time(series):
+    """Datetime column, or text / date objects that all look like ISO dates"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return False
+    sample = series.dropna().head(50).astype(str)
+    return len(sample) > 0 and bool(sample.str.match(_DATE_RE).all())
+
+
+def _from_database(run_query, sql):
+    """Frame for chart SQL, or None if it fails (the fetched rows are used instead)"""
+    try:
+        result = run_query(sql)
+    except Exception as e:
+        print(f"⚠️ Chart aggregation in the database failed ({e}), using the fetched rows")
+        return None
+    return result.frame if result.ok else None
+
+
+def _bars(frame, x, y, source_sql, run_query):
+    """Bars per category; beyond MAX_CATEGORIES the top ones plus "Other" """
+    if source_sql:
+        # Group totals and the grand total in one pass over the uncapped query
+        qx, qy = _quote(x), _quote(y)
+        data = _from_database(run_query, (
+            f"SELECT {qx} AS {qx}, SUM({qy}) AS {qy}, COUNT(*) OVER () AS chart_groups, "
+            f"SUM(SUM({qy})) OVER () AS chart_total, SUM(COUNT(*)) OVER () AS chart_rows "
+            f"FROM ({source_sql}) AS chart_source GROUP BY {qx} ORDER BY 2 DESC LIMIT {MAX_CATEGORIES}"))
+        if data is not None and len(data):
+            groups, total, rows = (data[c].iloc[0] for c in ("chart_groups", "chart_total", "chart_rows"))
+            top = data[[x, y]]
+            notes = [f"{y} summed per {x} over all {int(rows):,} rows in the database"]
+            if groups > len(top):
+                top = pd.concat([top, pd.DataFrame({x: [OTHER_LABEL], y: [total - top[y].sum()]})],
+                                ignore_index=True)
+                notes.append(f"Top {MAX_CATEGORIES} of {int(groups):,} {x} values; the rest are in '{OTHER_LABEL}'")
+            return ChartPlan("bar", top, x, y, int(rows), "summed", in_database=True, notes=notes)
+
+    rows = len(frame)
+    if frame[x].is_unique:
+        # Already one row per category: keep the query's own order
+        if rows <= MAX_CATEGORIES:
+            return ChartPlan("bar", frame[[x, y]], x, y, rows)
+        top = frame[[x, y]].nlargest(MAX_CATEGORIES, y)
+        return ChartPlan("bar", top, x, y, rows, "top_n",
+                         notes=[f"Top {MAX_CATEGORIES} of {rows:,} {x} values by {y}"])
+
+    sums = frame.groupby(x, dropna=False, sort=False)[y].sum().sort_values(ascending=False)
+    top = sums.head(MAX_CATEGORIES).reset_index()
+    notes = [f"{y} summed per {x} over {rows:,} rows"]
+    if len(sums) > MAX_CATEGORIES:
+        top = pd.concat([top, pd.DataFrame({x: [OTHER_LABEL], y: [sums.iloc[MAX_CATEGORIES:].sum()]})],
+                        ignore_index=True)
+        notes.append(f"Top {MAX_CATEGORIES} of {len(sums):,} {x} values; the rest are in '{OTHER_LABEL}'")
+    return ChartPlan("bar", top, x, y, rows, "summed", notes=notes)
+
+
+def _line(frame, x, y, source_sql, run_query):
+    """Time series, summed per timestamp and downsampled with LTTB"""
+    data, in_database = None, False
+    rows = len(frame)
+    if source_sql:
+        qx, qy = _quote(x), _quote(y)
+        data = _from_database(run_query, (
+            f"SELECT {qx} AS {qx}, SUM({qy}) AS {qy}, COUNT(*) AS chart_rows FROM ({source_sql}) AS chart_source "
+            f"GROUP BY {qx} ORDER BY {qx} LIMIT {MAX_DB_ROWS}"))
+        if data is not None:
+            in_database = True
+            rows = int(data["chart_rows"].sum())
+            data = data[[x, y]]
+    if data is None:
+        data = frame[[x, y]]
+        if not data[x].is_unique:
+            data = data.groupby(x, dropna=False, sort=False)[y].sum().reset_index()
+
+    series = pd.DataFrame({x: pd.to_datetime(data[x], errors="coerce"),
+                           y: pd.to_numeric(data[y], errors="coerce")}).dropna().sort_values(x)
+    series = series.reset_index(drop=True)
+    notes = [f"{y} summed per {x} over all {rows:,} rows in the database"] if in_database else []
+    method = "summed" if in_database or len(series) < rows else "raw"
+    if len(series) > MAX_LINE_POINTS:
+        positions = series[x].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        keep = lttb(positions, series[y].to_numpy(dtype=float), MAX_LINE_POINTS)
+        notes.append(f"Downsampled {len(series):,} points to {MAX_LINE_POINTS:,} "
+                     f"(LTTB keeps the peaks and troughs)")
+        series = series.iloc[keep].reset_index(drop=True)
+        method = "lttb"
+    return ChartPlan("line", series, x, y, rows, method, in_database=in_database, notes=notes)
+
+
+def _histogram(frame, column, source_sql, run_query, dialect):
+    """Distribution of one numeric column in HISTOGRAM_BINS equal-width bins"""
+    if source_sql:
+        qc = _quote(column)
+        source = f"({source_sql}) AS chart_source"
+        bounds = _from_database(run_query, f"SELECT MIN({qc}) AS lo, MAX({qc}) AS hi, COUNT({qc}) AS n FROM {source}")
+        if bounds is not None and len(bounds) and pd.notna(bounds["lo"].iloc[0]):
+            lo, hi, n = float(bounds["lo"].iloc[0]), float(bounds["hi"].iloc[0]), int(bounds["n"].iloc[0])
+            width = (hi - lo) / HISTOGRAM_BINS or 1.0
+            offset = f"({qc} - {lo!r}) / {width!r}"
+            # SQLite has no FLOOR; the offset is never negative, so truncation is the same
+            bucket = f"CAST({offset} AS INTEGER)" if dialect == "sqlite" else f"FLOOR({offset})"
+            counts = _from_database(run_query, (
+                f"SELECT {bucket} AS bin, COUNT(*) AS n FROM {source} WHERE {qc} IS NOT NULL GROUP BY 1 ORDER BY 1"))
+            if counts is not None:
+                # The maximum lands one past the last bin
+                bins = counts["bin"].astype(int).clip(upper=HISTOGRAM_BINS - 1)
+                totals = counts["n"].groupby(bins).sum().reindex(range(HISTOGRAM_BINS), fill_value=0)
+                binned = pd.DataFrame({column: lo + (totals.index.to_numpy() + 0.5) * width,
+                                       "count": totals.to_numpy()})
+                return ChartPlan("histogram", binned, column, "count", n, "binned", in_database=True,
+                                 bar_width=width,
+                                 notes=[f"{column} binned over all {n:,} rows in the database"])
+
+    values = pd.to_numeric(frame[column], errors="coerce").dropna().to_numpy(dtype=float)
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    binned = pd.DataFrame({column: (edges[:-1] + edges[1:]) / 2, "count": counts})
+    return ChartPlan("histogram", binned, column, "count", len(values), "binned",
+                     bar_width=float(edges[1] - edges[0]) or None)
+
+
+def _scatter(frame, x, y):
+    """Two measures against each other, sampled beyond MAX_SCATTER_POINTS"""
+    points = frame[[x, y]].dropna()
+    rows = len(points)
+    if rows <= MAX_SCATTER_POINTS:
+        return ChartPlan("scatter", points, x, y, rows)
+    # Fixed seed: the same result always draws the same sample
+    sample = points.sample(n=MAX_SCATTER_POINTS, random_state=0).sort_index()
+    return ChartPlan("scatter", sample, x, y, rows, "sampled",
+                     notes=[f"Showing a random {MAX_SCATTER_POINTS:,} of {rows:,} points"])
+
+
+def plan_chart(result, run_query=None, dialect="postgres"):
+    """
+    Pick a chart for a result and reduce it to a bounded number of points
+
+    First column of dates + a measure -> line; text + a measure -> bars;
+    a numeric key with few values + a measure -> bars; two measures ->
+    scatter; a single measure -> histogram.
+
+    Args:
+        result: QueryResult from run_query() / ask_ai_about_data_frame()
+        run_query: brain.run_query, used to aggregate results cut by the row
+            cap in the database (None = only the fetched rows)
+        dialect: sqlglot dialect of the backend (histogram bin SQL)
+
+    Returns:
+        ChartPlan, or None if there's nothing worth charting
+    """
+    frame = result.frame
+    if frame is None or len(frame) < 2:
+        return None
+    numeric = [c for c in frame.columns
+               if pd.api.types.is_numeric_dtype(frame[c]) and not pd.api.types.is_bool_dtype(frame[c])]
+    if not numeric:
+        return None
+    source_sql = result.source_sql if result.truncated and run_query is not None else None
+
+    with span("chart.plan", rows=len(frame), truncated=result.truncated) as plan_span:
+        first = frame.columns[0]
+        if first not in numeric:
+            if _is_time(frame[first]):
+                plan = _line(frame, first, numeric[0], source_sql, run_query)
+            else:
+                plan = _bars(frame, first, numeric[0], source_sql, run_query)
+        elif len(numeric) >= 2 and frame[first].nunique() <= MAX_CATEGORIES:
+            plan = _bars(frame, first, numeric[1], source_sql, run_query)
+        elif len(numeric) >= 2:
+            plan = _scatter(frame, first, numeric[1])
+        else:
+            plan = _histogram(frame, first, source_sql, run_query, dialect)
+        if result.truncated and not plan.in_database:
+            plan.notes.append(f"Chart covers the first {len(frame):,} rows (row cap)")
+        plan_span.set(kind=plan.kind, points=plan.points, method=plan.method, in_database=plan.in_database)
+    return plan
+
+
+def build_figure(plan, title="📊 Sales Breakdown"):
+    """Plotly figure for a ChartPlan (WebGL traces above WEBGL_THRESHOLD points)"""
+    # Imported here: plotly is only needed once a chart is actually drawn
+    import plotly.express as px
+
+    render_mode = "webgl" if plan.webgl else "svg"
+    if plan.kind == "line":
+        fig = px.line(plan.frame, x=plan.x, y=plan.y, title=title, render_mode=render_mode)
+    elif plan.kind == "scatter":
+        fig = px.scatter(plan.frame, x=plan.x, y=plan.y, title=title, render_mode=render_mode)
+    else:
+        fig = px.bar(plan.frame, x=plan.x, y=plan.y, title=title)
+        if plan.kind == "histogram":
+            fig.update_traces(width=plan.bar_width)
+            fig.update_layout(bargap=0)
+    fig.update_layout(
+        height=400,
+        template="plotly_dark",
+        hovermode="closest" if plan.kind == "scatter" else "x unified"
+    )
+    return fig
@@ -0,0 +1,234 @@
+"""
+Synthetic Sales Data Generator for Agentic BI
+Production-sized `raw_sales_data` at a chosen scale factor (SF 1 = 1M rows,
+SF 0.001 = 1K, SF 1000 = 1B), with Zipf-skewed product popularity and
+seasonal order dates, written as CSV or Parquet shards by worker processes
+
+Usage:
+    python datagen.py --scale-factor 0.1                    # 100K rows -> data/generated/*.csv
+    python datagen.py --scale-factor 100 --format parquet --workers 8
+    python datagen.py --rows 5000000 --files 16 --output data/shards
+    python ingest_data.py --files 'data/generated/*.csv'
+
+Chunks are generated with NumPy, one at a time, so memory stays flat no
+matter how many rows are produced. Every chunk is seeded from (seed, first
+row), so the same seed, row count, file count and chunk size give
+byte-identical files for any number of workers.
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # CSV via pandas; Parquet unavailable
+    pa = None
+
+ROWS_PER_SCALE_FACTOR = 1_000_000
+COLUMNS = ["order_id", "order_date", "product_name", "category", "sales_amount", "region", "customer_type"]
+
+# category -> [(product, typical unit price)]
+PRODUCTS = {
+    "Electronics": [("Laptop", 75000), ("Smart Phone", 45000), ("Monitor", 15000), ("Tablet", 30000),
+                    ("Keyboard", 3000), ("Mouse", 1500), ("Headphones", 4000), ("Printer", 12000),
+                    ("Webcam", 3500), ("External Hard Drive", 6000)],
+    "Furniture": [("Office Chair", 12000), ("Desk Lamp", 2500), ("Standing Desk", 28000), ("Bookshelf", 9000),
+                  ("Filing Cabinet", 11000), ("Conference Table", 45000), ("Sofa", 35000)],
+    "Office Supplies": [("Notebook", 150), ("Pen Set", 300), ("Stapler", 450), ("Paper Ream", 350),
+                        ("Whiteboard", 4000), ("Desk Organizer", 800)],
+    "Appliances": [("Coffee Machine", 18000), ("Air Purifier", 14000), ("Water Dispenser", 9000),
+                   ("Microwave", 8000), ("Mini Fridge", 16000)],
+}
+# Product lines per base product: "Laptop", "Laptop Pro", ...
+VARIANTS = [("", 1.0), (" Pro", 1.6), (" Lite", 0.7), (" Max", 2.1), (" Plus", 1.25), (" Mini", 0.6)]
+
+REGIONS = (["North", "South", "West", "East"], [0.32, 0.27, 0.23, 0.18])
+CUSTOMER_TYPES = (["Consumer", "Corporate", "Home Office"], [0.52, 0.30, 0.18])
+# Average units per order line by customer type (Corporate orders in bulk)
+UNITS_BY_CUSTOMER = np.array([1.2, 4.0, 1.6])
+
+ZIPF_EXPONENT = 1.1
+# Relative order volume per calendar month (festive-season peak in Oct-Dec)
+MONTH_WEIGHTS = np.array([0.85, 0.80, 0.95, 0.90, 0.95, 0.90, 0.95, 1.00, 1.05, 1.25, 1.40, 1.50])
+# Monday..Sunday
+WEEKDAY_WEIGHTS = np.array([1.10, 1.05, 1.05, 1.05, 1.10, 0.85, 0.80])
+YEARLY_GROWTH = 0.15
+
+
+def rows_for_scale_factor(scale_factor):
+    return max(int(round(scale_factor * ROWS_PER_SCALE_FACTOR)), 1)
+
+
+def build_catalog(seed=42):
+    """
+    Product table: names, categories, base prices and Zipf popularity
+
+    Popularity ranks are shuffled with `seed`, so best sellers are spread
+    across categories instead of following the list order.
+    """
+    names, categories, prices = [], [], []
+    for category, products in PRODUCTS.items():
+        for product, price in products:
+            for suffix, multiplier in VARIANTS:
+                names.append(product + suffix)
+                categories.append(category)
+                prices.append(price * multiplier)
+    ranks = np.random.default_rng(seed).permutation(len(names)) + 1
+    popularity = 1.0 / ranks ** ZIPF_EXPONENT
+    return {
+        "product_name": np.array(names, dtype=object),
+        "category": np.array(categories, dtype=object),
+        "price": np.array(prices),
+        "cdf": np.cumsum(popularity) / popularity.sum(),
+    }
+
+
+def build_calendar(start_date="2023-01-01", years=2):
+    """Days of the range plus the cumulative share of orders placed by each day"""
+    days = pd.date_range(start_date, periods=int(round(365.25 * years)), freq="D")
+    elapsed_years = np.asarray((days - days[0]).days) / 365.25
+    weights = (MONTH_WEIGHTS[np.asarray(days.month) - 1] * WEEKDAY_WEIGHTS[np.asarray(days.dayofweek)]
+               * (1 + YEARLY_GROWTH) ** elapsed_years)
+    return {"days": np.array(days.strftime("%Y-%m-%d"), dtype=object), "cdf": np.cumsum(weights) / weights.sum()}
+
+
+def _pick(rng, n, choices):
+    values, weights = choices
+    return np.array(values, dtype=object)[rng.choice(len(values), size=n, p=weights)]
+
+
+def generate_chunk(start, n, total_rows, seed, catalog, calendar):
+    """
+    Rows [start, start + n) of the dataset as a DataFrame
+
+    Order dates follow the seasonal calendar and never decrease with
+    order_id (like a real order table), so consecutive chunks cover
+    consecutive date ranges.
+    """
+    rng = np.random.default_rng([seed, start])
+    position = (np.arange(start, start + n) + rng.random(n)) / total_rows
+    day = np.minimum(np.searchsorted(calendar["cdf"], position, side="right"), len(calendar["cdf"]) - 1)
+    product = np.minimum(np.searchsorted(catalog["cdf"], rng.random(n), side="right"), len(catalog["cdf"]) - 1)
+
+    customer = rng.choice(len(CUSTOMER_TYPES[0]), size=n, p=CUSTOMER_TYPES[1])
+    units = 1 + rng.poisson(UNITS_BY_CUSTOMER[customer] - 1)
+    unit_price = catalog["price"][product] * rng.lognormal(0.0, 0.12, n)
+    return pd.DataFrame({
+        "order_id": np.arange(start + 1, start + n + 1, dtype=np.int64),
+        "order_date": calendar["days"][day],
+        "product_name": catalog["product_name"][product],
+        "category": catalog["category"][product],
+        "sales_amount": np.round(unit_price * units, 2),
+        "region": _pick(rng, n, REGIONS),
+        "customer_type": np.array(CUSTOMER_TYPES[0], dtype=object)[customer],
+    }, columns=COLUMNS)
+
+
+def _write_file(path, fmt, first_row, rows, total_rows, seed, chunk_size, start_date, years):
+    """Generate rows [first_row, first_row + rows) into one file, chunk by chunk"""
+    catalog = build_catalog(seed)
+    calendar = build_calendar(start_date, years)
+    staging = f"{path}.tmp"
+    writer = None
+    start_time = time.perf_counter()
+    try:
+        for start in range(first_row, first_row + rows, chunk_size):
+            n = min(chunk_size, first_row + rows - start)
+            chunk = generate_chunk(start, n, total_rows, seed, catalog, calendar)
+            if fmt == "parquet":
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(staging, table.schema, compression="zstd")
+                writer.write_table(table)
+            elif pa is not None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pa_csv.CSVWriter(staging, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(staging, mode="a" if start > first_row else "w",
+                             header=start == first_row, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(staging, path)
+    return {"path": path, "rows": rows, "seconds": time.perf_counter() - start_time, "pid": os.getpid()}
+
+
+def generate(rows, output_dir=os.path.join("data", "generated"), fmt="csv", seed=42, files=None,
+             workers=os.cpu_count(), chunk_size=500_000, start_date="2023-01-01", years=2):
+    """
+    Write `rows` synthetic sales rows as `files` shards under `output_dir`
+
+    Args:
+        rows: Total rows (see rows_for_scale_factor())
+        output_dir: Directory for part-NNNNN.csv / .parquet (old parts are removed)
+        fmt: 'csv' or 'parquet'
+        seed: Same seed + rows + files + chunk_size -> identical files
+        files: Number of shards (default: one per 10M rows)
+        workers: Worker processes (each writes whole files)
+        chunk_size: Rows generated per vectorized step (bounds memory per worker)
+        start_date: First order date
+        years: Length of the order history
+
+    Returns:
+        Sorted list of written file paths
+    """
+    if fmt == "parquet" and pa is None:
+        raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+    files = files or max((rows + 9_999_999) // 10_000_000, 1)
+    files = min(files, rows)
+    os.makedirs(output_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(output_dir, "part-*")):
+        os.remove(old)
+
+    bounds = np.linspace(0, rows, files + 1).astype(np.int64)
+    tasks = [(os.path.join(output_dir, f"part-{i:05d}.{fmt}"), fmt, int(bounds[i]), int(bounds[i + 1] - bounds[i]),
+              rows, seed, chunk_size, start_date, years) for i in range(files)]
+
+    print(f"--- Generating {rows:,} rows as {files} {fmt} file(s) in '{output_dir}' "
+          f"with {min(workers, files)} worker(s) (seed {seed}) ---")
+    start_time = time.perf_counter()
+    paths = []
+    if workers <= 1 or files == 1:
+        for task in tasks:
+            paths.append(_write_file(*task)["path"])
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, files)) as pool:
+            futures = [pool.submit(_write_file, *task) for task in tasks]
+            for future in as_completed(futures):
+                stat = future.result()
+                paths.append(stat["path"])
+                print(f"   ✅ {stat['path']} (pid {stat['pid']}): {stat['rows']:,} rows in {stat['seconds']:.1f}s")
+    elapsed = time.perf_counter() - start_time
+    size = sum(os.path.getsize(p) for p in paths)
+    print(f"✅ {rows:,} rows ({size / 1e6:,.1f} MB) in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return sorted(paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic sales data at a TPC-H-style scale factor")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--scale-factor", type=float, default=1.0,
+                      help=f"{ROWS_PER_SCALE_FACTOR:,} rows per unit (0.001 = 1K rows, 1000 = 1B rows)")
+    size.add_argument("--rows", type=int, help="Exact row count (overrides --scale-factor)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", default=os.path.join("data", "generated"), help="Output directory")
+    parser.add_argument("--files", type=int, help="Number of output shards (default: one per 10M rows)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="Rows per vectorized chunk")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-date", default="2023-01-01", help="First order date")
+    parser.add_argument("--years", type=float, default=2, help="Years of order history")
+    args = parser.parse_args()
+
+    generate(args.rows or rows_for_scale_factor(args.scale_factor), args.output, args.format, seed=args.seed,
+             files=args.files, workers=args.workers, chunk_size=args.chunk_size,
+             start_date=args.start_date, years=args.years)
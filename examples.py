@@ -42,10 +42,11 @@ except RateLimitError as e:
     print("Try again in a few hours")
 
 
-# Example 4: Batch Queries with Rate Limiting
+# Example 4: Batch Queries (concurrent)
 # ============================================
 
-import time
+import asyncio
+from brain import ask_many
 
 questions = [
     "What are our top products?",
@@ -53,20 +54,13 @@ questions = [
     "What are the customer segments?",
 ]
 
-for i, question in enumerate(questions, 1):
+# Up to 3 questions in flight at once; answers come back in question order
+answers = asyncio.run(ask_many(questions, concurrency=3))
+
+for i, (question, answer) in enumerate(zip(questions, answers), 1):
     print(f"\n[Query {i}/{len(questions)}]")
     print(f"Q: {question}")
-    
-    try:
-        answer = ask_ai_about_data(question)
-        print(f"A: {answer}\n")
-    except Exception as e:
-        print(f"Error: {e}\n")
-    
-    # Be nice to the API - add delay between requests
-    if i < len(questions):
-        print("⏳ Waiting 2 seconds before next request...")
-        time.sleep(2)
+    print(f"A: {answer}\n")
 
 
 # Example 5: Test Everything First
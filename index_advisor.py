@@ -0,0 +1,498 @@
+"""
+Index Advisor for Agentic BI
+Logs every executed SQL statement with its timing, mines the log for
+filtered / joined / grouped / sorted columns, and recommends the indexes
+whose benefit EXPLAIN confirms with hypothetical indexes
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from sqlalchemy import text
+
+from query_cache import _connect, canonicalize_sql, fingerprint, referenced_tables
+from query_guard import estimate_cost
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # The log still records; mining needs the parser
+    sqlglot = None
+
+QUERY_LOG_PATH = os.getenv("AGENTIC_BI_QUERY_LOG", os.path.join(".cache", "query_log.sqlite"))
+INDEX_PREFIX = "idx_advisor_"
+
+
+# ============= WORKLOAD LOG =============
+
+class QueryLog:
+    """
+    SQLite log of executed SQL with elapsed time and row count
+
+    Only real executions are logged (result-cache hits cost the database
+    nothing). The oldest entries are pruned beyond `max_entries`. Indexes
+    applied by the advisor are recorded too, so speedups can be measured and
+    the indexes re-created when a full load replaces the table.
+
+    Args:
+        path: SQLite file holding the log
+        max_entries: Statements kept (oldest pruned first)
+
+    Example:
+        query_log = QueryLog()
+        query_log.record(sql, elapsed=0.84, row_count=12)
+    """
+
+    def __init__(self, path=QUERY_LOG_PATH, max_entries=50_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._conn = _connect(path)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS query_log (
+                ts REAL NOT NULL,
+                fingerprint TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                elapsed_ms REAL NOT NULL,
+                row_count INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS query_log_fp ON query_log (fingerprint, ts);
+            CREATE TABLE IF NOT EXISTS applied_indexes (
+                name TEXT PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                columns TEXT NOT NULL,
+                applied_at REAL NOT NULL
+            );
+        """)
+
+    def record(self, sql, elapsed, row_count=None):
+        """Log one execution (`elapsed` in seconds)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO query_log (ts, fingerprint, sql, elapsed_ms, row_count) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), fingerprint(canonicalize_sql(sql)), sql, elapsed * 1000, row_count),
+            )
+            self._inserts += 1
+            if self._inserts % 500 == 0:
+                self._conn.execute(
+                    "DELETE FROM query_log WHERE rowid <= (SELECT MAX(rowid) FROM query_log) - ?",
+                    (self.max_entries,),
+                )
+
+    def workload(self, limit=200, since=None):
+        """
+        Distinct statements, heaviest first
+
+        Returns:
+            List of dicts: fingerprint, sql (latest text), calls, total_ms
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT fingerprint, MAX(sql), COUNT(*), SUM(elapsed_ms)
+                FROM query_log WHERE ts >= ?
+                GROUP BY fingerprint ORDER BY SUM(elapsed_ms) DESC LIMIT ?
+            """, (since or 0, limit)).fetchall()
+        return [{"fingerprint": fp, "sql": sql, "calls": calls, "total_ms": total_ms}
+                for fp, sql, calls, total_ms in rows]
+
+    def timings(self, fingerprint_, before=None, after=None):
+        """Elapsed times (ms) of one statement, optionally within a time window"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT elapsed_ms FROM query_log WHERE fingerprint = ? AND ts >= ? AND ts < ?",
+                (fingerprint_, after or 0, before or float("inf")),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_applied(self, name, table_name, columns):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO applied_indexes (name, table_name, columns, applied_at) VALUES (?, ?, ?, ?)",
+                (name, table_name, ",".join(columns), time.time()),
+            )
+
+    def applied(self, table_name=None):
+        """Indexes applied by the advisor: list of (name, table, columns, applied_at)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, table_name, columns, applied_at FROM applied_indexes "
+                "WHERE ? IS NULL OR table_name = ? ORDER BY applied_at",
+                (table_name, table_name),
+            ).fetchall()
+        return [(name, table, tuple(columns.split(",")), applied_at) for name, table, columns, applied_at in rows]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM query_log")
+
+
+_query_log = None
+
+
+def get_query_log():
+    """Process-wide QueryLog"""
+    global _query_log
+    if _query_log is None:
+        _query_log = QueryLog()
+    return _query_log
+
+
+# ============= WORKLOAD MINING =============
+
+_EQUALITY = (exp.EQ, exp.In, exp.Is) if sqlglot else ()
+_RANGE = (exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between, exp.Like) if sqlglot else ()
+
+
+def _plain_columns(node):
+    """Columns that are direct operands of a predicate (not wrapped in a function/cast)"""
+    for operand in node.args.values():
+        while isinstance(operand, exp.Paren):
+            operand = operand.this
+        if isinstance(operand, exp.Column):
+            yield operand
+
+
+def _predicate_columns(select):
+    """(role, column) pairs for one SELECT; roles: eq, range, join, group, order"""
+    where = select.args.get("where")
+    if where is not None:
+        for predicate in where.find_all(*_EQUALITY, *_RANGE):
+            role = "eq" if isinstance(predicate, _EQUALITY) else "range"
+            for column in _plain_columns(predicate):
+                yield role, column
+    for join in select.args.get("joins") or []:
+        condition = join.args.get("on")
+        if condition is not None:
+            for predicate in condition.find_all(exp.EQ):
+                for column in _plain_columns(predicate):
+                    yield "join", column
+    group = select.args.get("group")
+    if group is not None:
+        for column in group.expressions:
+            if isinstance(column, exp.Column):
+                yield "group", column
+    order = select.args.get("order")
+    if order is not None:
+        for ordered in order.expressions:
+            if isinstance(ordered.this, exp.Column):
+                yield "order", ordered.this
+
+
+def extract_candidates(sql):
+    """
+    Candidate indexes for one statement: set of (table, columns) tuples
+
+    Every filtered, joined, grouped or sorted column becomes a single-column
+    candidate; equality filters plus one range filter on the same table also
+    form a composite candidate (equality columns first).
+    """
+    if sqlglot is None:
+        return set()
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except Exception:
+        return set()
+    candidates = set()
+    for select in tree.find_all(exp.Select):
+        tables = {table.alias_or_name: table.name for table in select.find_all(exp.Table)}
+        by_table = {}
+        for role, column in _predicate_columns(select):
+            if column.table:
+                table = tables.get(column.table)
+            else:
+                table = next(iter(tables.values())) if len(set(tables.values())) == 1 else None
+            if not table:
+                continue
+            name = column.name
+            candidates.add((table, (name,)))
+            roles = by_table.setdefault(table, {"eq": [], "range": []})
+            if role in roles and name not in roles[role]:
+                roles[role].append(name)
+        for table, roles in by_table.items():
+            composite = sorted(roles["eq"]) + [c for c in roles["range"][:1] if c not in roles["eq"]]
+            if len(composite) > 1:
+                candidates.add((table, tuple(composite[:3])))
+    return candidates
+
+
+# ============= BENEFIT ESTIMATION =============
+
+class IndexRecommendation:
+    """A candidate index and the planner-cost improvement it buys"""
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = tuple(columns)
+        self.benefit = 0.0
+        self.queries = []  # (sql, calls, cost_before, cost_after)
+
+    @property
+    def name(self):
+        return f"{INDEX_PREFIX}{self.table}_{'_'.join(self.columns)}"[:63]
+
+    @property
+    def definition(self):
+        columns = ", ".join(f'"{c}"' for c in self.columns)
+        return f'ON "{self.table}" ({columns})'
+
+    @property
+    def ddl(self):
+        return f'CREATE INDEX IF NOT EXISTS "{self.name}" {self.definition}'
+
+    def __repr__(self):
+        return f"IndexRecommendation({self.table}({', '.join(self.columns)}), benefit={self.benefit:,.0f})"
+
+
+def existing_indexes(conn):
+    """Column lists of current indexes: set of (table, columns)"""
+    rows = conn.execute(text("""
+        SELECT t.relname, array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE n.nspname = current_schema()
+        GROUP BY i.indexrelid, t.relname
+    """)).fetchall()
+    return {(table, tuple(columns)) for table, columns in rows}
+
+
+def _table_columns(conn):
+    """Columns of every ordinary table: {table: set(columns)}"""
+    rows = conn.execute(text("""
+        SELECT c.relname, a.attname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE n.nspname = current_schema() AND c.relkind = 'r'
+    """)).fetchall()
+    columns = {}
+    for table, column in rows:
+        columns.setdefault(table, set()).add(column)
+    return columns
+
+
+def _has_hypopg(conn):
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS hypopg"))
+        return True
+    except Exception:
+        return False
+
+
+def _cost_with_index(conn, recommendation, statements, hypopg):
+    """Planner cost of each statement with `recommendation` in place (nothing persists)"""
+    if hypopg:
+        conn.execute(text("SELECT * FROM hypopg_create_index(:ddl)"),
+                     {"ddl": f"CREATE INDEX {recommendation.definition}"})
+        try:
+            return [estimate_cost(conn, sql) for sql in statements]
+        finally:
+            conn.execute(text("SELECT hypopg_reset()"))
+    # No HypoPG: build the index in a savepoint, EXPLAIN, roll it back
+    savepoint = conn.begin_nested()
+    try:
+        conn.execute(text(recommendation.ddl))
+        return [estimate_cost(conn, sql) for sql in statements]
+    finally:
+        savepoint.rollback()
+
+
+def recommend_indexes(engine, query_log=None, max_indexes=5, min_improvement=0.2, workload_limit=200):
+    """
+    Recommend indexes for the logged workload
+
+    Each candidate is evaluated against every logged statement on its table
+    by comparing EXPLAIN costs with and without the index - via HypoPG
+    hypothetical indexes when the extension is available, otherwise with a
+    real index created and rolled back inside a savepoint (this briefly
+    blocks writes to the table). A candidate is kept if it cuts the cost of
+    at least one statement by `min_improvement`; benefit is the cost saved
+    weighted by how often each statement ran.
+
+    Returns:
+        List of IndexRecommendation, highest benefit first
+    """
+    if sqlglot is None:
+        print("⚠️ sqlglot not installed - index advisor disabled")
+        return []
+    if engine.dialect.name != "postgresql":
+        print("⚠️ The index advisor needs PostgreSQL")
+        return []
+    query_log = query_log or get_query_log()
+    workload = query_log.workload(limit=workload_limit)
+
+    candidates = {}
+    for entry in workload:
+        for table, columns in extract_candidates(entry["sql"]):
+            candidates.setdefault((table, columns), []).append(entry)
+    if not candidates:
+        return []
+
+    recommendations = []
+    with engine.connect() as conn:
+        with conn.begin():
+            table_columns = _table_columns(conn)
+            covered = existing_indexes(conn)
+            hypopg = _has_hypopg(conn)
+            baseline = {}
+            for entry in workload:
+                try:
+                    with conn.begin_nested():
+                        baseline[entry["fingerprint"]] = estimate_cost(conn, entry["sql"])
+                except Exception:
+                    pass  # no longer valid against the current schema
+
+            for (table, columns), entries in candidates.items():
+                # Aliases (ORDER BY total) and already-indexed prefixes are not candidates
+                if not set(columns) <= table_columns.get(table, set()):
+                    continue
+                if any(t == table and c[:len(columns)] == columns for t, c in covered):
+                    continue
+                statements = [e for e in workload
+                              if e["fingerprint"] in baseline and table in referenced_tables(e["sql"])]
+                recommendation = IndexRecommendation(table, columns)
+                try:
+                    with conn.begin_nested():
+                        costs = _cost_with_index(conn, recommendation, [e["sql"] for e in statements], hypopg)
+                except Exception as e:
+                    print(f"⚠️ Could not evaluate {recommendation.ddl}: {e}")
+                    continue
+                best = 0.0
+                for entry, cost in zip(statements, costs):
+                    before = baseline[entry["fingerprint"]]
+                    if before > 0 and cost < before:
+                        recommendation.benefit += entry["calls"] * (before - cost)
+                        recommendation.queries.append((entry["sql"], entry["calls"], before, cost))
+                        best = max(best, 1 - cost / before)
+                if best >= min_improvement:
+                    recommendations.append(recommendation)
+            conn.rollback()
+
+    recommendations.sort(key=lambda r: r.benefit, reverse=True)
+    chosen = []
+    for recommendation in recommendations:
+        # A composite index already chosen also serves its leading column
+        if any(c.table == recommendation.table and c.columns[:len(recommendation.columns)] == recommendation.columns
+               for c in chosen):
+            continue
+        chosen.append(recommendation)
+        if len(chosen) >= max_indexes:
+            break
+    return chosen
+
+
+# ============= APPLYING & REPORTING =============
+
+def apply_recommendations(engine, recommendations, query_log=None):
+    """Create the recommended indexes and remember them for reports / reloads"""
+    query_log = query_log or get_query_log()
+    for recommendation in recommendations:
+        with engine.begin() as conn:
+            conn.execute(text(recommendation.ddl))
+            conn.execute(text(f'ANALYZE "{recommendation.table}"'))
+        query_log.record_applied(recommendation.name, recommendation.table, recommendation.columns)
+        print(f"✅ Created index {recommendation.name} (estimated benefit {recommendation.benefit:,.0f})")
+
+
+def reapply_indexes(cursor, table_name, query_log=None):
+    """
+    Re-create advisor indexes on a freshly loaded `table_name`
+
+    Called by full loads after the staging table is swapped in, since the
+    replaced table took its indexes with it.
+    """
+    query_log = query_log or get_query_log()
+    for name, _, columns, _ in query_log.applied(table_name):
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        try:
+            cursor.execute("SAVEPOINT reapply_index")
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table_name}" ({column_list})')
+            cursor.execute("RELEASE SAVEPOINT reapply_index")
+        except Exception as e:
+            # Column gone in the new data - skip this index, keep the load
+            cursor.execute("ROLLBACK TO SAVEPOINT reapply_index")
+            print(f"⚠️ Could not re-create index {name}: {e}")
+
+
+def _indexes_serving(sql, applied):
+    """(name, applied_at) of the applied indexes whose leading column `sql` filters, joins, groups or sorts by"""
+    used = {}
+    for table, columns in extract_candidates(sql):
+        used.setdefault(table, set()).update(columns)
+    return [(name, applied_at) for name, table, columns, applied_at in applied if columns[0] in used.get(table, ())]
+
+
+def speedup_report(query_log=None, min_samples=1):
+    """
+    Which logged statements got faster after the advisor's indexes
+
+    Each statement is compared only against the indexes that can serve it
+    (on its own tables, leading with a column it filters, joins, groups or
+    sorts by): its median elapsed time before the first of them vs after
+    the last. Only executions that reached the database are logged - repeats
+    answered from the result cache are not counted on either side.
+
+    Returns:
+        List of dicts (sql, indexes, before_ms, after_ms, before_runs,
+        after_runs, speedup), biggest speedup first
+    """
+    query_log = query_log or get_query_log()
+    applied = query_log.applied()
+    report = []
+    for entry in query_log.workload():
+        indexes = _indexes_serving(entry["sql"], applied)
+        if not indexes:
+            continue
+        before = query_log.timings(entry["fingerprint"], before=min(ts for _, ts in indexes))
+        after = query_log.timings(entry["fingerprint"], after=max(ts for _, ts in indexes))
+        if len(before) < min_samples or len(after) < min_samples:
+            continue
+        before_ms, after_ms = statistics.median(before), statistics.median(after)
+        report.append({
+            "sql": entry["sql"],
+            "indexes": [name for name, _ in indexes],
+            "before_ms": before_ms,
+            "after_ms": after_ms,
+            "before_runs": len(before),
+            "after_runs": len(after),
+            "speedup": before_ms / after_ms if after_ms else float("inf"),
+        })
+    report.sort(key=lambda r: r["speedup"], reverse=True)
+    return report
+
+
+def print_recommendations(recommendations):
+    if not recommendations:
+        print("No index would meaningfully help the logged workload.")
+        return
+    for recommendation in recommendations:
+        print(f"💡 {recommendation.ddl}  -- estimated benefit {recommendation.benefit:,.0f}")
+        for sql, calls, before, after in sorted(recommendation.queries, key=lambda q: q[2] - q[3], reverse=True)[:3]:
+            print(f"     {calls}x cost {before:,.0f} -> {after:,.0f}: {sql[:100]}")
+
+
+if __name__ == "__main__":
+    from ingest_data import engine
+
+    parser = argparse.ArgumentParser(description="Recommend indexes from the logged query workload")
+    parser.add_argument("--apply", action="store_true", help="Create the recommended indexes")
+    parser.add_argument("--report", action="store_true", help="Show which queries got faster after applied indexes")
+    parser.add_argument("--max-indexes", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.report:
+        print("Database executions only - repeats served from the result cache are not counted.")
+        for row in speedup_report():
+            print(f"⚡ {row['speedup']:.1f}x ({row['before_ms']:.0f} ms over {row['before_runs']} runs -> "
+                  f"{row['after_ms']:.0f} ms over {row['after_runs']} runs): {row['sql'][:100]}")
+    else:
+        found = recommend_indexes(engine, max_indexes=args.max_indexes)
+        print_recommendations(found)
+        if args.apply:
+            apply_recommendations(engine, found)
@@ -0,0 +1,256 @@
+"""
+LLM Usage Accounting for Agentic BI
+Per-question token and latency ledger for the Gemini calls (from the SDK's
+usage metadata), plus a report of what prompt compaction and the caches
+save per question class
+
+    python llm_usage.py            # report
+    python llm_usage.py --clear
+"""
+import argparse
+import atexit
+import os
+import statistics
+import threading
+import time
+
+from query_cache import _connect, question_terms
+
+USAGE_LOG_PATH = os.getenv("AGENTIC_BI_USAGE_LOG", os.path.join(".cache", "llm_usage.sqlite"))
+# Fallback characters per token before any real counts are logged
+CHARS_PER_TOKEN = 4.0
+
+# (class, words that put a question in it) - first match wins
+QUESTION_CLASSES = (
+    ("trend", {"date", "growth", "over"}),
+    ("ranking", {"top", "best", "highest", "lowest", "most", "least", "bottom", "rank", "worst", "biggest"}),
+    ("breakdown", {"per", "each", "breakdown", "split", "share", "distribution", "compare"}),
+    ("count", {"many", "count", "number"}),
+    ("total", {"total", "sum", "average", "avg", "mean", "overall"}),
+)
+
+
+def question_class(question):
+    """Coarse kind of question (trend, ranking, breakdown, count, total, other)"""
+    terms = question_terms(question)
+    for name, words in QUESTION_CLASSES:
+        if terms & words:
+            return name
+    # "sales by region" - stopwords drop the "by", so look for it directly
+    return "breakdown" if " by " in f" {question.lower()} " else "other"
+
+
+class QuestionUsage:
+    """
+    Tally of one question's Gemini calls
+
+    Args:
+        question: The question asked
+        prompt_chars: Size of the compact prompt sent for it
+        full_prompt_chars: Size the prompt would have had with the whole schema
+
+    `shared` is set when the question was answered by a concurrent identical
+    question's call (a single-flight waiter) - its own tally stays empty and
+    it is logged as a cache hit.
+    """
+
+    def __init__(self, question, prompt_chars=0, full_prompt_chars=0):
+        self.question = question
+        self.prompt_chars = prompt_chars
+        self.full_prompt_chars = full_prompt_chars
+        self.cache_hit = False
+        self.shared = False
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.llm_ms = 0.0
+
+    def add_call(self, tokens, elapsed_ms):
+        """Count one generate_content call (`tokens` as from brain.token_counts())"""
+        self.calls += 1
+        self.prompt_tokens += tokens.get("prompt_tokens") or 0
+        self.output_tokens += tokens.get("output_tokens") or 0
+        self.llm_ms += elapsed_ms
+
+
+class UsageLog:
+    """
+    SQLite ledger with one row per question: class, whether the answer came
+    from a cache (or a concurrent identical question), Gemini calls, prompt
+    and output tokens, LLM time, and compact vs full prompt size
+
+    Rows are buffered and written in batches (every `flush_every` questions
+    or `flush_seconds`), so a cached answer doesn't wait for a commit.
+
+    Args:
+        path: SQLite file holding the ledger
+        max_entries: Questions kept (oldest pruned first)
+        flush_every: Max questions buffered before writing
+        flush_seconds: Max age of the buffer before writing
+
+    Example:
+        usage_log = UsageLog()
+        usage_log.record(usage)
+        for row in usage_log.report(): ...
+    """
+
+    def __init__(self, path=USAGE_LOG_PATH, max_entries=50_000, flush_every=32, flush_seconds=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._buffer = []
+        self._flushed_at = time.monotonic()
+        self._conn = _connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                ts REAL NOT NULL,
+                question_class TEXT NOT NULL,
+                question TEXT NOT NULL,
+                cache_hit INTEGER NOT NULL,
+                calls INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                llm_ms REAL NOT NULL,
+                prompt_chars INTEGER NOT NULL,
+                full_prompt_chars INTEGER NOT NULL
+            )
+        """)
+
+    def record(self, usage):
+        """Log one answered question (a QuestionUsage)"""
+        row = (time.time(), question_class(usage.question), usage.question[:500], int(usage.cache_hit or usage.shared),
+               usage.calls, usage.prompt_tokens, usage.output_tokens, usage.llm_ms,
+               usage.prompt_chars, usage.full_prompt_chars)
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_every or time.monotonic() - self._flushed_at >= self.flush_seconds:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        self._flushed_at = time.monotonic()
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        self._conn.execute("BEGIN")
+        self._conn.executemany("INSERT INTO llm_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._conn.execute("COMMIT")
+        previous, self._inserts = self._inserts, self._inserts + len(rows)
+        if previous // 500 != self._inserts // 500:
+            self._conn.execute(
+                "DELETE FROM llm_usage WHERE rowid <= (SELECT MAX(rowid) FROM llm_usage) - ?",
+                (self.max_entries,),
+            )
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def rows(self, since=None):
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute(
+                "SELECT question_class, cache_hit, calls, prompt_tokens, output_tokens, llm_ms, "
+                "prompt_chars, full_prompt_chars FROM llm_usage WHERE ts >= ?", (since or 0,)).fetchall()
+
+    def report(self, since=None):
+        """
+        Tokens and latency saved per question class
+
+        - calls_avoided: questions answered without Gemini (translation
+          cache, or sharing a concurrent identical question's call)
+        - prompt_tokens_saved: compact vs whole-schema prompt, converted to
+          tokens with the measured characters-per-token ratio
+        - ms_saved: avoided calls x the class's mean LLM time, plus the
+          saved prompt tokens x the fitted cost of one prompt token
+
+        Returns:
+            List of dicts, one per class, busiest first
+        """
+        rows = self.rows(since)
+        called = [row for row in rows if row[2]]
+        measured_chars = sum(row[6] for row in called if row[3])
+        measured_tokens = sum(row[3] / row[2] for row in called if row[3])
+        chars_per_token = measured_chars / measured_tokens if measured_tokens else CHARS_PER_TOKEN
+        ms_per_prompt_token = _prompt_token_cost(called)
+
+        by_class = {}
+        for row in rows:
+            by_class.setdefault(row[0], []).append(row)
+        report = []
+        for name, class_rows in by_class.items():
+            class_called = [row for row in class_rows if row[2]]
+            calls = sum(row[2] for row in class_called)
+            call_ms = sum(row[5] for row in class_called) / calls if calls else 0.0
+            avoided = sum(1 for row in class_rows if not row[2])
+            tokens_saved = sum(row[7] - row[6] for row in class_called) / chars_per_token
+            report.append({
+                "class": name,
+                "questions": len(class_rows),
+                "llm_calls": calls,
+                "calls_avoided": avoided,
+                "avg_prompt_tokens": sum(row[3] for row in class_called) / calls if calls else None,
+                "avg_output_tokens": sum(row[4] for row in class_called) / calls if calls else None,
+                "p50_llm_ms": statistics.median(row[5] / row[2] for row in class_called) if class_called else None,
+                "prompt_tokens_saved": int(tokens_saved),
+                "prompt_saved_pct": (100 * sum(row[7] - row[6] for row in class_called)
+                                     / max(sum(row[7] for row in class_called), 1)),
+                "ms_saved": avoided * call_ms + tokens_saved * ms_per_prompt_token,
+            })
+        report.sort(key=lambda entry: -entry["questions"])
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._buffer = []
+            self._conn.execute("DELETE FROM llm_usage")
+
+
+def _prompt_token_cost(called):
+    """
+    Milliseconds per prompt token from a least-squares fit of
+    ms/call = a + b * prompt tokens + c * output tokens (0 until there is
+    enough spread in the logged calls to fit it)
+    """
+    samples = [(row[3] / row[2], row[4] / row[2], row[5] / row[2]) for row in called if row[3]]
+    if len(samples) < 8 or len({round(prompt) for prompt, _, _ in samples}) < 3:
+        return 0.0
+    import numpy as np
+    design = np.array([[1.0, prompt, output] for prompt, output, _ in samples])
+    coefficients, *_ = np.linalg.lstsq(design, np.array([ms for _, _, ms in samples]), rcond=None)
+    return max(float(coefficients[1]), 0.0)
+
+
+_usage_log = None
+
+
+def get_usage_log():
+    """Process-wide UsageLog"""
+    global _usage_log
+    if _usage_log is None:
+        _usage_log = UsageLog()
+        atexit.register(_usage_log.flush)
+    return _usage_log
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token and latency savings per question class")
+    parser.add_argument("--hours", type=float, help="Only questions from the last N hours")
+    parser.add_argument("--clear", action="store_true", help="Empty the ledger")
+    args = parser.parse_args()
+
+    usage_log = get_usage_log()
+    if args.clear:
+        usage_log.clear()
+        print("✅ LLM usage ledger cleared")
+    else:
+        since = time.time() - args.hours * 3600 if args.hours else None
+        print(f"{'class':<10} {'questions':>9} {'calls':>6} {'avoided':>7} {'prompt tok':>10} {'output tok':>10} "
+              f"{'p50 ms':>8} {'tok saved':>10} {'saved %':>7} {'ms saved':>10}")
+        for row in usage_log.report(since):
+            print(f"{row['class']:<10} {row['questions']:>9,} {row['llm_calls']:>6,} {row['calls_avoided']:>7,} "
+                  f"{row['avg_prompt_tokens'] or 0:>10,.0f} {row['avg_output_tokens'] or 0:>10,.0f} "
+                  f"{row['p50_llm_ms'] or 0:>8,.0f} {row['prompt_tokens_saved']:>10,} "
+                  f"{row['prompt_saved_pct']:>6.0f}% {row['ms_saved']:>10,.0f}")
@@ -0,0 +1,317 @@
+"""
+Parquet Storage Tier for Agentic BI
+Ingested sales history as compressed Parquet, hive-partitioned by order month
+(optionally region), plus predicate rewriting so DuckDB only opens the
+partitions and row groups a generated query can touch
+"""
+import os
+import re
+import shutil
+
+from summary_tables import SUMMARY_TABLE, _aggregate_sql
+from sample_tables import SAMPLE_TABLE, sample_sql
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # Parquet tier unavailable - ingest_data.py reports it
+    pa = None
+
+try:
+    import duckdb
+except ImportError:  # Needed to query the tier (and build its summary)
+    duckdb = None
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # No pruning hints - DuckDB still prunes row groups on order_date stats
+    sqlglot = None
+
+PARQUET_DIR = os.getenv("AGENTIC_BI_PARQUET_DIR", os.path.join("data", "parquet"))
+BASE_TABLE = "raw_sales_data"
+DATE_COLUMN = "order_date"
+PARTITION_COLUMN = "order_month"
+REGION_COLUMN = "region"
+# Rows whose order_date isn't an ISO date (or is missing)
+UNKNOWN_PARTITION = "unknown"
+
+_ISO_MONTH_RE = re.compile(r"^(\d{4})-(\d{2})")
+ARROW_TYPES = {"int": "int64", "float": "float64", "text": "string"}
+
+
+def dataset_path(table=BASE_TABLE, root=PARQUET_DIR):
+    return os.path.join(root, table)
+
+
+def summary_path(root=PARQUET_DIR):
+    return os.path.join(root, f"{SUMMARY_TABLE}.parquet")
+
+
+def sample_path(root=PARQUET_DIR):
+    return os.path.join(root, f"{SAMPLE_TABLE}.parquet")
+
+
+def dataset_exists(table=BASE_TABLE, root=PARQUET_DIR):
+    return os.path.isdir(dataset_path(table, root))
+
+
+def read_sql(table=BASE_TABLE, root=PARQUET_DIR):
+    """DuckDB table function reading the dataset (partition values stay text)"""
+    files = os.path.join(dataset_path(table, root), "**", "*.parquet").replace("'", "''")
+    return (f"read_parquet('{files}', hive_partitioning = true, "
+            f"hive_types_autocast = false, union_by_name = true)")
+
+
+# ============= WRITING =============
+
+def order_month(dates):
+    """'YYYY-MM' partition key of each order_date, UNKNOWN_PARTITION if not ISO"""
+    months = dates.astype("string").str.extract(r"^(\d{4}-\d{2})", expand=False)
+    return months.fillna(UNKNOWN_PARTITION)
+
+
+def _arrow_schema(schema):
+    return pa.schema([(column, ARROW_TYPES[kind]) for column, kind in schema.items()])
+
+
+def write_partitioned(chunks, schema, table=BASE_TABLE, root=PARQUET_DIR, by_region=False,
+                      compression="zstd", row_group_size=128_000):
+    """
+    Write DataFrame chunks as a hive-partitioned Parquet dataset
+
+    Each chunk is sorted by order_date before writing, so the min/max
+    statistics of every row group cover a narrow date range and DuckDB can
+    skip row groups as well as whole partitions. The dataset is built in a
+    staging directory and swapped in when complete.
+
+    Args:
+        chunks: Iterable of normalized DataFrames, already coerced to `schema`
+        schema: Column -> kind ('int' / 'float' / 'text'), shared by all chunks
+        table: Dataset name (directory under `root`)
+        root: Parquet root directory
+        by_region: Also partition by region (order_month=.../region=...)
+        compression: Parquet codec
+        row_group_size: Max rows per row group
+
+    Returns:
+        Number of rows written
+    """
+    partition_columns = [PARTITION_COLUMN] + ([REGION_COLUMN] if by_region else [])
+    file_schema = _arrow_schema(schema)
+    partitioning = ds.partitioning(
+        pa.schema([(column, pa.string()) for column in partition_columns]), flavor="hive")
+    file_options = ds.ParquetFileFormat().make_write_options(compression=compression, write_statistics=True)
+
+    final = dataset_path(table, root)
+    staging = f"{final}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    total_rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk = chunk.copy()
+        chunk[PARTITION_COLUMN] = order_month(chunk[DATE_COLUMN])
+        if by_region:
+            chunk[REGION_COLUMN] = chunk[REGION_COLUMN].fillna(UNKNOWN_PARTITION)
+        chunk = chunk.sort_values(partition_columns + [DATE_COLUMN], kind="stable")
+        arrow_table = pa.Table.from_pandas(chunk[list(schema)], schema=file_schema, preserve_index=False)
+        for column in partition_columns:
+            if column not in schema:
+                arrow_table = arrow_table.append_column(column, pa.array(chunk[column], pa.string()))
+        ds.write_dataset(
+            arrow_table, staging, format="parquet", partitioning=partitioning,
+            basename_template=f"chunk{i:05d}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore",
+            file_options=file_options, max_rows_per_group=row_group_size,
+            min_rows_per_group=min(row_group_size, 10_000), max_partitions=100_000,
+        )
+        total_rows += len(chunk)
+
+    _swap_directory(staging, final)
+    return total_rows
+
+
+def _swap_directory(staging, final):
+    """Replace `final` with `staging` (readers see the old or the new dataset)"""
+    old = f"{final}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(final):
+        os.rename(final, old)
+    os.rename(staging, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def write_summary(table=BASE_TABLE, root=PARQUET_DIR):
+    """Write the dashboard's daily summary of the dataset as a single small Parquet file"""
+    target = summary_path(root)
+    staging = f"{target}.staging"
+    with duckdb.connect() as conn:
+        conn.execute(f"COPY ({_aggregate_sql(read_sql(table, root))}) "
+                     f"TO '{staging.replace(chr(39), chr(39) * 2)}' (FORMAT parquet, COMPRESSION zstd)")
+    os.replace(staging, target)
+
+
+def write_sample(table=BASE_TABLE, root=PARQUET_DIR):
+    """Write the stratified sample of the dataset (see sample_tables.py) as a single Parquet file"""
+    target = sample_path(root)
+    staging = f"{target}.staging"
+    with duckdb.connect() as conn:
+        conn.execute(f"COPY ({sample_sql(read_sql(table, root), 'duckdb')}) "
+                     f"TO '{staging.replace(chr(39), chr(39) * 2)}' (FORMAT parquet, COMPRESSION zstd)")
+    os.replace(staging, target)
+
+
+# ============= PARTITION PRUNING =============
+
+def _month_of(node):
+    """'YYYY-MM' from a string / DATE literal, else None"""
+    while isinstance(node, (exp.Cast, exp.TryCast, exp.Paren)):
+        node = node.this
+    if isinstance(node, exp.Literal) and node.is_string:
+        match = _ISO_MONTH_RE.match(node.name)
+        if match:
+            return f"{match.group(1)}-{match.group(2)}"
+    return None
+
+
+def _date_column(node):
+    """The order_date column if `node` is order_date (possibly cast), else None"""
+    while isinstance(node, (exp.Cast, exp.TryCast, exp.Paren)):
+        node = node.this
+    if isinstance(node, exp.Column) and node.name.lower() == DATE_COLUMN:
+        return node
+    return None
+
+
+def _year_column(node):
+    """The order_date column if `node` extracts its year, else None"""
+    if isinstance(node, exp.Year):
+        return _date_column(node.this)
+    if isinstance(node, exp.Extract) and node.this.name.upper() == "YEAR":
+        return _date_column(node.expression)
+    if isinstance(node, exp.Anonymous) and node.name.lower() in ("date_part", "datepart") \
+            and len(node.expressions) == 2 and node.expressions[0].name.lower() == "year":
+        return _date_column(node.expressions[1])
+    return None
+
+
+_FLIP = {exp.GT: exp.LT, exp.GTE: exp.LTE, exp.LT: exp.GT, exp.LTE: exp.GTE, exp.EQ: exp.EQ} if sqlglot else {}
+
+
+def _month_bounds(predicate):
+    """(date column, lowest month, highest month) implied by one conjunct, or None"""
+    if isinstance(predicate, exp.Between):
+        column = _date_column(predicate.this)
+        low, high = _month_of(predicate.args.get("low")), _month_of(predicate.args.get("high"))
+        return (column, low, high) if column is not None and (low or high) else None
+
+    if isinstance(predicate, exp.In):
+        column = _year_column(predicate.this)
+        years = [e.name for e in predicate.expressions if isinstance(e, exp.Literal) and e.name.isdigit()]
+        if column is None or len(years) != len(predicate.expressions) or not years:
+            return None
+        return column, f"{min(years)}-01", f"{max(years)}-12"
+
+    if type(predicate) not in _FLIP:
+        return None
+    left, right, op = predicate.this, predicate.expression, type(predicate)
+    if _date_column(right) is not None or _year_column(right) is not None:
+        left, right, op = right, left, _FLIP[op]
+
+    column = _year_column(left)
+    if column is not None:
+        if not (isinstance(right, exp.Literal) and right.name.isdigit()):
+            return None
+        year = right.name
+        bounds = {exp.EQ: (year, year), exp.GT: (str(int(year) + 1), None), exp.GTE: (year, None),
+                  exp.LT: (None, str(int(year) - 1)), exp.LTE: (None, year)}[op]
+        return column, bounds[0] and f"{bounds[0]}-01", bounds[1] and f"{bounds[1]}-12"
+
+    column = _date_column(left)
+    month = _month_of(right)
+    if column is None or month is None:
+        return None
+    if op is exp.EQ:
+        return column, month, month
+    if op in (exp.GT, exp.GTE):
+        return column, month, None
+    return column, None, month
+
+
+def _partition_predicate(column, low, high):
+    partition = exp.column(PARTITION_COLUMN, table=column.table or None)
+    conditions = []
+    if low:
+        conditions.append(exp.GTE(this=partition.copy(), expression=exp.Literal.string(low)))
+    if high:
+        conditions.append(exp.LTE(this=partition.copy(), expression=exp.Literal.string(high)))
+    in_range = exp.and_(*conditions)
+    unknown = exp.EQ(this=partition.copy(), expression=exp.Literal.string(UNKNOWN_PARTITION))
+    return exp.paren(exp.or_(in_range, unknown))
+
+
+def _own_tables(select):
+    """Tables in `select`'s own FROM / JOINs - not the ones inside its subqueries"""
+    # The key is "from_" in newer sqlglot releases
+    from_ = select.args.get("from_") or select.args.get("from")
+    sources = [from_.this] if from_ is not None else []
+    sources += [join.this for join in select.args.get("joins") or []]
+    return [source for source in sources if isinstance(source, exp.Table)]
+
+
+def prune_sql(sql_query, table=BASE_TABLE, dialect="duckdb"):
+    """
+    Add order_month predicates implied by order_date filters
+
+    `order_date >= '2024-03-15'` gains `order_month >= '2024-03'` (and
+    YEAR/EXTRACT filters a month range), which DuckDB evaluates against the
+    hive partition paths to skip whole directories. Only top-level AND
+    conjuncts are used, and the 'unknown' partition is always kept, so the
+    extra predicates never change the result.
+    """
+    if sqlglot is None or table not in sql_query.lower():
+        return sql_query
+    try:
+        tree = sqlglot.parse_one(sql_query, read=dialect)
+    except Exception:
+        return sql_query
+
+    changed = False
+    for select in tree.find_all(exp.Select):
+        where = select.args.get("where")
+        if where is None:
+            continue
+        sources = {t.alias_or_name: t.name.lower() for t in _own_tables(select)}
+        if table not in sources.values():
+            continue
+        extra = []
+        for conjunct in where.this.flatten() if isinstance(where.this, exp.And) else [where.this]:
+            bounds = _month_bounds(conjunct)
+            if bounds is None:
+                continue
+            column, low, high = bounds
+            source = sources.get(column.table) if column.table else (
+                table if set(sources.values()) == {table} else None)
+            if source != table:
+                continue
+            extra.append(_partition_predicate(column, low, high))
+        if extra:
+            where.set("this", exp.and_(where.this, *extra))
+            changed = True
+    if not changed:
+        return sql_query
+    rewritten = tree.sql(dialect=dialect)
+    print(f"--- Partition pruning: {rewritten} ---")
+    return rewritten
+
+
+def describe_dataset(table=BASE_TABLE, root=PARQUET_DIR):
+    """Partition / file / byte counts of a dataset (for logs and the UI)"""
+    path = dataset_path(table, root)
+    files = [os.path.join(d, f) for d, _, names in os.walk(path) for f in names if f.endswith(".parquet")]
+    partitions = {os.path.dirname(os.path.relpath(f, path)) for f in files}
+    return {
+        "partitions": len(partitions),
+        "files": len(files),
+        "bytes": sum(os.path.getsize(f) for f in files),
+    }
@@ -0,0 +1,538 @@
+"""
+Query Caches for Agentic BI
+- Persistent NL-to-SQL translation cache so repeated questions skip the Gemini round trip
+- Persistent broken-SQL -> repaired-SQL cache so a known mistake is never sent back to Gemini
+- In-memory result cache invalidated by per-table data versions bumped on every ingestion
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # Tables are found with a FROM / JOIN regex instead
+    sqlglot = None
+
+CACHE_DB_PATH = os.getenv("AGENTIC_BI_CACHE_DB", os.path.join(".cache", "agentic_bi_cache.sqlite"))
+
+
+def normalize_question(question):
+    """
+    Normalize a natural-language question so trivial variations share a cache entry
+
+    Lowercases, collapses whitespace and drops trailing punctuation, e.g.
+    "  What is the TOTAL sales amount? " -> "what is the total sales amount"
+    """
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+# Words that say nothing about which tables / columns a question needs
+STOPWORDS = frozenset("""a an the is are was were be of for in on at to by from with and or me my our we us you
+    your i it its this that these those what which who whom how do does did have has had show give tell list find
+    get please all each there their than then can could would should""".split())
+
+# Question words -> the column-name word they usually refer to
+TERM_SYNONYMS = {
+    "revenue": "sale", "sell": "sale", "selling": "sale", "sold": "sale", "earning": "sale", "spend": "sale",
+    "spent": "sale", "turnover": "sale", "income": "sale",
+    "month": "date", "monthly": "date", "year": "date", "yearly": "date", "annual": "date", "day": "date",
+    "daily": "date", "week": "date", "weekly": "date", "quarter": "date", "trend": "date", "when": "date",
+    "time": "date", "period": "date", "recent": "date", "latest": "date",
+    "item": "product", "sku": "product", "bestseller": "product",
+    "segment": "customer", "client": "customer", "buyer": "customer",
+    "area": "region", "zone": "region", "location": "region", "state": "region", "city": "region",
+    "transaction": "order", "purchase": "order",
+}
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def question_terms(text):
+    """
+    Content words of a question or identifier, stemmed and mapped to
+    column vocabulary: "Monthly revenue by regions?" -> {"date", "sale", "region"}
+    """
+    terms = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        word = _stem(word)
+        terms.add(TERM_SYNONYMS.get(word, word))
+    return terms
+
+
+def fingerprint(text):
+    """Short, stable hash of a schema/prompt context"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _connect(path):
+    """Open a SQLite connection usable from Streamlit's worker threads"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class TranslationCache:
+    """
+    SQLite-backed cache of normalized question -> generated SQL
+
+    Entries expire after `ttl_seconds` and the least recently used ones are
+    evicted once the cache holds more than `max_entries`. Because the data
+    lives in a local SQLite file it survives restarts and is shared by every
+    Streamlit session / process on the machine.
+
+    Args:
+        path: SQLite file to persist entries in
+        max_entries: Maximum number of translations kept (LRU eviction)
+        ttl_seconds: Age after which a translation is regenerated
+
+    Example:
+        cache = TranslationCache()
+        key = cache.make_key("Total sales?", context)
+        sql = cache.get(key)
+        if sql is None:
+            sql = generate_sql(...)
+            cache.put(key, "Total sales?", sql)
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, max_entries=1000, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(translations)")}
+        if "scope" not in columns:
+            # Caches from before few-shot examples: old rows are never offered as examples
+            self._conn.execute("ALTER TABLE translations ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+
+    def make_key(self, question, context):
+        """Cache key = prompt/schema fingerprint + normalized question"""
+        raw = f"{fingerprint(context)}|{normalize_question(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached SQL for `key`, or None on a miss / expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql, created_at FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            sql, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE translations SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return sql
+
+    def put(self, key, question, sql, scope=""):
+        """
+        Store a translation and evict expired / least recently used entries
+
+        `scope` (e.g. a dialect + schema fingerprint) decides which future
+        questions may see this pair as a prompt example (see similar()).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, question, sql, created_at, last_used, scope) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_question(question), sql, now, now, scope),
+            )
+            self._conn.execute("DELETE FROM translations WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN ("
+                "SELECT key FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def similar(self, question, scope, limit=2, candidates=500, min_score=0.4):
+        """
+        Past (question, sql) pairs most like `question`, best first
+
+        Only translations stored under `scope` that actually ran are
+        candidates; they are ranked by word overlap (Jaccard over
+        question_terms()) among the `candidates` most recently used.
+        """
+        if not scope or limit <= 0:
+            return []
+        terms = question_terms(question)
+        if not terms:
+            return []
+        normalized = normalize_question(question)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, sql FROM translations WHERE scope = ? ORDER BY last_used DESC LIMIT ?",
+                (scope, candidates),
+            ).fetchall()
+        scored = []
+        for past_question, sql in rows:
+            if past_question == normalized:
+                continue
+            past_terms = question_terms(past_question)
+            score = len(terms & past_terms) / len(terms | past_terms) if past_terms else 0.0
+            if score >= min_score:
+                scored.append((score, past_question, sql))
+        scored.sort(key=lambda item: -item[0])
+        return [(past_question, sql) for _, past_question, sql in scored[:limit]]
+
+    def invalidate(self, key):
+        """Drop a single translation (e.g. when its SQL stopped working)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+
+    def clear(self):
+        """Remove every cached translation"""
+        with self._lock:
+            self._conn.execute("DELETE FROM translations")
+
+    def stats(self):
+        """Hit/miss counters for this process plus the persisted entry count"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+class RepairCache:
+    """
+    SQLite-backed memory of generated SQL that failed and the SQL that fixed it
+
+    Whether the fix was found locally (one-letter typo in a column, stripped
+    fences) or needed another Gemini round trip, the next time the model
+    produces the same broken statement against the same schema it is
+    swapped for the working one before anything else happens.
+
+    Args:
+        path: SQLite file to persist repairs in
+        max_entries: Maximum number of repairs kept (LRU eviction)
+
+    Example:
+        key = repairs.make_key(bad_sql, schema_fingerprint)
+        fixed = repairs.get(key)
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sql_repairs (
+                key TEXT PRIMARY KEY,
+                broken_sql TEXT NOT NULL,
+                fixed_sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+
+    def make_key(self, sql, context):
+        """Cache key = schema/dialect fingerprint + canonical broken SQL"""
+        raw = f"{fingerprint(context)}|{canonicalize_sql(sql)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Repaired SQL for `key`, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT fixed_sql FROM sql_repairs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE sql_repairs SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, broken_sql, fixed_sql):
+        """Remember a repair and evict the least recently used ones"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sql_repairs (key, broken_sql, fixed_sql, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, broken_sql, fixed_sql, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM sql_repairs WHERE key IN ("
+                "SELECT key FROM sql_repairs ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_repairs WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_repairs")
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM sql_repairs").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+# ============= TABLE DATA VERSIONS =============
+
+class TableVersions:
+    """
+    Per-table data version counters, persisted next to the translation cache
+
+    `ingest_data.py` bumps a table's version after every load, so anything
+    cached against an older version is never served again.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def bump(self, table_name):
+        """Increment and return the data version of `table_name`"""
+        table_name = table_name.lower()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO table_versions (table_name, version, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT (table_name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                (table_name, time.time()),
+            )
+            return self._conn.execute(
+                "SELECT version FROM table_versions WHERE table_name = ?", (table_name,)
+            ).fetchone()[0]
+
+    def get(self, tables):
+        """Current versions for `tables` as a dict (0 for never-ingested tables)"""
+        tables = sorted({t.lower() for t in tables})
+        if not tables:
+            return {}
+        placeholders = ", ".join("?" for _ in tables)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})",
+                tables,
+            ).fetchall()
+        versions = dict.fromkeys(tables, 0)
+        versions.update(rows)
+        return versions
+
+    def snapshot(self):
+        """Versions of every table ingestion has ever touched"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT table_name, version FROM table_versions").fetchall())
+
+
+_table_versions = None
+_table_versions_lock = threading.Lock()
+
+
+def get_table_versions():
+    """Process-wide TableVersions store"""
+    global _table_versions
+    with _table_versions_lock:
+        if _table_versions is None:
+            _table_versions = TableVersions()
+        return _table_versions
+
+
+def bump_table_version(table_name):
+    """Mark `table_name` as changed (call after every ingestion)"""
+    return get_table_versions().bump(table_name)
+
+
+# ============= SQL RESULT CACHE =============
+
+_LITERAL_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_TABLE_RE = re.compile(r"\b(?:from|join)\s+([a-z_][\w.]*)")
+
+
+def canonicalize_sql(sql):
+    """
+    Canonical form of a SQL statement for cache keys
+
+    Collapses whitespace, lowercases everything outside quoted literals /
+    identifiers and drops the trailing semicolon, so formatting differences
+    in the model output don't defeat the cache.
+    """
+    parts = _LITERAL_RE.split(sql.strip().rstrip(";").strip())
+    canonical = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            canonical.append(part)  # quoted literal / identifier - keep as is
+        else:
+            canonical.append(re.sub(r"\s+", " ", part.lower()))
+    return "".join(canonical).strip()
+
+
+@lru_cache(maxsize=1024)
+def _tables_of(canonical):
+    if sqlglot is not None:
+        try:
+            tree = sqlglot.parse_one(canonical)
+        except Exception:
+            tree = None
+        if tree is not None:
+            ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+            return tuple(sorted({table.name.lower() for table in tree.find_all(exp.Table)
+                                 if table.name and table.name.lower() not in ctes}))
+    # Unparseable SQL: the database will judge it, but still key it by its tables
+    unquoted = " ".join(_LITERAL_RE.split(canonical)[::2])
+    return tuple(sorted({name.split(".")[-1] for name in _TABLE_RE.findall(unquoted)}))
+
+
+def referenced_tables(sql):
+    """
+    Table names `sql` reads, from the sqlglot parse tree (comma joins and
+    subqueries included, CTE names left out), or from its FROM / JOIN
+    clauses if sqlglot is missing or can't parse it
+    """
+    return list(_tables_of(canonicalize_sql(sql)))
+
+
+def _estimate_size(rows):
+    """Approximate memory footprint of a fetched result in bytes"""
+    nbytes = getattr(rows, "nbytes", None)
+    if nbytes is not None:  # QueryResult / array-backed results know their size
+        return nbytes
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+class ResultCache:
+    """
+    In-memory LRU cache of SQL results bounded by total bytes
+
+    Keys combine the canonicalized SQL with the data version of every table
+    it reads, so a new ingestion automatically makes old results unreachable.
+    Only read-only statements (SELECT / WITH) that reference at least one
+    table are cached.
+
+    Args:
+        max_bytes: Memory budget for cached results
+        max_entry_bytes: Results larger than this are never cached
+        versions: TableVersions store (defaults to the process-wide one)
+
+    Example:
+        key = result_cache.make_key(sql)   # read versions *before* executing
+        rows = result_cache.get(key)
+        if rows is None:
+            rows = conn.execute(text(sql)).fetchall()
+            result_cache.put(key, rows)
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=None, versions=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self._versions = versions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, sql):
+        """Cache key for `sql` at the current table versions, or None if uncacheable"""
+        canonical = canonicalize_sql(sql)
+        if not canonical.startswith(("select", "with")):
+            return None
+        tables = referenced_tables(canonical)
+        if not tables:
+            return None
+        versions = (self._versions or get_table_versions()).get(tables)
+        return (canonical, tuple(sorted(versions.items())))
+
+    def get(self, key):
+        """Cached rows for `key`, or None"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, rows):
+        """Cache `rows` under `key`, evicting least recently used results to fit"""
+        if key is None:
+            return
+        nbytes = _estimate_size(rows)
+        if nbytes > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (rows, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and memory usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
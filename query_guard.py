@@ -0,0 +1,247 @@
+"""
+Query Guardrails for Agentic BI
+Cost checks, timeouts, row caps and server-side cursor streaming for
+LLM-generated SQL (PostgreSQL; embedded engines get the statement check,
+row cap and batching)
+"""
+import json
+import re
+import time
+
+from sqlalchemy import text
+
+from query_result import ColumnarBuilder, type_codes_of
+from tracing import span
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # Fall back to regex checks and subquery wrapping
+    sqlglot = None
+
+
+class QueryRejected(Exception):
+    """Generated SQL refused before execution (too expensive)"""
+    pass
+
+
+class ExecutionPolicy:
+    """
+    Limits applied to one execution of generated SQL
+
+    Args:
+        max_cost: Reject if the planner's total cost estimate is above this (None = no check)
+        statement_timeout_ms: Server-side statement_timeout for the query
+        row_cap: Max rows returned; injected as LIMIT for non-aggregate queries
+        batch_size: Rows fetched per round trip from the server-side cursor
+    """
+
+    def __init__(self, max_cost=None, statement_timeout_ms=30_000, row_cap=10_000, batch_size=2_000):
+        self.max_cost = max_cost
+        self.statement_timeout_ms = statement_timeout_ms
+        self.row_cap = row_cap
+        self.batch_size = batch_size
+
+    def __repr__(self):
+        return (f"ExecutionPolicy(max_cost={self.max_cost}, statement_timeout_ms={self.statement_timeout_ms}, "
+                f"row_cap={self.row_cap}, batch_size={self.batch_size})")
+
+
+# Streamlit UI: fail fast, keep results small enough to render
+UI_POLICY = ExecutionPolicy(max_cost=5_000_000, statement_timeout_ms=15_000, row_cap=10_000, batch_size=2_000)
+# Scheduled reports: patient, big results, still streamed in batches
+BATCH_POLICY = ExecutionPolicy(max_cost=None, statement_timeout_ms=600_000, row_cap=1_000_000, batch_size=20_000)
+
+
+_AGGREGATE_RE = re.compile(r"\bgroup\s+by\b|\b(count|sum|avg|min|max)\s*\(", re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\blimit\s+(\d+)\s*(offset\s+\d+\s*)?$", re.IGNORECASE)
+
+
+def is_aggregate_query(sql_query, dialect="postgres"):
+    """True if the outermost SELECT aggregates (GROUP BY or aggregate functions)"""
+    if sqlglot is not None:
+        try:
+            select = sqlglot.parse_one(sql_query, read=dialect)
+        except Exception:
+            select = None
+        if isinstance(select, exp.Select):
+            if select.args.get("group"):
+                return True
+            return any(projection.find(exp.AggFunc) and not projection.find(exp.Window)
+                       for projection in select.expressions)
+    return bool(_AGGREGATE_RE.search(sql_query))
+
+
+def apply_row_cap(sql_query, row_cap, dialect="postgres"):
+    """
+    Make sure a non-aggregate SELECT returns at most `row_cap` rows
+
+    An existing LIMIT up to `row_cap` is kept; a missing or larger one
+    becomes `row_cap + 1` - the extra row only tells the fetch that the cap
+    cut the result, and is dropped there.
+    """
+    stripped = sql_query.strip().rstrip(";").strip()
+    if not row_cap or not stripped.lower().startswith(("select", "with")) or is_aggregate_query(stripped, dialect):
+        return sql_query
+    if sqlglot is not None:
+        try:
+            select = sqlglot.parse_one(stripped, read=dialect)
+            if isinstance(select, exp.Select):
+                limit = select.args.get("limit")
+                current = limit.expression if limit is not None else None
+                if isinstance(current, exp.Literal) and int(current.name) <= row_cap:
+                    return sql_query
+                return select.limit(row_cap + 1).sql(dialect=dialect)
+        except Exception:
+            pass
+    match = _LIMIT_RE.search(stripped)
+    if match and not match.group(2) and int(match.group(1)) <= row_cap:
+        return sql_query
+    return f"SELECT * FROM ({stripped}) AS capped_result LIMIT {int(row_cap) + 1}"
+
+
+def _explain(conn, sql_query):
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def estimate_cost(conn, sql_query):
+    """Planner total cost of `sql_query` via EXPLAIN (FORMAT JSON) - nothing is executed"""
+    return _explain(conn, sql_query)["Total Cost"]
+
+
+def estimate_rows(conn, sql_query):
+    """Planner row estimate of `sql_query` via EXPLAIN (FORMAT JSON) - nothing is executed"""
+    return int(_explain(conn, sql_query)["Plan Rows"])
+
+
+def check_read_only(sql_query):
+    """
+    Reject anything but a single SELECT / WITH query
+
+    Embedded engines have no read-only transactions, so this statement
+    check is their guard against generated DML/DDL.
+    """
+    statement = sql_query.strip().rstrip(";").strip()
+    if not statement.lower().startswith(("select", "with")):
+        raise QueryRejected("Only SELECT queries can be run.")
+    if sqlglot is not None:
+        try:
+            statements = sqlglot.parse(statement)
+        except Exception:
+            return  # the database will report the syntax error
+        if len(statements) != 1 or any(statements[0].find_all(exp.Insert, exp.Update, exp.Delete, exp.Create,
+                                                              exp.Drop, exp.Alter)):
+            raise QueryRejected("Only a single read-only SELECT query can be run.")
+    elif ";" in statement:
+        raise QueryRejected("Only a single read-only SELECT query can be run.")
+
+
+def _is_postgres(conn):
+    return conn.dialect.name == "postgresql"
+
+
+def _prepare_transaction(conn, sql_query, policy):
+    if not _is_postgres(conn):
+        # Embedded engines: statement check only (no timeout / planner cost)
+        check_read_only(sql_query)
+        return
+    conn.execute(text("SET TRANSACTION READ ONLY"))
+    conn.execute(text(f"SET LOCAL statement_timeout = {int(policy.statement_timeout_ms)}"))
+    if policy.max_cost is not None:
+        cost = estimate_cost(conn, sql_query)
+        if cost > policy.max_cost:
+            raise QueryRejected(
+                f"Query too expensive (estimated cost {cost:,.0f} > limit {policy.max_cost:,.0f}). "
+                f"Try a narrower question or add filters."
+            )
+
+
+class _RowCap:
+    """
+    Cuts fetched batches at `row_cap` rows
+
+    A result of exactly `row_cap` rows is complete; it only counts as
+    truncated once a row beyond the cap arrives (apply_row_cap asks for one).
+    """
+
+    def __init__(self, row_cap):
+        self.remaining = row_cap
+        self.truncated = False
+
+    def take(self, batch):
+        if self.remaining is None:
+            return batch
+        if len(batch) > self.remaining:
+            batch = batch[:self.remaining]
+            self.truncated = True
+        self.remaining -= len(batch)
+        return batch
+
+
+def _stream(conn, sql_query, policy):
+    if not _is_postgres(conn):
+        # In-process engines hand over batches directly - no server-side cursor
+        return conn.execute(text(sql_query))
+    return conn.execution_options(stream_results=True, yield_per=policy.batch_size).execute(text(sql_query))
+
+
+def fetch_result(conn, sql_query, policy, arrow=False):
+    """
+    Execute under `policy` and build a columnar QueryResult from the
+    server-side cursor batches (no intermediate list of rows)
+    """
+    start = time.perf_counter()
+    with conn.begin():
+        with span("sql.execute", dialect=conn.dialect.name):
+            _prepare_transaction(conn, sql_query, policy)
+            result = _stream(conn, sql_query, policy)
+        with span("sql.fetch") as fetch_span:
+            builder = ColumnarBuilder(list(result.keys()), type_codes_of(result), arrow=arrow)
+            cap = _RowCap(policy.row_cap)
+            batches = 0
+            for batch in result.partitions(policy.batch_size):
+                builder.append(cap.take(batch))
+                batches += 1
+                if cap.truncated:
+                    break
+            result.close()
+            fetch_span.set(rows=builder.row_count, batches=batches)
+    with span("frame.build", rows=builder.row_count, arrow=arrow):
+        return builder.finish(sql=sql_query, elapsed=time.perf_counter() - start, truncated=cap.truncated)
+
+
+async def _prepare_transaction_async(conn, sql_query, policy):
+    await conn.execute(text("SET TRANSACTION READ ONLY"))
+    await conn.execute(text(f"SET LOCAL statement_timeout = {int(policy.statement_timeout_ms)}"))
+    if policy.max_cost is not None:
+        cost = await conn.run_sync(lambda sync_conn: estimate_cost(sync_conn, sql_query))
+        if cost > policy.max_cost:
+            raise QueryRejected(
+                f"Query too expensive (estimated cost {cost:,.0f} > limit {policy.max_cost:,.0f}). "
+                f"Try a narrower question or add filters."
+            )
+
+
+async def fetch_result_async(conn, sql_query, policy, arrow=False):
+    """fetch_result() for an AsyncConnection (column kinds inferred from values)"""
+    start = time.perf_counter()
+    async with conn.begin():
+        with span("sql.execute", dialect=conn.dialect.name):
+            await _prepare_transaction_async(conn, sql_query, policy)
+            result = await conn.stream(text(sql_query))
+        with span("sql.fetch") as fetch_span:
+            builder = ColumnarBuilder(list(result.keys()), arrow=arrow)
+            cap = _RowCap(policy.row_cap)
+            batches = 0
+            async for batch in result.partitions(policy.batch_size):
+                builder.append(cap.take(batch))
+                batches += 1
+                if cap.truncated:
+                    break
+            await result.close()
+            fetch_span.set(rows=builder.row_count, batches=batches)
+    with span("frame.build", rows=builder.row_count, arrow=arrow):
+        return builder.finish(sql=sql_query, elapsed=time.perf_counter() - start, truncated=cap.truncated)
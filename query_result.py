@@ -0,0 +1,255 @@
+"""
+Query Results for Agentic BI
+Typed, columnar DataFrames built straight from cursor batches, with the real
+column names, database types and execution metadata
+"""
+import copy
+import datetime
+import decimal
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # arrow=True falls back to NumPy-backed columns
+    pa = None
+
+# PostgreSQL type OIDs -> (type name, column kind)
+PG_TYPES = {
+    16: ("boolean", "bool"),
+    20: ("bigint", "int"),
+    21: ("smallint", "int"),
+    23: ("integer", "int"),
+    26: ("oid", "int"),
+    700: ("real", "float"),
+    701: ("double precision", "float"),
+    1700: ("numeric", "float"),
+    19: ("name", "text"),
+    25: ("text", "text"),
+    1042: ("character", "text"),
+    1043: ("character varying", "text"),
+    1082: ("date", "date"),
+    1114: ("timestamp", "datetime"),
+    1184: ("timestamptz", "datetime"),
+}
+
+# Python value type -> column kind, for drivers without type codes
+_VALUE_KINDS = (
+    (bool, "bool"),
+    (int, "int"),
+    ((float, decimal.Decimal), "float"),
+    (str, "text"),
+    (datetime.datetime, "datetime"),
+    (datetime.date, "date"),
+)
+
+
+def _unique_names(columns):
+    """Column names with duplicates suffixed (two `sum` columns -> sum, sum_2)"""
+    seen = {}
+    names = []
+    for name in columns:
+        name = str(name)
+        count = seen.get(name, 0) + 1
+        seen[name] = count
+        names.append(name if count == 1 else f"{name}_{count}")
+    return names
+
+
+def _kind_of_type(value_type):
+    for types, kind in _VALUE_KINDS:
+        if issubclass(value_type, types):
+            return kind
+    return "object"
+
+
+def _value_kind(values):
+    """
+    (column kind, Python type name) of a column's non-null values
+
+    Every value counts, not just the first: SQLite happily returns 1 and
+    2.5 in one column. Ints mixed with floats / Decimals make a float
+    column; any other mix stays object.
+    """
+    value_types = {type(value) for value in values} - {type(None)}
+    if not value_types:
+        return "object", "unknown"
+    kinds = {_kind_of_type(value_type) for value_type in value_types}
+    names = "/".join(sorted(value_type.__name__ for value_type in value_types))
+    if len(kinds) == 1:
+        return kinds.pop(), names
+    if kinds == {"int", "float"}:
+        return "float", names
+    return "object", names
+
+
+def _pandas_column(values, kind):
+    has_nulls = any(value is None for value in values)
+    if kind == "int":
+        return pd.array(values, dtype="Int64") if has_nulls else pd.array(values, dtype="int64")
+    if kind == "float":
+        return pd.array(values, dtype="float64")  # Decimal -> float, None -> NaN
+    if kind == "bool":
+        return pd.array(values, dtype="boolean")
+    if kind in ("date", "datetime"):
+        return pd.to_datetime(pd.Series(values, dtype=object)).array
+    return pd.array(values, dtype=object)
+
+
+def _arrow_column(values, kind):
+    try:
+        if kind == "int":
+            return pa.array(values, type=pa.int64())
+        if kind == "float":
+            array = pa.array(values)  # Decimals arrive as decimal128
+            return array if pa.types.is_floating(array.type) else array.cast(pa.float64())
+        if kind == "text":
+            return pa.array(values, type=pa.string())
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # e.g. numeric beyond decimal128 precision, JSON of mixed shapes
+        if kind == "float":
+            return pa.array([None if v is None else float(v) for v in values], type=pa.float64())
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+class QueryResult:
+    """
+    Result of one SQL execution as a typed, columnar DataFrame
+
+    Attributes:
+        frame: pandas DataFrame with the query's real column names
+        sql: SQL that actually ran (after routing / row capping)
+        source_sql: The same SQL without the row cap (lets charts aggregate a
+            truncated result in the database)
+        db_types: Column name -> database type name
+        elapsed: Seconds spent executing and fetching
+        truncated: True if the row cap cut the result
+        cached: True if served from the result cache
+        error: Error message if the question could not be answered (frame is None)
+        approximation: How an estimate was computed (approximate.Approximation),
+            None for exact answers
+
+    Example:
+        result = ask_ai_about_data_frame("Sales by region?")
+        if result.ok:
+            st.dataframe(result.frame)
+    """
+
+    def __init__(self, frame=None, sql=None, db_types=None, elapsed=0.0, truncated=False, cached=False, error=None,
+                 source_sql=None, approximation=None):
+        self.frame = frame
+        self.sql = sql
+        self.source_sql = source_sql
+        self.db_types = db_types or {}
+        self.elapsed = elapsed
+        self.truncated = truncated
+        self.cached = cached
+        self.error = error
+        self.approximation = approximation
+
+    @classmethod
+    def failed(cls, error, sql=None):
+        return cls(sql=sql, error=error)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def columns(self):
+        return [] if self.frame is None else list(self.frame.columns)
+
+    @property
+    def row_count(self):
+        return 0 if self.frame is None else len(self.frame)
+
+    @property
+    def nbytes(self):
+        """Memory held by the frame (used to size the result cache)"""
+        return 0 if self.frame is None else int(self.frame.memory_usage(index=False, deep=True).sum())
+
+    def as_cached(self):
+        """Shallow copy flagged as a cache hit (the frame itself is shared)"""
+        hit = copy.copy(self)
+        hit.cached = True
+        return hit
+
+    def to_rows(self):
+        """Plain list of row tuples (the legacy ask_ai_about_data() shape)"""
+        if self.frame is None:
+            return []
+        return list(self.frame.astype(object).where(self.frame.notna(), None).itertuples(index=False, name=None))
+
+    def __repr__(self):
+        if not self.ok:
+            return f"QueryResult(error={self.error!r})"
+        return (f"QueryResult(rows={self.row_count}, columns={self.columns}, "
+                f"elapsed={self.elapsed:.3f}s, truncated={self.truncated}, cached={self.cached})")
+
+
+class ColumnarBuilder:
+    """
+    Accumulates cursor batches column by column and builds one DataFrame
+
+    Each batch is transposed with zip() (no per-row Python objects are kept),
+    and every column is converted once at the end: to NumPy/nullable pandas
+    arrays, or with arrow=True to Arrow arrays wrapped zero-copy via
+    pd.ArrowDtype. Column kinds come from PostgreSQL type OIDs when the
+    driver reports them, otherwise from the types of all non-null values
+    (DuckDB, SQLite, asyncpg) - ints mixed with floats become float, other
+    mixes object.
+
+    Args:
+        columns: Column names from the result
+        type_codes: Driver type codes (cursor.description[i][1]), optional
+        arrow: Build pyarrow-backed columns (falls back if pyarrow is missing)
+    """
+
+    def __init__(self, columns, type_codes=None, arrow=False):
+        self.names = _unique_names(columns)
+        self.type_codes = list(type_codes) if type_codes else [None] * len(self.names)
+        self.arrow = arrow and pa is not None
+        self.row_count = 0
+        self._values = [[] for _ in self.names]
+
+    def append(self, batch):
+        if not batch:
+            return
+        for values, column in zip(zip(*batch), self._values):
+            column.extend(values)
+        self.row_count += len(batch)
+
+    def _kinds(self):
+        for code, values in zip(self.type_codes, self._values):
+            known = PG_TYPES.get(code) if isinstance(code, int) else None
+            if known is not None:
+                yield known[1], known[0]
+                continue
+            kind, python_type = _value_kind(values)
+            # Embedded drivers report type objects (e.g. DuckDB's DECIMAL(18,2))
+            yield kind, str(code) if code is not None else python_type
+
+    def finish(self, sql=None, elapsed=0.0, truncated=False):
+        """QueryResult holding the accumulated rows"""
+        kinds = list(self._kinds())
+        if self.arrow:
+            table = pa.table([_arrow_column(values, kind) for values, (kind, _) in zip(self._values, kinds)],
+                             names=self.names)
+            frame = table.to_pandas(types_mapper=pd.ArrowDtype)
+        else:
+            frame = pd.DataFrame({name: _pandas_column(values, kind)
+                                  for name, values, (kind, _) in zip(self.names, self._values, kinds)},
+                                 columns=self.names)
+        self._values = [[] for _ in self.names]
+        db_types = {name: db_type for name, (_, db_type) in zip(self.names, kinds)}
+        return QueryResult(frame, sql=sql, db_types=db_types, elapsed=elapsed, truncated=truncated)
+
+
+def type_codes_of(result):
+    """Driver type codes for a SQLAlchemy result, or None if unavailable"""
+    cursor = getattr(result, "cursor", None)
+    description = getattr(cursor, "description", None)
+    if not description:
+        return None
+    return [column[1] for column in description]
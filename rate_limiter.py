@@ -1,15 +1,29 @@
 """
 Rate Limit Handler for Gemini API
-Implements exponential backoff to gracefully handle 429 errors
+- Exponential backoff to gracefully handle 429 errors
+- Proactive token-bucket quota scheduler shared across threads and processes
 """
+import asyncio
+import os
+import sqlite3
+import statistics
+import threading
 import time
 import random
+from collections import deque
 from functools import wraps
 
+from tracing import span
+
 class RateLimitError(Exception):
     """Custom exception for rate limiting"""
     pass
 
+def backoff_delay(attempt, base_delay=1, max_delay=60):
+    """Exponential backoff delay for `attempt` (0-based) with 10% jitter"""
+    delay = min(base_delay * (2 ** attempt), max_delay)
+    return delay + random.uniform(0, delay * 0.1)
+
 def retry_with_backoff(max_retries=3, base_delay=1, max_delay=60):
     """
     Decorator to retry function calls with exponential backoff
@@ -41,13 +55,12 @@ def retry_with_backoff(max_retries=3, base_delay=1, max_delay=60):
                     if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
                         if attempt < max_retries:
                             # Calculate delay with exponential backoff + jitter
-                            delay = min(base_delay * (2 ** attempt), max_delay)
-                            jitter = random.uniform(0, delay * 0.1)
-                            wait_time = delay + jitter
+                            wait_time = backoff_delay(attempt, base_delay, max_delay)
                             
                             print(f"\n⏳ Rate limit hit (429). Attempt {attempt + 1}/{max_retries + 1}")
                             print(f"   Waiting {wait_time:.1f} seconds before retry...")
-                            time.sleep(wait_time)
+                            with span("rate_limit.backoff", attempt=attempt, wait_s=round(wait_time, 3)):
+                                time.sleep(wait_time)
                         else:
                             print(f"\n❌ Rate limit exceeded. Gave up after {max_retries} retries.")
                             raise RateLimitError(
@@ -78,6 +91,262 @@ def rate_limited_call(func, *args, max_retries=3, **kwargs):
         lambda: func(*args, **kwargs)
     )()
 
+# ============= PROACTIVE QUOTA SCHEDULER =============
+
+# Priority lanes: lower value is served first
+INTERACTIVE = 0
+BATCH = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+QUOTA_DB_PATH = os.getenv("AGENTIC_BI_QUOTA_DB", os.path.join(".cache", "quota.sqlite"))
+
+
+class QuotaTimeoutError(RateLimitError):
+    """Raised when capacity could not be acquired within the caller's timeout"""
+    pass
+
+
+class QuotaScheduler:
+    """
+    Requests-per-minute + tokens-per-minute token buckets shared by every
+    thread and process on the machine
+
+    Callers queue for capacity *before* calling the API instead of burning
+    attempts on 429s. Bucket state and the wait queue live in a local SQLite
+    file; every decision runs inside a `BEGIN IMMEDIATE` transaction, which
+    acts as the cross-process lock. Waiters are served strictly by
+    (priority lane, arrival time), so interactive UI questions jump ahead of
+    queued batch jobs.
+
+    Args:
+        rpm: Requests allowed per minute
+        tpm: Tokens (prompt + output) allowed per minute
+        name: Bucket name, e.g. one per API key / model
+        path: SQLite file holding the shared state
+        poll_interval: Max seconds between queue checks while waiting
+
+    Example:
+        scheduler = QuotaScheduler(rpm=15, tpm=250_000)
+        scheduler.acquire(tokens=1200, priority=INTERACTIVE)
+        response = client.models.generate_content(...)
+        scheduler.record_usage(estimated=1200, actual=response.usage_metadata.total_token_count)
+    """
+
+    # Waiters that stop polling (crashed process) are dropped after this long
+    STALE_WAITER_SECONDS = 30
+
+    def __init__(self, rpm=15, tpm=250_000, name="gemini", path=QUOTA_DB_PATH, poll_interval=0.25):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.name = name
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._metrics_lock = threading.Lock()
+        self._waiting = {lane: 0 for lane in LANE_NAMES}
+        self._wait_times = {lane: deque(maxlen=1000) for lane in LANE_NAMES}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                requests REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS waiters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                tokens REAL NOT NULL,
+                enqueued_at REAL NOT NULL,
+                heartbeat REAL NOT NULL
+            )
+        """)
+        conn.execute(
+            "INSERT OR IGNORE INTO buckets (name, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+            (name, rpm, tpm, time.time()),
+        )
+
+    def _conn(self):
+        # One connection per thread; autocommit so BEGIN IMMEDIATE is explicit
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, conn, now):
+        requests, tokens, updated_at, blocked_until = conn.execute(
+            "SELECT requests, tokens, updated_at, blocked_until FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        elapsed = max(0.0, now - updated_at)
+        requests = min(self.rpm, requests + elapsed * self.rpm / 60)
+        tokens = min(self.tpm, tokens + elapsed * self.tpm / 60)
+        return requests, tokens, blocked_until
+
+    def _enqueue(self, tokens, priority):
+        now = time.time()
+        conn = self._conn()
+        cursor = conn.execute(
+            "INSERT INTO waiters (name, priority, tokens, enqueued_at, heartbeat) VALUES (?, ?, ?, ?, ?)",
+            (self.name, priority, tokens, now, now),
+        )
+        return cursor.lastrowid
+
+    def _dequeue(self, ticket):
+        self._conn().execute("DELETE FROM waiters WHERE id = ?", (ticket,))
+
+    def _try_acquire(self, ticket, tokens):
+        """
+        One scheduling step for `ticket`
+
+        Returns (granted, seconds_to_wait_before_retrying).
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE waiters SET heartbeat = ? WHERE id = ?", (now, ticket))
+            conn.execute("DELETE FROM waiters WHERE name = ? AND heartbeat < ?",
+                         (self.name, now - self.STALE_WAITER_SECONDS))
+            head = conn.execute(
+                "SELECT id FROM waiters WHERE name = ? ORDER BY priority, enqueued_at, id LIMIT 1", (self.name,)
+            ).fetchone()
+            requests, available, blocked_until = self._refill(conn, now)
+            if head is None or head[0] != ticket:
+                wait = self.poll_interval
+            elif now < blocked_until:
+                wait = blocked_until - now
+            elif requests >= 1 and available >= tokens:
+                conn.execute(
+                    "UPDATE buckets SET requests = ?, tokens = ?, updated_at = ? WHERE name = ?",
+                    (requests - 1, available - tokens, now, self.name),
+                )
+                conn.execute("DELETE FROM waiters WHERE id = ?", (ticket,))
+                conn.execute("COMMIT")
+                return True, 0.0
+            else:
+                # Time until both buckets have refilled enough for this request
+                wait = max((1 - requests) * 60 / self.rpm, (tokens - available) * 60 / self.tpm, 0.01)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return False, wait
+
+    def _start_wait(self, tokens, priority):
+        tokens = min(tokens, self.tpm)  # a single huge prompt must still fit the bucket
+        with self._metrics_lock:
+            self._waiting[priority] += 1
+        return self._enqueue(tokens, priority), tokens, time.monotonic()
+
+    def _finish_wait(self, ticket, priority, started, granted):
+        waited = time.monotonic() - started
+        with self._metrics_lock:
+            self._waiting[priority] -= 1
+            if granted:
+                self._wait_times[priority].append(waited)
+        if not granted:
+            self._dequeue(ticket)
+        return waited
+
+    def acquire(self, tokens=1000, priority=INTERACTIVE, timeout=None):
+        """
+        Block until one request and `tokens` tokens are available
+
+        Args:
+            tokens: Estimated prompt + output tokens of the call
+            priority: INTERACTIVE or BATCH lane
+            timeout: Give up after this many seconds (None = wait forever)
+
+        Returns:
+            Seconds spent waiting in the queue
+        """
+        with span("quota.wait", lane=LANE_NAMES.get(priority, priority), tokens=tokens):
+            ticket, tokens, started = self._start_wait(tokens, priority)
+            granted = False
+            try:
+                while True:
+                    granted, wait = self._try_acquire(ticket, tokens)
+                    if granted:
+                        return self._finish_wait(ticket, priority, started, True)
+                    if timeout is not None and time.monotonic() - started + wait > timeout:
+                        raise QuotaTimeoutError(f"No API quota available within {timeout:g}s")
+                    time.sleep(min(wait, self.poll_interval * 4))
+            finally:
+                if not granted:
+                    self._finish_wait(ticket, priority, started, False)
+
+    async def acquire_async(self, tokens=1000, priority=INTERACTIVE, timeout=None):
+        """
+        acquire() for asyncio callers - waits without blocking the event loop
+
+        The SQLite steps (BEGIN IMMEDIATE can wait on other processes) run in
+        worker threads, each with its own connection.
+        """
+        with span("quota.wait", lane=LANE_NAMES.get(priority, priority), tokens=tokens):
+            ticket, tokens, started = await asyncio.to_thread(self._start_wait, tokens, priority)
+            granted = False
+            try:
+                while True:
+                    granted, wait = await asyncio.to_thread(self._try_acquire, ticket, tokens)
+                    if granted:
+                        return self._finish_wait(ticket, priority, started, True)
+                    if timeout is not None and time.monotonic() - started + wait > timeout:
+                        raise QuotaTimeoutError(f"No API quota available within {timeout:g}s")
+                    await asyncio.sleep(min(wait, self.poll_interval * 4))
+            finally:
+                if not granted:
+                    await asyncio.to_thread(self._finish_wait, ticket, priority, started, False)
+
+    def record_usage(self, estimated, actual):
+        """Correct the token bucket once the real token count of a call is known"""
+        if actual is None:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE buckets SET tokens = MIN(?, tokens + ?) WHERE name = ?",
+                     (self.tpm, estimated - actual, self.name))
+        conn.execute("COMMIT")
+
+    def report_rate_limited(self, retry_after):
+        """A 429 slipped through: pause every caller for `retry_after` seconds"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE name = ?",
+                     (time.time() + retry_after, self.name))
+        conn.execute("COMMIT")
+
+    def metrics(self):
+        """
+        Queue depth (this process and machine-wide) and wait-time stats per lane
+        """
+        rows = self._conn().execute(
+            "SELECT priority, COUNT(*) FROM waiters WHERE name = ? GROUP BY priority", (self.name,)
+        ).fetchall()
+        global_depth = dict(rows)
+        result = {}
+        with self._metrics_lock:
+            for lane, lane_name in LANE_NAMES.items():
+                waits = sorted(self._wait_times[lane])
+                result[lane_name] = {
+                    "queue_depth": self._waiting[lane],
+                    "global_queue_depth": global_depth.get(lane, 0),
+                    "acquired": len(waits),
+                    "avg_wait_s": statistics.fmean(waits) if waits else 0.0,
+                    "p95_wait_s": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "max_wait_s": waits[-1] if waits else 0.0,
+                }
+        return result
+
+
 # Example usage in your code:
 """
 # Method 1: Using decorator
@@ -0,0 +1,277 @@
+"""
+Result Pager for Agentic BI
+Browse an answer one page at a time instead of sending every row to the
+browser: the generated SQL is kept and re-run as a subquery with the sort,
+filters and a keyset condition pushed down to the database
+
+    pager = ResultPager(result, run_query, count_rows=estimate_row_count, sort="sales_amount")
+    page = pager.fetch()                 # rows 1-100
+    page = pager.fetch(page.cursor)      # rows 101-200, seeks past row 100
+
+Keyset (seek) pagination orders by the sort column with every other column
+as a tie-break and asks for the rows after the last one shown, so page 5,000
+costs the same as page 1 - no OFFSET scanning through everything before it.
+"""
+import datetime
+import decimal
+import math
+
+import pandas as pd
+
+PAGE_SIZE = 100
+PAGE_SIZES = (50, 100, 500)
+FILTER_OPS = ("contains", "=", "!=", ">", ">=", "<", "<=")
+# Characters of raw rows shown in the details view
+MAX_RAW_CHARS = 5_000
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def sql_literal(value):
+    """
+    SQL literal for a value read back from a result frame (NumPy/pandas
+    scalars, dates, strings); missing values become NULL
+    """
+    if value is None or value is pd.NaT:
+        return "NULL"
+    if hasattr(value, "item") and not isinstance(value, (pd.Timestamp, str)):
+        value = value.item()  # NumPy scalar -> Python
+    if isinstance(value, float) and math.isnan(value):
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return repr(value) if isinstance(value, float) else str(value)
+    if isinstance(value, datetime.datetime):
+        value = pd.Timestamp(value)
+        # Midnight as a bare date so it also compares against DATE columns
+        text = value.strftime("%Y-%m-%d") if value == value.normalize() else value.isoformat(sep=" ")
+        return f"'{text}'"
+    if isinstance(value, datetime.date):
+        return f"'{value.isoformat()}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _is_missing(value):
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+class Page:
+    """
+    One page of rows
+
+    Attributes:
+        frame: The rows (DataFrame, at most page_size long)
+        number: 1-based page number
+        first_row: 1-based position of the first row in the filtered answer
+        has_next: More rows follow
+        cursor: Pass to ResultPager.fetch() for the next page
+    """
+
+    def __init__(self, frame, number, first_row, has_next, cursor):
+        self.frame = frame
+        self.number = number
+        self.first_row = first_row
+        self.has_next = has_next
+        self.cursor = cursor
+
+    @property
+    def last_row(self):
+        return self.first_row + len(self.frame) - 1
+
+
+class ResultPager:
+    """
+    Pages over a QueryResult's SQL with sort and filters in the database
+
+    With no sort and no filter, pages are sliced from the rows already
+    fetched (in the query's own order) and nothing runs again; past those
+    rows, or as soon as a sort or filter is chosen, each page is one
+    keyset query of page_size + 1 rows.
+
+    Args:
+        result: QueryResult of the question (its source_sql is re-run)
+        run_query: Executes SQL and returns a QueryResult (brain.run_query)
+        count_rows: sql -> (rows, exact) used by total(); None = unknown
+        page_size: Rows per page
+        sort: Column to order by (None = the query's own order)
+        descending: Sort direction of `sort`
+        filters: [(column, op, value)] with op in FILTER_OPS
+    """
+
+    def __init__(self, result, run_query, count_rows=None, page_size=PAGE_SIZE, sort=None, descending=False,
+                 filters=()):
+        self.result = result
+        self.run_query = run_query
+        self.count_rows = count_rows
+        self.page_size = int(page_size)
+        self.sort = sort
+        self.descending = bool(descending) and sort is not None
+        self.filters = [tuple(f) for f in filters]
+        self.columns = list(result.columns)
+        self.source_sql = (result.source_sql or result.sql or "").strip().rstrip(";")
+        # The sort column first, then every column as a tie-break so the order is total
+        self.keys = ([sort] if sort else []) + [c for c in self.columns if c != sort]
+        self._total = None
+
+    @property
+    def spec(self):
+        """Identity of the view: a new spec starts again from page 1"""
+        return (self.source_sql, self.page_size, self.sort, self.descending, tuple(self.filters))
+
+    @property
+    def in_memory(self):
+        return self.sort is None and not self.filters
+
+    # ---------- SQL ----------
+    def _filter_sql(self, column, op, value):
+        name = quote_identifier(column)
+        if op == "contains":
+            pattern = str(value).lower().replace("'", "''")
+            return f"LOWER(CAST({name} AS VARCHAR)) LIKE '%{pattern}%'"
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter operator: {op}")
+        frame = self.result.frame
+        if frame is not None and pd.api.types.is_numeric_dtype(frame[column].dtype):
+            value = float(value)
+        return f"{name} {'<>' if op == '!=' else op} {sql_literal(value)}"
+
+    def where_sql(self):
+        """Filter conditions, or "" without filters"""
+        return " AND ".join(f"({self._filter_sql(*f)})" for f in self.filters)
+
+    def filtered_sql(self):
+        """The answer's SQL with the filters applied (what total() counts)"""
+        where = self.where_sql()
+        sql = f"SELECT * FROM ({self.source_sql}) AS page_source"
+        return f"{sql} WHERE {where}" if where else sql
+
+    def _directions(self):
+        return [self.descending if key == self.sort else False for key in self.keys]
+
+    def order_sql(self):
+        return ", ".join(f"{quote_identifier(key)} {'DESC' if desc else 'ASC'} NULLS LAST"
+                         for key, desc in zip(self.keys, self._directions()))
+
+    def seek_sql(self, values):
+        """
+        Rows at or after `values` (one per key) in the page order, NULLs last:
+        k1 > v1 OR (k1 = v1 AND k2 > v2) OR ... OR (all keys equal)
+        """
+        terms = []
+        equal = []
+        for key, value, desc in zip(self.keys, values, self._directions()):
+            name = quote_identifier(key)
+            if _is_missing(value):
+                # Nothing sorts after NULL
+                equal.append(f"{name} IS NULL")
+                continue
+            literal = sql_literal(value)
+            after = f"({name} {'<' if desc else '>'} {literal} OR {name} IS NULL)"
+            terms.append(" AND ".join(equal + [after]))
+            equal.append(f"{name} = {literal}")
+        terms.append(" AND ".join(equal))
+        return " OR ".join(f"({term})" for term in terms)
+
+    def page_sql(self, cursor=None):
+        """SQL for the page after `cursor` (one extra row tells whether more follow)"""
+        conditions = [c for c in (self.where_sql(), cursor and self.seek_sql(cursor["values"])) if c]
+        sql = f"SELECT * FROM ({self.source_sql}) AS page_source"
+        if conditions:
+            sql += " WHERE " + " AND ".join(f"({c})" for c in conditions)
+        sql += f" ORDER BY {self.order_sql()} LIMIT {self.page_size + 1}"
+        if cursor and cursor["ties"]:
+            # Rows identical to the last one shown that were already on earlier pages
+            sql += f" OFFSET {cursor['ties']}"
+        return sql
+
+    # ---------- Pages ----------
+    def fetch(self, cursor=None):
+        """
+        The page after `cursor` (None = first page)
+
+        Raises:
+            RuntimeError: The page query failed
+        """
+        if self.in_memory:
+            return self._slice(cursor or {"offset": 0, "number": 1})
+        result = self.run_query(self.page_sql(cursor))
+        if not result.ok:
+            raise RuntimeError(result.error or "page query failed")
+        frame = result.frame if result.frame is not None else pd.DataFrame(columns=self.columns)
+        has_next = len(frame) > self.page_size
+        frame = frame.iloc[:self.page_size].reset_index(drop=True)
+        number = cursor["number"] if cursor else 1
+        return Page(frame, number, (number - 1) * self.page_size + 1, has_next,
+                    self._next_cursor(frame, cursor, number) if has_next else None)
+
+    def _next_cursor(self, frame, cursor, number):
+        last = tuple(frame[key].iloc[-1] for key in self.keys)
+        # Rows equal to the last one: the next seek starts at that row, so skip them
+        ties = 0
+        for i in range(len(frame) - 1, -1, -1):
+            if not all(_same(frame[key].iloc[i], value) for key, value in zip(self.keys, last)):
+                break
+            ties += 1
+        if ties == len(frame) and cursor and all(_same(a, b) for a, b in zip(cursor["values"], last)):
+            # A run of duplicates longer than a page
+            ties += cursor["ties"]
+        return {"values": last, "ties": ties, "number": number + 1}
+
+    def _slice(self, cursor):
+        frame = self.result.frame
+        offset = cursor["offset"]
+        rows = frame.iloc[offset:offset + self.page_size].reset_index(drop=True)
+        has_next = offset + self.page_size < len(frame)
+        return Page(rows, cursor["number"], offset + 1, has_next,
+                    {"offset": offset + self.page_size, "number": cursor["number"] + 1} if has_next else None)
+
+    @property
+    def exhausted_fetched_rows(self):
+        """Query-order paging stops at the rows already fetched when the result was capped"""
+        return self.in_memory and self.result.truncated
+
+    # ---------- Totals ----------
+    def total(self):
+        """
+        (rows, exact) of the filtered answer: the fetched row count when the
+        result was complete, else count_rows() (e.g. a planner estimate);
+        (None, False) if unknown
+        """
+        if self._total is None:
+            if self.in_memory and not self.result.truncated:
+                self._total = (len(self.result.frame), True)
+            elif self.count_rows is None:
+                self._total = (None, False)
+            else:
+                try:
+                    self._total = self.count_rows(self.filtered_sql())
+                except Exception as e:
+                    print(f"⚠️ Row count unavailable ({e})")
+                    self._total = (None, False)
+        return self._total
+
+
+def _same(a, b):
+    if _is_missing(a) or _is_missing(b):
+        return _is_missing(a) and _is_missing(b)
+    return a == b
+
+
+def raw_rows_text(frame, max_chars=MAX_RAW_CHARS):
+    """Rows as tuples, one per line, cut at `max_chars` (for the raw-output view)"""
+    lines = []
+    size = 0
+    for row in frame.itertuples(index=False, name=None):
+        line = repr(row)
+        if size + len(line) > max_chars:
+            lines.append(f"... {len(frame) - len(lines):,} more row(s) on this page")
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
@@ -0,0 +1,310 @@
+"""
+Rollup Routing for Agentic BI
+Materialized rollups of raw_sales_data over common dimensions, refreshed by
+ingestion, plus a rewriter that transparently answers generated GROUP BY SQL
+from the smallest rollup that can serve it
+"""
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from query_cache import get_table_versions
+from summary_tables import DAY_EXPR
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # Routing is an optimization - without sqlglot SQL just runs as generated
+    sqlglot = None
+
+BASE_TABLE = "raw_sales_data"
+DIMENSIONS = ("category", "region", "customer_type")
+
+# name -> (dimension columns, date grain). Ordered smallest first: the first
+# rollup that can answer a query wins.
+ROLLUPS = {
+    "mv_sales_by_dims": (("category", "region", "customer_type"), None),
+    "mv_sales_by_month": (("category", "region", "customer_type"), "month"),
+    "mv_sales_by_day": (("category", "region", "customer_type"), "day"),
+}
+
+DATE_GRAIN_EXPR = {
+    "day": f"({DAY_EXPR}) AS order_day",
+    "month": f"date_trunc('month', {DAY_EXPR})::date AS order_month",
+}
+DATE_GRAIN_COLUMN = {"day": "order_day", "month": "order_month"}
+
+AUDIT_LOG_PATH = os.getenv("AGENTIC_BI_ROLLUP_LOG", os.path.join(".cache", "rollup_rewrites.jsonl"))
+
+
+# ============= MAINTENANCE (called by ingest_data.py) =============
+
+def _rollup_sql(name, dimensions, grain):
+    group = list(dimensions)
+    select = list(dimensions)
+    if grain:
+        select.append(DATE_GRAIN_EXPR[grain])
+        group.append(DATE_GRAIN_COLUMN[grain])
+    return f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS
+        SELECT {", ".join(select)},
+               COUNT(*) AS order_count,
+               COUNT(sales_amount) AS sales_count,
+               SUM(sales_amount) AS total_sales,
+               MIN(sales_amount) AS min_sales,
+               MAX(sales_amount) AS max_sales
+        FROM {BASE_TABLE}
+        GROUP BY {", ".join(group)}
+    """
+
+
+def drop_rollups(cursor):
+    """Drop every rollup (they depend on the base table, which a full load replaces)"""
+    for name in ROLLUPS:
+        cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {name}")
+
+
+def create_rollups(cursor):
+    """Create any missing rollup over the current base table"""
+    for name, (dimensions, grain) in ROLLUPS.items():
+        cursor.execute(_rollup_sql(name, dimensions, grain))
+
+
+def refresh_rollups(cursor):
+    """
+    Bring every rollup up to date inside the caller's load transaction, so
+    rollups and base table always change together
+    """
+    cursor.execute("SELECT matviewname FROM pg_matviews WHERE matviewname = ANY(%s)", (list(ROLLUPS),))
+    existing = {row[0] for row in cursor.fetchall()}
+    for name in ROLLUPS:
+        if name in existing:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW {name}")
+    create_rollups(cursor)
+
+
+# ============= QUERY REWRITING =============
+
+class _NotRoutable(Exception):
+    pass
+
+
+_AGGREGATES = (exp.Count, exp.Sum, exp.Min, exp.Max, exp.Avg) if sqlglot else ()
+_MONTH_SAFE_UNITS = {"MONTH", "QUARTER", "YEAR"}
+
+
+def _date_grain(column):
+    """'month' if this order_date only feeds a month-or-coarser truncation/extract, else 'day'"""
+    node = column.parent
+    while isinstance(node, (exp.Cast, exp.TryCast, exp.Paren)):
+        node = node.parent
+    if isinstance(node, (exp.DateTrunc, exp.TimestampTrunc)):
+        unit = node.args.get("unit")
+        if unit is not None and unit.name.upper() in _MONTH_SAFE_UNITS:
+            return "month"
+    if isinstance(node, exp.Extract) and node.this.name.upper() in _MONTH_SAFE_UNITS:
+        return "month"
+    return "day"
+
+
+def _counts_rows(node):
+    """COUNT(*) / COUNT(1): every row, i.e. the rollup's order_count"""
+    return isinstance(node, exp.Count) and isinstance(node.this, (exp.Star, exp.Literal))
+
+
+def _check_aggregate(aggregate):
+    """
+    _NotRoutable unless the rollup has this aggregate's answer: COUNT(*),
+    an aggregate of the bare sales_amount column, or MIN/MAX of a dimension
+    (a rollup column itself)
+    """
+    if _counts_rows(aggregate):
+        return
+    argument = aggregate.this
+    if not isinstance(argument, exp.Column):
+        raise _NotRoutable(f"{aggregate.sql()} aggregates an expression")
+    name = argument.name.lower()
+    if name == "sales_amount":
+        return
+    if name in DIMENSIONS and isinstance(aggregate, (exp.Min, exp.Max)):
+        return
+    raise _NotRoutable(f"{aggregate.sql()} has no rollup measure")
+
+
+def _analyze(select):
+    """
+    Dimensions and date grain a query needs, and whether it filters on
+    order_date (WHERE / HAVING), or _NotRoutable
+    """
+    if not isinstance(select, exp.Select):
+        raise _NotRoutable("not a plain SELECT")
+    for unsupported in (exp.Join, exp.Subquery, exp.Window, exp.With, exp.Distinct):
+        if select.find(unsupported):
+            raise _NotRoutable(f"uses {unsupported.__name__}")
+    tables = list(select.find_all(exp.Table))
+    if len(tables) != 1 or tables[0].name.lower() != BASE_TABLE:
+        raise _NotRoutable(f"does not read only {BASE_TABLE}")
+    if not any(select.find_all(*_AGGREGATES)):
+        raise _NotRoutable("no aggregates")
+    if any(not isinstance(star.parent, exp.Count) for star in select.find_all(exp.Star)):
+        raise _NotRoutable("selects *")
+
+    for aggregate in select.find_all(*_AGGREGATES):
+        _check_aggregate(aggregate)
+
+    dimensions = set()
+    grain = None
+    for column in select.find_all(exp.Column):
+        name = column.name.lower()
+        if name in DIMENSIONS:
+            dimensions.add(name)
+        elif name == "order_date":
+            grain = "day" if "day" in (grain, _date_grain(column)) else "month"
+        elif name == "sales_amount":
+            if not isinstance(column.parent, _AGGREGATES) or column.parent.this is not column:
+                raise _NotRoutable("sales_amount used outside an aggregate")
+        else:
+            raise _NotRoutable(f"column {name} is not in any rollup")
+    filters = [select.args.get(clause) for clause in ("where", "having") if select.args.get(clause)]
+    filters_dates = any(column.name.lower() == "order_date"
+                        for clause in filters for column in clause.find_all(exp.Column))
+    return dimensions, grain, filters_dates
+
+
+def _choose_rollup(dimensions, grain, available):
+    for name, (rollup_dims, rollup_grain) in ROLLUPS.items():
+        if name not in available or not dimensions <= set(rollup_dims):
+            continue
+        if grain is None or rollup_grain == "day" or grain == rollup_grain:
+            return name, rollup_grain
+    return None, None
+
+
+def _rewrite(select, rollup, rollup_grain):
+    # Keep the output column names the original query would have produced
+    for i, projection in enumerate(select.expressions):
+        if isinstance(projection, exp.Alias):
+            continue
+        if isinstance(projection, _AGGREGATES):
+            select.expressions[i] = exp.alias_(projection, projection.key)
+        elif isinstance(projection, exp.Column):
+            select.expressions[i] = exp.alias_(projection, projection.name)
+
+    date_column = DATE_GRAIN_COLUMN.get(rollup_grain)
+    measures = {exp.Sum: "total_sales", exp.Min: "min_sales", exp.Max: "max_sales"}
+
+    def transform(node):
+        if isinstance(node, exp.Table):
+            return exp.to_table(rollup).as_(node.alias) if node.alias else exp.to_table(rollup)
+        if isinstance(node, exp.Count):
+            source = "order_count" if _counts_rows(node) else "sales_count"
+            return exp.cast(exp.Sum(this=exp.column(source)), "BIGINT")
+        if isinstance(node, exp.Avg):
+            return sqlglot.parse_one("SUM(total_sales) / NULLIF(SUM(sales_count), 0)", read="postgres")
+        if type(node) in measures and node.this.name.lower() == "sales_amount":
+            return type(node)(this=exp.column(measures[type(node)]))
+        if isinstance(node, exp.Column):
+            if node.name.lower() == "order_date":
+                # Text form of the ISO day/month keeps text comparisons and casts valid
+                return exp.cast(exp.column(date_column), "TEXT")
+            return exp.column(node.name)
+        return node
+
+    return select.transform(transform)
+
+
+class RollupRouter:
+    """
+    Rewrites aggregate SQL over raw_sales_data onto a materialized rollup
+
+    Only queries that are provably answerable from a rollup are touched:
+    a single SELECT over the base table, no joins/subqueries/windows/
+    DISTINCT, dimension columns anywhere, order_date only at a grain the
+    rollup has (and in filters only while every row has a valid date), and
+    aggregates only of the bare sales_amount column (COUNT/SUM/MIN/MAX/AVG),
+    COUNT(*), or MIN/MAX of a dimension.
+    Everything else runs unchanged. Every rewrite is appended to a JSONL
+    audit log.
+
+    Args:
+        engine: Engine used to discover which rollups exist
+        audit_log_path: JSONL file receiving one record per rewrite
+
+    Example:
+        router = RollupRouter(engine)
+        sql = router.rewrite("SELECT region, SUM(sales_amount) FROM raw_sales_data GROUP BY region")
+        # -> SELECT region, SUM(total_sales) AS sum FROM mv_sales_by_dims GROUP BY region
+    """
+
+    def __init__(self, engine, audit_log_path=AUDIT_LOG_PATH):
+        self.engine = engine
+        self.audit_log_path = audit_log_path
+        self.rewrites = 0
+        self._available = None
+        self._undated = False
+        self._versions = None
+        self._lock = threading.Lock()
+
+    def available_rollups(self):
+        """Rollups that currently exist, re-checked only after a new load"""
+        with self._lock:
+            versions = get_table_versions().get([BASE_TABLE])
+            if self._available is None or versions != self._versions:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(text(
+                        "SELECT matviewname FROM pg_matviews WHERE matviewname = ANY(:names)"
+                    ), {"names": list(ROLLUPS)}).fetchall()
+                    available = {row[0] for row in rows}
+                    self._undated = False
+                    for name, (_, grain) in ROLLUPS.items():
+                        if grain and name in available:
+                            # Every dated rollup has the same NULL day - one look is enough
+                            self._undated = bool(conn.execute(text(
+                                f"SELECT EXISTS (SELECT 1 FROM {name} WHERE {DATE_GRAIN_COLUMN[grain]} IS NULL)"
+                            )).scalar())
+                            break
+                self._available = available
+                self._versions = versions
+            return self._available
+
+    def has_undated_rows(self):
+        """
+        True if some base rows have no valid ISO order_date: the dated
+        rollups keep them in a NULL day, which a date filter would drop
+        while the base table's text comparison might keep them
+        """
+        self.available_rollups()
+        return self._undated
+
+    def rewrite(self, sql_query):
+        """`sql_query` rewritten onto a rollup, or unchanged if it can't be"""
+        if sqlglot is None or BASE_TABLE not in sql_query.lower():
+            return sql_query
+        try:
+            select = sqlglot.parse_one(sql_query, read="postgres")
+            dimensions, grain, filters_dates = _analyze(select)
+            rollup, rollup_grain = _choose_rollup(dimensions, grain, self.available_rollups())
+            if rollup is None or (filters_dates and self.has_undated_rows()):
+                return sql_query
+            rewritten = _rewrite(select, rollup, rollup_grain).sql(dialect="postgres")
+        except _NotRoutable:
+            return sql_query
+        except Exception as e:
+            print(f"⚠️ Rollup routing skipped: {e}")
+            return sql_query
+
+        self.rewrites += 1
+        print(f"--- Routed to rollup '{rollup}': {rewritten} ---")
+        self._audit(sql_query, rewritten, rollup)
+        return rewritten
+
+    def _audit(self, original, rewritten, rollup):
+        directory = os.path.dirname(self.audit_log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record = {"ts": time.time(), "rollup": rollup, "original": original, "rewritten": rewritten}
+        with self._lock, open(self.audit_log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
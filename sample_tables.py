@@ -0,0 +1,129 @@
+"""
+Sample Tables for Agentic BI
+A stratified random sample of raw_sales_data, maintained by ingestion, that
+approximate answers (approximate.py) read instead of the whole table
+
+Every (category, region) stratum keeps SAMPLE_FRACTION of its rows, but at
+least MIN_STRATUM_ROWS, so small segments are not lost in the sample. Each
+sampled row carries the weight it stands for (stratum rows / sampled rows)
+and a random bucket 0-9 - reading only the first buckets gives an even
+smaller sample for the very first answer.
+"""
+import os
+
+SAMPLE_TABLE = "raw_sales_data_sample"
+SAMPLE_FRACTION = float(os.getenv("AGENTIC_BI_SAMPLE_FRACTION", 0.01))
+MIN_STRATUM_ROWS = int(os.getenv("AGENTIC_BI_SAMPLE_MIN_ROWS", 500))
+SAMPLE_BUCKETS = 10
+# Columns the sample adds to the raw table's
+SAMPLE_COLUMNS = ("sample_draw", "sample_stratum", "stratum_rows", "sample_weight", "sample_bucket")
+
+# Uniform [0, 1) per row
+RANDOM_EXPR = {
+    "postgres": "random()",
+    "duckdb": "random()",
+    "sqlite": "((ABS(RANDOM()) % 1000000000) / 1000000000.0)",
+}
+# Keeps the subquery drawing the random numbers from being flattened into
+# its readers - SQLite would otherwise draw again at every reference
+DRAW_FENCE = {"sqlite": " LIMIT -1"}
+
+
+def stratum_expr(alias=None):
+    """Stratum key of a row - the same category/region labels as the daily summary"""
+    prefix = f"{alias}." if alias else ""
+    # Parenthesized: DuckDB binds = tighter than ||
+    return (f"(COALESCE(CAST({prefix}category AS TEXT), 'Unknown') || '|' || "
+            f"COALESCE(CAST({prefix}region AS TEXT), 'Unknown'))")
+
+
+def _keep_rate(rows):
+    """Share of a stratum of `rows` rows to keep"""
+    return (f"CASE WHEN {rows} * {SAMPLE_FRACTION} >= {MIN_STRATUM_ROWS} THEN {SAMPLE_FRACTION} "
+            f"WHEN {rows} <= {MIN_STRATUM_ROWS} THEN 1.0 ELSE {MIN_STRATUM_ROWS} * 1.0 / {rows} END")
+
+
+def _bucket_expr(rate):
+    """Bucket of a kept row: its draw is uniform below `rate`, so this is uniform over the buckets"""
+    return f"CAST(FLOOR(sample_draw / ({rate}) * {SAMPLE_BUCKETS}) AS INTEGER)"
+
+
+def sample_sql(source, dialect="postgres"):
+    """
+    SELECT producing the stratified, weighted sample of `source`
+
+    Each row's random draw is made once, in a subquery before the join
+    (DuckDB mis-plans a random() filter that also references the joined
+    strata), and kept as sample_draw; a kept row's draw is uniform below its
+    stratum's rate, which spreads the rows evenly over the buckets.
+    """
+    return f"""
+        WITH strata AS (
+            SELECT {stratum_expr()} AS sample_stratum, COUNT(*) AS stratum_rows
+            FROM {source}
+            GROUP BY 1
+        ), picked AS (
+            SELECT t.*, s.sample_stratum, s.stratum_rows
+            FROM (SELECT *, {RANDOM_EXPR[dialect]} AS sample_draw FROM {source}{DRAW_FENCE.get(dialect, "")}) t
+            JOIN strata s ON s.sample_stratum = {stratum_expr("t")}
+            WHERE t.sample_draw < {_keep_rate("s.stratum_rows")}
+        )
+        SELECT picked.*,
+               CAST(stratum_rows AS DOUBLE PRECISION) / COUNT(*) OVER (PARTITION BY sample_stratum) AS sample_weight,
+               {_bucket_expr(_keep_rate("stratum_rows"))} AS sample_bucket
+        FROM picked
+    """
+
+
+def rebuild_sample(cursor, source_table, dialect="postgres"):
+    """
+    Draw a fresh sample of `source_table` (used by full loads)
+
+    Runs in the caller's transaction, so it becomes visible together with
+    the table swap.
+    """
+    cursor.execute(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}")
+    cursor.execute(f"CREATE TABLE {SAMPLE_TABLE} AS {sample_sql(source_table, dialect)}")
+
+
+def apply_sample_delta(cursor, staging, columns, key_column="order_id"):
+    """
+    Fold an incremental batch into the sample (PostgreSQL)
+
+    Must run *after* the staging rows are upserted and the daily summary
+    updated: replaced rows leave the sample, incoming rows join it at their
+    stratum's current rate, and the weights of the strata the batch touched
+    are recomputed from the summary's row counts. Cost is proportional to
+    the batch plus the sampled rows of those strata.
+    """
+    from summary_tables import SUMMARY_TABLE
+
+    cursor.execute("SELECT to_regclass(%s)", (SAMPLE_TABLE,))
+    if cursor.fetchone()[0] is None:
+        return  # Never drawn - the next full load creates it
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    cursor.execute(f'DELETE FROM {SAMPLE_TABLE} WHERE "{key_column}" IN (SELECT "{key_column}" FROM "{staging}")')
+    cursor.execute(f"""
+        INSERT INTO {SAMPLE_TABLE} ({column_list}, {", ".join(SAMPLE_COLUMNS)})
+        SELECT {column_list}, sample_draw, sample_stratum, 0, 0, {_bucket_expr("sample_rate")}
+        FROM (
+            SELECT i.*, random() AS sample_draw, {stratum_expr("i")} AS sample_stratum,
+                   LEAST(COALESCE(r.rate, 1.0), 1.0) AS sample_rate
+            FROM "{staging}" i
+            LEFT JOIN (SELECT sample_stratum, 1.0 / AVG(sample_weight) AS rate
+                       FROM {SAMPLE_TABLE} WHERE sample_weight > 0 GROUP BY 1) r
+                ON r.sample_stratum = {stratum_expr("i")}
+        ) incoming
+        WHERE sample_draw < sample_rate
+    """)
+    cursor.execute(f"""
+        UPDATE {SAMPLE_TABLE} s
+        SET stratum_rows = totals.stratum_rows,
+            sample_weight = CAST(totals.stratum_rows AS DOUBLE PRECISION) / sampled.sampled_rows
+        FROM (SELECT (category || '|' || region) AS sample_stratum, SUM(order_count) AS stratum_rows
+              FROM {SUMMARY_TABLE} GROUP BY 1) totals,
+             (SELECT sample_stratum, COUNT(*) AS sampled_rows FROM {SAMPLE_TABLE} GROUP BY 1) sampled
+        WHERE s.sample_stratum = totals.sample_stratum
+          AND s.sample_stratum = sampled.sample_stratum
+          AND s.sample_stratum IN (SELECT {stratum_expr()} FROM "{staging}")
+    """)
@@ -0,0 +1,262 @@
+"""
+Schema Catalog for Agentic BI
+Introspects tables, columns and cheap statistics once, caches them, and builds
+the LLM prompt context from the cache instead of hard-coding the schema
+"""
+import hashlib
+import threading
+import time
+
+from sqlalchemy import inspect, text
+
+from query_cache import get_table_versions, question_terms
+
+# Bookkeeping tables created by ingest_data.py - never shown to the model
+# (the sample is only read by approximate.py's rewrites)
+INTERNAL_TABLE_SUFFIXES = ("_staging", "_delta", "_sample")
+INTERNAL_TABLES = {"ingest_watermarks"}
+
+PROMPT_RULES = """Return ONLY the SQL statement. No markdown, no backticks, no explanation.
+Example: SELECT SUM(sales_amount) FROM raw_sales_data;"""
+
+
+class SchemaCatalog:
+    """
+    Cached table/column/type metadata plus column statistics
+
+    On PostgreSQL, metadata comes from information_schema and statistics
+    from pg_stats (populated by the ANALYZE that ingestion runs after every
+    load), so a refresh is a couple of catalog queries and never scans the
+    data. Embedded engines have no planner statistics; there the few
+    numbers the prompt needs are computed with aggregate queries, which a
+    vectorized engine answers quickly. The catalog is only refreshed when
+    ingestion bumps a table's data version, or after `max_age_seconds` as a
+    safety net for tables created by hand.
+
+    Args:
+        engine: SQLAlchemy engine to introspect
+        schema: Database schema holding the analytics tables (None = default)
+        top_n: Number of most common values kept per text column
+        max_age_seconds: Force a refresh after this long even without a new load
+        label: Database name used in the prompt (e.g. "DuckDB")
+        prompt_hints: Dialect notes added to the prompt
+
+    Example:
+        catalog = SchemaCatalog(engine)
+        context = catalog.build_prompt_context()
+    """
+
+    def __init__(self, engine, schema="public", top_n=5, max_age_seconds=3600, label="PostgreSQL", prompt_hints=""):
+        self.engine = engine
+        self.schema = schema
+        self.label = label
+        self.prompt_hints = prompt_hints
+        self.top_n = top_n
+        self.max_age_seconds = max_age_seconds
+        self.refreshes = 0
+        self._tables = None
+        self._versions = None
+        self._loaded_at = 0.0
+        self._full_context = (None, None)
+        self._vocabulary_cache = (None, None)
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        if self._tables is None:
+            return True
+        if time.time() - self._loaded_at > self.max_age_seconds:
+            return True
+        return get_table_versions().snapshot() != self._versions
+
+    def tables(self):
+        """{table: {"rows": int, "columns": [column dicts]}}, refreshed only when stale"""
+        with self._lock:
+            if self._is_stale():
+                versions = get_table_versions().snapshot()
+                self._tables = self._introspect()
+                self._versions = versions
+                self._loaded_at = time.time()
+                self.refreshes += 1
+            return self._tables
+
+    def invalidate(self):
+        """Force the next lookup to re-introspect"""
+        with self._lock:
+            self._tables = None
+
+    def _introspect(self):
+        with self.engine.connect() as conn:
+            tables = self._columns(conn)
+            if tables:
+                if conn.dialect.name == "postgresql":
+                    self._add_planner_stats(conn, tables)
+                else:
+                    self._add_scanned_stats(conn, tables)
+        return tables
+
+    def _columns(self, conn):
+        if conn.dialect.name == "sqlite":
+            inspector = inspect(conn)
+            columns = [(table, column["name"], str(column["type"]).lower())
+                       for table in inspector.get_table_names() + inspector.get_view_names()
+                       for column in inspector.get_columns(table)]
+        else:
+            columns = conn.execute(text("""
+                SELECT table_name, column_name, data_type
+                FROM information_schema.columns
+                WHERE table_schema = :schema
+                ORDER BY table_name, ordinal_position
+            """), {"schema": self.schema}).fetchall()
+        tables = {}
+        for table, column, data_type in columns:
+            if table in INTERNAL_TABLES or table.endswith(INTERNAL_TABLE_SUFFIXES):
+                continue
+            entry = tables.setdefault(table, {"rows": None, "columns": []})
+            entry["columns"].append({"name": column, "type": data_type})
+        return tables
+
+    def _add_planner_stats(self, conn, tables):
+        row_counts = conn.execute(text("""
+            SELECT c.relname, c.reltuples::bigint
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = ANY(:tables)
+        """), {"schema": self.schema, "tables": list(tables)}).fetchall()
+        for table, rows in row_counts:
+            tables[table]["rows"] = rows if rows >= 0 else None
+
+        stats = conn.execute(text("""
+            SELECT tablename, attname, n_distinct,
+                   most_common_vals::text::text[] AS top_values,
+                   histogram_bounds::text::text[] AS bounds
+            FROM pg_stats
+            WHERE schemaname = :schema AND tablename = ANY(:tables)
+        """), {"schema": self.schema, "tables": list(tables)}).fetchall()
+        by_column = {(s.tablename, s.attname): s for s in stats}
+
+        for table, entry in tables.items():
+            for column in entry["columns"]:
+                stat = by_column.get((table, column["name"]))
+                if stat is None:
+                    continue
+                # Negative n_distinct is a fraction of the row count
+                distinct = stat.n_distinct
+                if distinct is not None and distinct < 0 and entry["rows"]:
+                    distinct = -distinct * entry["rows"]
+                column["distinct"] = int(distinct) if distinct else None
+                values = list(stat.top_values or [])
+                bounds = list(stat.bounds or [])
+                is_text = column["type"] in ("text", "character varying", "character")
+                if is_text and column["distinct"] and column["distinct"] <= 50:
+                    column["top_values"] = values[:self.top_n]
+                if "date" in column["name"] or "time" in column["type"]:
+                    candidates = sorted(bounds or values)
+                    if candidates:
+                        column["min"], column["max"] = candidates[0], candidates[-1]
+
+    def _add_scanned_stats(self, conn, tables):
+        """Row counts, distinct counts, top values and date ranges via aggregate queries"""
+        for table, entry in tables.items():
+            entry["rows"] = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+            for column in entry["columns"]:
+                name, data_type = column["name"], column["type"].lower()
+                is_text = data_type in ("text", "varchar", "character varying", "character") or \
+                    data_type.startswith("varchar")
+                is_date = "date" in name or "date" in data_type or "time" in data_type
+                if not (is_text or is_date):
+                    continue
+                distinct, low, high = conn.execute(text(
+                    f'SELECT COUNT(DISTINCT "{name}"), MIN("{name}"), MAX("{name}") FROM "{table}"')).fetchone()
+                column["distinct"] = distinct or None
+                if is_text and distinct and distinct <= 50:
+                    top = conn.execute(text(
+                        f'SELECT "{name}" FROM "{table}" WHERE "{name}" IS NOT NULL '
+                        f'GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT {int(self.top_n)}')).fetchall()
+                    column["top_values"] = [str(row[0]) for row in top]
+                if is_date and low is not None:
+                    column["min"], column["max"] = str(low), str(high)
+
+    def fingerprint(self):
+        """
+        Hash of the table/column/type structure only
+
+        Statistics are deliberately left out so routine loads don't
+        invalidate every cached translation.
+        """
+        structure = sorted(
+            (table, tuple((c["name"], c["type"]) for c in entry["columns"]))
+            for table, entry in self.tables().items()
+        )
+        return hashlib.sha256(repr(structure).encode("utf-8")).hexdigest()[:16]
+
+    def relevant_columns(self, question):
+        """
+        {table: {column, ...}} the question seems to be about: columns whose
+        name words or most common values appear in it (see question_terms()).
+        Tables without a match are left out; None if nothing matched.
+        """
+        terms = question_terms(question)
+        relevant = {}
+        for table, (table_words, column_words) in self._vocabulary().items():
+            columns = {name for name, words in column_words if words & terms}
+            if columns or table_words & terms:
+                relevant[table] = columns
+        return relevant or None
+
+    def _vocabulary(self):
+        """{table: (table words, [(column, words of its name and top values)])}, per refresh"""
+        tables = self.tables()
+        if self._vocabulary_cache[0] is not tables:
+            vocabulary = {}
+            for table, entry in tables.items():
+                column_words = []
+                for column in entry["columns"]:
+                    words = question_terms(column["name"].replace("_", " "))
+                    for value in column.get("top_values") or ():
+                        words |= question_terms(str(value))
+                    column_words.append((column["name"], words))
+                vocabulary[table] = (question_terms(table.replace("_", " ")), column_words)
+            self._vocabulary_cache = (tables, vocabulary)
+        return self._vocabulary_cache[1]
+
+    def build_prompt_context(self, question=None):
+        """
+        LLM prompt describing the tables from the cached catalog
+
+        With a `question`, only the tables it seems to be about are
+        described, and only their relevant columns get statistics; the
+        other columns are listed by name and type on one line.
+        """
+        tables = self.tables()
+        if not question and self._full_context[0] is tables:
+            return self._full_context[1]
+        relevant = self.relevant_columns(question) if question else None
+        lines = [f"You are a SQL expert for a {self.label} database."]
+        for table, entry in sorted(tables.items()):
+            if relevant is not None and table not in relevant:
+                continue
+            size = f" (~{entry['rows']:,} rows)" if entry["rows"] else ""
+            lines.append(f"Table '{table}'{size}. Columns:")
+            others = []
+            for column in entry["columns"]:
+                if relevant is not None and column["name"] not in relevant[table]:
+                    others.append(f"{column['name']} ({column['type']})")
+                    continue
+                details = []
+                if column.get("distinct"):
+                    details.append(f"~{column['distinct']:,} distinct")
+                if column.get("top_values"):
+                    details.append("values: " + ", ".join(column["top_values"]))
+                if column.get("min") is not None:
+                    details.append(f"range {column['min']} .. {column['max']}")
+                suffix = f" - {'; '.join(details)}" if details else ""
+                lines.append(f"  - {column['name']} ({column['type']}){suffix}")
+            if others:
+                lines.append(f"  - Other columns: {', '.join(others)}")
+        if self.prompt_hints:
+            lines.append(self.prompt_hints)
+        lines.append(PROMPT_RULES)
+        context = "\n".join(lines)
+        if not question:
+            # Rebuilt only after a refresh (tables() then returns a new dict)
+            self._full_context = (tables, context)
+        return context
@@ -0,0 +1,76 @@
+"""
+Settings for Agentic BI
+Gemini, question-answering and database configuration, read once from the
+environment (or .env) on first use
+
+    GOOGLE_API_KEY              Gemini API key
+    GEMINI_MODEL                Model id (default gemini-flash-lite-latest)
+    GEMINI_RPM / GEMINI_TPM     Free-tier quota shared through the scheduler
+    GEMINI_OUTPUT_TOKENS        Output tokens reserved (and capped) per call
+    GEMINI_PROMPT_EXAMPLES      Similar past question -> SQL pairs shown to the model
+    SQL_REPAIR_ATTEMPTS         Times failed SQL may go back to Gemini
+    SQL_REPAIR_BUDGET_SECONDS   Time budget for those repairs per question
+    AGENTIC_BI_ASYNC_POOL_SIZE  Pooled async connections per event loop
+    AGENTIC_BI_BACKEND          postgres (default) | duckdb | parquet | sqlite (see backends.py)
+    AGENTIC_BI_DATABASE_URL     Full SQLAlchemy URL, overrides the backend default
+    AGENTIC_BI_DUCKDB_PATH      DuckDB database file
+    AGENTIC_BI_SQLITE_PATH      SQLite database file
+    AGENTIC_BI_CSV              CSV file or glob DuckDB queries in place until something is ingested
+    AGENTIC_BI_PG_*             PostgreSQL USER / PASSWORD / HOST / PORT / DATABASE (without a URL)
+"""
+import os
+import threading
+from urllib.parse import quote_plus
+
+from dotenv import load_dotenv
+
+
+class Settings:
+    """
+    Configuration snapshot of an environment mapping
+
+    Args:
+        environ: Mapping to read (default: os.environ)
+    """
+
+    def __init__(self, environ=None):
+        env = os.environ if environ is None else environ
+        self.google_api_key = env.get("GOOGLE_API_KEY")
+        # Hum 'flash-lite' use karenge kyunki ye quota kam khata hai
+        self.model_id = env.get("GEMINI_MODEL", "gemini-flash-lite-latest")
+        self.gemini_rpm = int(env.get("GEMINI_RPM", 15))
+        self.gemini_tpm = int(env.get("GEMINI_TPM", 250_000))
+        self.expected_output_tokens = int(env.get("GEMINI_OUTPUT_TOKENS", 256))
+        self.prompt_examples = int(env.get("GEMINI_PROMPT_EXAMPLES", 2))
+        self.max_repair_attempts = int(env.get("SQL_REPAIR_ATTEMPTS", 2))
+        self.repair_budget_seconds = float(env.get("SQL_REPAIR_BUDGET_SECONDS", 20))
+        self.async_pool_size = int(env.get("AGENTIC_BI_ASYNC_POOL_SIZE", 10))
+        # Database (backends.py)
+        self.backend = env.get("AGENTIC_BI_BACKEND")
+        self.database_url = env.get("AGENTIC_BI_DATABASE_URL")
+        self.duckdb_path = env.get("AGENTIC_BI_DUCKDB_PATH", os.path.join("data", "agentic_bi.duckdb"))
+        self.sqlite_path = env.get("AGENTIC_BI_SQLITE_PATH", os.path.join("data", "agentic_bi.sqlite"))
+        self.csv_source = env.get("AGENTIC_BI_CSV", os.path.join("data", "sales_data.csv"))
+        raw_password = env.get("AGENTIC_BI_PG_PASSWORD", "@Anvesha94") # <--- Apna password .env mein likhein
+        self.postgres_url = (f"postgresql://{env.get('AGENTIC_BI_PG_USER', 'postgres')}:{quote_plus(raw_password)}"
+                             f"@{env.get('AGENTIC_BI_PG_HOST', 'localhost')}:{env.get('AGENTIC_BI_PG_PORT', '5432')}"
+                             f"/{env.get('AGENTIC_BI_PG_DATABASE', 'agentic_bi')}")
+
+    def __repr__(self):
+        return (f"Settings(backend={self.backend!r}, model_id={self.model_id!r}, gemini_rpm={self.gemini_rpm}, gemini_tpm={self.gemini_tpm}, "
+                f"max_repair_attempts={self.max_repair_attempts}, api_key={'set' if self.google_api_key else 'missing'})")
+
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def get_settings():
+    """Process-wide settings; .env is loaded on the first call"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                load_dotenv()
+                _settings = Settings()
+    return _settings
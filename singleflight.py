@@ -0,0 +1,106 @@
+"""
+Single-Flight Request Coalescing
+Concurrent callers asking for the same key share one in-flight computation
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Thread-based single-flight: the first caller for a key runs the function,
+    concurrent callers with the same key block on its future and get the
+    same result (or the same exception)
+
+    Streamlit runs every session in its own thread of one process, so this
+    collapses N identical dashboard clicks into one Gemini call / one query.
+    Nothing is remembered once the call finishes - caching is the caches' job.
+
+    Example:
+        flight = SingleFlight()
+        rows = flight.do(sql_key, run_query, sql)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) once per key among concurrent callers"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio single-flight: concurrent awaiters of the same key share one task
+
+    Each waiter awaits the shared task through asyncio.shield(), so
+    cancelling one waiter never cancels the work the others are waiting on.
+    In-flight tasks are tracked per event loop.
+
+    Example:
+        flight = AsyncSingleFlight()
+        rows = await flight.do(sql_key, run_query_async, sql)
+    """
+
+    def __init__(self):
+        self._loops = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key, coro_fn, *args, **kwargs):
+        """Await coro_fn(*args, **kwargs) once per key among concurrent callers"""
+        tasks = self._loops.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            tasks[key] = task
+            self.leaders += 1
+
+            def _forget(done, key=key):
+                if tasks.get(key) is done:
+                    del tasks[key]
+                if not done.cancelled():
+                    done.exception()  # mark retrieved even if every waiter was cancelled
+
+            task.add_done_callback(_forget)
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        in_flight = sum(len(tasks) for tasks in self._loops.values())
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": in_flight}
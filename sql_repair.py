@@ -0,0 +1,261 @@
+"""
+SQL Validation and Repair for Agentic BI
+Checks generated SQL against the cached schema catalog before it reaches the
+database and fixes trivial mistakes locally, so only real errors cost another
+Gemini round trip
+"""
+import re
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+    from sqlglot.optimizer.scope import traverse_scope
+except ImportError:  # Only markdown fences get stripped; the database reports the rest
+    sqlglot = None
+
+_FENCE_RE = re.compile(r"```[ \t]*(?:sql|postgresql|postgres|duckdb|sqlite)?[ \t]*\n?(.*?)(?:```|$)",
+                       re.IGNORECASE | re.DOTALL)
+_SQL_START_RE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE | re.MULTILINE)
+# Dialect LLMs fall back to when they ignore the prompt's dialect
+_FALLBACK_DIALECT = "postgres"
+# Edits a name may be away from a real column / table and still be repaired
+# locally - more than that is a guess, and guesses go back to the model
+MAX_TYPO_EDITS = 1
+
+
+class SqlValidationError(Exception):
+    """Generated SQL that can't be fixed locally (the problems go back to the model)"""
+
+    def __init__(self, problems, sql=None):
+        problems = list(dict.fromkeys(problems))
+        super().__init__("; ".join(problems))
+        self.problems = problems
+        self.sql = sql
+
+
+class CheckedSql:
+    """
+    Outcome of validate_sql()
+
+    Attributes:
+        sql: SQL to run (repaired if fixes were applied)
+        fixes: Human-readable list of local repairs
+        problems: Unrecoverable problems (empty if the SQL looks runnable)
+    """
+
+    def __init__(self, sql, fixes=None, problems=None):
+        self.sql = sql
+        self.fixes = fixes or []
+        self.problems = problems or []
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    @property
+    def repaired(self):
+        return bool(self.fixes)
+
+    def __repr__(self):
+        return f"CheckedSql(fixes={self.fixes}, problems={self.problems})"
+
+
+def strip_markdown(text):
+    """
+    SQL from model output: contents of a ```sql fence if there is one, and
+    no chatter before the first SELECT / WITH
+
+    Returns (sql, fixes).
+    """
+    fixes = []
+    sql = text.strip()
+    if "```" in sql:
+        match = _FENCE_RE.search(sql)
+        sql = (match.group(1) if match else sql).replace("```", "").strip()
+        fixes.append("removed markdown fences")
+    start = _SQL_START_RE.search(sql)
+    if start and start.start(1) > 0:
+        sql = sql[start.start(1):]
+        fixes.append("removed text before the query")
+    return sql, fixes
+
+
+def _schema_map(tables):
+    """{table (lower): (table, {column (lower): column})} from SchemaCatalog.tables()"""
+    return {
+        table.lower(): (table, {c["name"].lower(): c["name"] for c in entry["columns"]})
+        for table, entry in tables.items()
+    }
+
+
+def _within_one_edit(a, b):
+    """True if `a` becomes `b` by inserting, deleting or replacing one character"""
+    if abs(len(a) - len(b)) > MAX_TYPO_EDITS:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+def _closest(name, candidates):
+    """
+    Real name `name` certainly meant, or None
+
+    Certain means a case / quoting difference, or a one-character typo that
+    matches exactly one candidate. Anything looser (customer_id vs
+    customer_type) is left for the model to decide.
+    """
+    lowered = {c.lower(): c for c in candidates}
+    if name.lower() in lowered:
+        return lowered[name.lower()]
+    typos = [real for low, real in lowered.items() if _within_one_edit(name.lower(), low)]
+    return typos[0] if len(typos) == 1 else None
+
+
+def _parse(sql, dialect):
+    """Parse `sql` (one statement), trying the fallback dialect if needed; returns (tree, fixes)"""
+    try:
+        return sqlglot.parse_one(sql, read=dialect), []
+    except SqlglotError as e:
+        if dialect == _FALLBACK_DIALECT:
+            raise
+        try:
+            tree = sqlglot.parse_one(sql, read=_FALLBACK_DIALECT)
+        except SqlglotError:
+            raise e
+        return tree, [f"translated {_FALLBACK_DIALECT} syntax to {dialect}"]
+
+
+def _describe(error):
+    """One-line description of a sqlglot parse error"""
+    details = getattr(error, "errors", None)
+    if details:
+        first = details[0]
+        return f"{first.get('description')} (line {first.get('line')}, column {first.get('col')})"
+    return str(error).splitlines()[0] if str(error) else type(error).__name__
+
+
+def _fix_tables(tree, schema, fixes, problems):
+    ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    for table in tree.find_all(exp.Table):
+        name = table.name
+        if not name or name.lower() in ctes or name.lower() in schema:
+            continue
+        match = _closest(name, [real for real, _ in schema.values()])
+        if match:
+            table.set("this", exp.to_identifier(match))
+            fixes.append(f"table {name} -> {match}")
+        else:
+            problems.append(f"Unknown table '{name}' (tables: {', '.join(sorted(schema))})")
+
+
+def _is_value_position(column):
+    """True for "North" in `region = "North"` - a string written with double quotes"""
+    parent = column.parent
+    if isinstance(parent, (exp.EQ, exp.NEQ)):
+        other = parent.this if parent.expression is column else parent.expression
+        return isinstance(other, exp.Column)
+    return isinstance(parent, exp.In) and column is not parent.this
+
+
+def _scope_columns(scope, schema):
+    """Columns of every base table visible in `scope` (including outer scopes)"""
+    visible = {}
+    while scope is not None:
+        for source in scope.sources.values():
+            if isinstance(source, exp.Table) and source.name.lower() in schema:
+                visible.update(schema[source.name.lower()][1])
+        scope = scope.parent
+    return visible
+
+
+def _fix_columns(tree, schema, fixes, problems):
+    for scope in traverse_scope(tree):
+        select = scope.expression
+        aliases = {e.alias.lower() for e in select.selects if e.alias} if isinstance(select, exp.Select) else set()
+        sources = scope.sources
+        # Columns can only be checked when every source is a known table
+        all_tables = bool(sources) and all(
+            isinstance(s, exp.Table) and s.name.lower() in schema for s in sources.values())
+        for column in scope.columns:
+            name = column.name
+            if not name or isinstance(column.this, exp.Star):
+                continue
+            if column.table:
+                source = sources.get(column.table)
+                if not (isinstance(source, exp.Table) and source.name.lower() in schema):
+                    continue  # derived table / CTE / outer reference - leave to the database
+                candidates = schema[source.name.lower()][1]
+            elif name.lower() in aliases:
+                continue  # ORDER BY / HAVING on an output alias
+            elif all_tables:
+                candidates = _scope_columns(scope, schema)
+            else:
+                continue
+
+            quoted = column.this.quoted
+            if name.lower() in candidates and (not quoted or candidates[name.lower()] == name):
+                continue
+            match = _closest(name, list(candidates.values()))
+            if match:
+                column.set("this", exp.to_identifier(match, quoted=quoted and match != match.lower()))
+                fixes.append(f"column {name} -> {match}")
+            elif quoted and not column.table and _is_value_position(column):
+                column.replace(exp.Literal.string(name))
+                fixes.append(f'"{name}" -> \'{name}\' (string literal)')
+            else:
+                problems.append(f"Unknown column '{name}' (columns: {', '.join(sorted(candidates.values()))})")
+
+
+def validate_sql(sql, tables, dialect="postgres"):
+    """
+    Check generated SQL against the schema and repair what can be repaired
+    without the model
+
+    Local repairs: markdown fences / leading chatter, wrongly-cased table
+    and column names or ones a single typo away from exactly one name in
+    the catalog, strings written in double quotes, and syntax of the fallback
+    dialect re-generated for the backend's dialect. Anything else (syntax
+    errors, columns with no close match) is reported in `problems`. SQL that
+    needed no repair is returned byte-for-byte, so cache keys don't change.
+
+    Args:
+        sql: Raw model output
+        tables: SchemaCatalog.tables() (None skips the schema checks)
+        dialect: sqlglot dialect of the backend
+
+    Returns:
+        CheckedSql
+    """
+    sql, fixes = strip_markdown(sql)
+    if not sql:
+        return CheckedSql(sql, fixes, ["The response contained no SQL query."])
+    if sqlglot is None:
+        return CheckedSql(sql, fixes)
+
+    problems = []
+    local_fixes = []
+    try:
+        tree, parse_fixes = _parse(sql, dialect)
+    except SqlglotError as e:
+        return CheckedSql(sql, fixes, [f"Syntax error: {_describe(e)}"])
+    fixes += parse_fixes
+
+    if tables:
+        schema = _schema_map(tables)
+        _fix_tables(tree, schema, local_fixes, problems)
+        try:
+            _fix_columns(tree, schema, local_fixes, problems)
+        except SqlglotError:
+            pass  # Scope analysis gave up (exotic syntax) - the database will judge
+
+    if parse_fixes or local_fixes:
+        sql = tree.sql(dialect=dialect)
+    # The same typo in SELECT and GROUP BY is one fix (or one problem)
+    return CheckedSql(sql, list(dict.fromkeys(fixes + local_fixes)), list(dict.fromkeys(problems)))
@@ -0,0 +1,110 @@
+"""
+Summary Tables for Agentic BI
+A small daily rollup of raw_sales_data, maintained by ingestion, so the
+dashboard never scans the raw table for its headline numbers
+"""
+
+SUMMARY_TABLE = "sales_daily_summary"
+
+
+def _iso_day(value):
+    """
+    SQL turning text `value` that starts with an ISO date into a DATE, and
+    anything else - including impossible dates like 2024-13-45 or 2023-02-29
+    - into NULL rather than an error (PostgreSQL has no TRY_CAST)
+
+    The nested CASE only reaches make_date() / ::date once the shape and
+    month are known good; '.*' because DuckDB's ~ matches the whole string.
+    """
+    return (f"CASE WHEN {value} ~ '^\\d{{4}}-(0[1-9]|1[0-2])-(0[1-9]|[12]\\d|3[01]).*' "
+            f"AND left({value}, 4) <> '0000' "
+            f"THEN CASE WHEN substr({value}, 9, 2)::int <= extract(day from "
+            f"make_date(left({value}, 4)::int, substr({value}, 6, 2)::int, 1) + interval '1 month' - interval '1 day') "
+            f"THEN left({value}, 10)::date END END")
+
+
+# order_date is ingested as text; rows without a valid ISO date land in a NULL day
+DAY_EXPR = _iso_day("order_date::text")
+GROUP_COLUMNS = "order_day, category, region"
+CONFLICT_TARGET = "(COALESCE(order_day, 'infinity'::date), category, region)"
+
+# Headline numbers for the sidebar
+STATS_SQL = f"SELECT SUM(order_count) AS total_records, SUM(total_sales) AS total_sales FROM {SUMMARY_TABLE}"
+
+# Quick-query tiles answered straight from the rollup (no LLM round trip)
+QUICK_QUERY_SQL = {
+    "What is the total sales amount?":
+        f"SELECT SUM(total_sales) AS total_sales FROM {SUMMARY_TABLE}",
+    "How many orders do we have?":
+        f"SELECT SUM(order_count) AS total_orders FROM {SUMMARY_TABLE}",
+    "Which category has the highest sales?":
+        f"SELECT category, SUM(total_sales) AS total_sales FROM {SUMMARY_TABLE} "
+        f"GROUP BY category ORDER BY total_sales DESC LIMIT 1",
+    "Show me sales by region":
+        f"SELECT region, SUM(total_sales) AS total_sales FROM {SUMMARY_TABLE} "
+        f"GROUP BY region ORDER BY total_sales DESC",
+}
+
+
+def _aggregate_sql(source, sign=1):
+    """Per (day, category, region) count/sum of `source`, multiplied by `sign`"""
+    return f"""
+        SELECT {DAY_EXPR} AS order_day,
+               COALESCE(category::text, 'Unknown') AS category,
+               COALESCE(region::text, 'Unknown') AS region,
+               {sign} * COUNT(*) AS order_count,
+               {sign} * COALESCE(SUM(sales_amount), 0) AS total_sales
+        FROM {source}
+        GROUP BY 1, 2, 3
+    """
+
+
+def ensure_summary_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+            order_day DATE,
+            category TEXT NOT NULL,
+            region TEXT NOT NULL,
+            order_count BIGINT NOT NULL,
+            total_sales NUMERIC NOT NULL
+        )
+    """)
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {SUMMARY_TABLE}_key ON {SUMMARY_TABLE} {CONFLICT_TARGET}")
+
+
+def rebuild_summary(cursor, source_table):
+    """
+    Recompute the whole rollup from `source_table` (used by full loads)
+
+    Runs in the caller's transaction, so it becomes visible together with
+    the table swap.
+    """
+    ensure_summary_table(cursor)
+    cursor.execute(f"DELETE FROM {SUMMARY_TABLE}")
+    cursor.execute(f"INSERT INTO {SUMMARY_TABLE} ({GROUP_COLUMNS}, order_count, total_sales) "
+                   f"{_aggregate_sql(source_table)}")
+
+
+def apply_summary_delta(cursor, staging, target_table, key_column="order_id"):
+    """
+    Fold an incremental batch into the rollup - cost proportional to the batch
+
+    Must run *before* the staging rows are upserted: the current versions of
+    rows about to be overwritten (found via the `key_column` index) are
+    subtracted, then the incoming rows are added. `staging` must hold one
+    row per key (ingest_data.keep_latest_rows()), the same rows the upsert
+    writes.
+    """
+    ensure_summary_table(cursor)
+    incoming = f'"{staging}" AS incoming'
+    replaced = (f'(SELECT t.* FROM "{target_table}" t '
+                f'WHERE t."{key_column}" IN (SELECT "{key_column}" FROM "{staging}")) AS replaced')
+    for source, sign in ((replaced, -1), (incoming, 1)):
+        cursor.execute(f"""
+            INSERT INTO {SUMMARY_TABLE} ({GROUP_COLUMNS}, order_count, total_sales)
+            {_aggregate_sql(source, sign)}
+            ON CONFLICT {CONFLICT_TARGET} DO UPDATE SET
+                order_count = {SUMMARY_TABLE}.order_count + EXCLUDED.order_count,
+                total_sales = {SUMMARY_TABLE}.total_sales + EXCLUDED.total_sales
+        """)
+    cursor.execute(f"DELETE FROM {SUMMARY_TABLE} WHERE order_count = 0")
@@ -0,0 +1,4 @@
+import os
+
+# Spans stay in memory - tests never write .cache/traces.jsonl
+os.environ.setdefault("AGENTIC_BI_TRACE_FILE", "")
@@ -0,0 +1,104 @@
+import math
+
+import pytest
+
+pytest.importorskip("sqlglot")
+duckdb = pytest.importorskip("duckdb")
+
+from approximate import Z_95, plan_approximation, estimate_result  # noqa: E402
+from query_result import QueryResult  # noqa: E402
+from sample_tables import SAMPLE_TABLE  # noqa: E402
+
+BIG = 10_000_000
+
+
+@pytest.fixture
+def run_query():
+    # Every base row is sampled once with weight 2 (as if half the table were drawn), all in bucket 0
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE raw_sales_data (region VARCHAR, customer_id INTEGER, sales_amount DOUBLE)")
+    connection.execute("INSERT INTO raw_sales_data VALUES ('North', 1, 1), ('North', 2, 2), ('South', 3, 3)")
+    connection.execute(f"CREATE TABLE {SAMPLE_TABLE} AS SELECT *, 2.0 AS sample_weight, 0 AS sample_bucket "
+                       "FROM raw_sales_data")
+
+    def run(sql):
+        frame = connection.execute(sql).df()
+        return QueryResult(frame, sql=sql, source_sql=sql)
+
+    yield run
+    connection.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT region, MAX(sales_amount) FROM raw_sales_data GROUP BY region",
+    "SELECT * FROM raw_sales_data",
+    "SELECT region, SUM(sales_amount) FROM raw_sales_data GROUP BY region HAVING SUM(sales_amount) > 1",
+    "SELECT SUM(DISTINCT sales_amount) FROM raw_sales_data",
+    "SELECT SUM(sales_amount) FROM other_table",
+    "SELECT SUM(a.sales_amount) FROM raw_sales_data a JOIN raw_sales_data b ON a.region = b.region",
+])
+def test_not_approximable(sql):
+    assert plan_approximation(sql, "duckdb", table_rows=BIG) is None
+
+
+def test_small_tables_run_exactly():
+    sql = "SELECT SUM(sales_amount) FROM raw_sales_data"
+    assert plan_approximation(sql, "duckdb", table_rows=10, min_rows=1_000) is None
+    assert plan_approximation(sql, "duckdb", table_rows=1_000, min_rows=1_000) is not None
+
+
+def test_count_distinct_needs_a_sketch_and_many_values():
+    sql = "SELECT COUNT(DISTINCT customer_id) FROM raw_sales_data"
+    assert plan_approximation(sql, "postgres", table_rows=BIG) is None
+    assert plan_approximation(sql, "duckdb", table_rows=BIG, distinct_counts={"customer_id": 50}) is None
+    plan = plan_approximation(sql, "duckdb", table_rows=BIG, distinct_counts={"customer_id": BIG})
+    assert [stage.method for stage in plan.stages] == ["sketch"]
+    assert "APPROX_COUNT_DISTINCT" in plan.stages[0].sql.upper()
+
+
+def test_sample_stages_read_the_sample():
+    plan = plan_approximation("SELECT region, SUM(sales_amount) FROM raw_sales_data GROUP BY region", "duckdb",
+                              table_rows=BIG)
+    assert [stage.method for stage in plan.stages] == ["sample", "sample"]
+    assert plan.stages[0].fraction < plan.stages[1].fraction
+    assert "sample_bucket < 1" in plan.stages[0].sql
+    assert all(SAMPLE_TABLE in stage.sql for stage in plan.stages)
+    # Unnamed aggregates get a stable name shared with the exact SQL
+    assert plan.exact_sql.endswith("AS sum FROM raw_sales_data GROUP BY region")
+
+
+def test_estimates_are_weighted_with_bounds(run_query):
+    sql = ("SELECT region, SUM(sales_amount) AS total, COUNT(*) AS orders, AVG(sales_amount) AS mean "
+           "FROM raw_sales_data GROUP BY region ORDER BY region")
+    plan = plan_approximation(sql, "duckdb", table_rows=BIG)
+    raw = run_query(plan.stages[-1].sql)
+    estimate = estimate_result(raw, plan, len(plan.stages) - 1)
+
+    assert list(estimate.frame.columns) == ["region", "total", "orders", "mean"]
+    assert estimate.frame["total"].tolist() == [6.0, 6.0]
+    assert estimate.frame["orders"].tolist() == [4.0, 2.0]
+    assert estimate.frame["mean"].tolist() == [1.5, 3.0]
+    # Horvitz-Thompson: Var(SUM) ~ SUM(w * (w - 1) * x^2) = 2 * (1 + 4) for North
+    bounds = estimate.approximation.bounds
+    assert bounds["total"][0] == pytest.approx(Z_95 * math.sqrt(10))
+    assert bounds["orders"][1] == pytest.approx(Z_95 * math.sqrt(2))
+    assert estimate.approximation.final
+    assert estimate.source_sql == plan.stages[-1].estimate_sql
+    # The input (possibly a cached entry) keeps its helper columns
+    assert any(c.startswith("__approx_") for c in raw.frame.columns)
+
+
+def test_first_stage_scales_weights_up(run_query):
+    plan = plan_approximation("SELECT SUM(sales_amount) AS total FROM raw_sales_data", "duckdb", table_rows=BIG)
+    estimate = estimate_result(run_query(plan.stages[0].sql), plan, 0)
+    assert estimate.frame["total"].tolist() == [pytest.approx(6.0 * 20)]
+    assert not estimate.approximation.final
+    assert "±" in estimate.approximation.describe()
+
+
+def test_with_bounds_adds_a_column_after_each_estimate(run_query):
+    plan = plan_approximation("SELECT region, SUM(sales_amount) AS total FROM raw_sales_data GROUP BY region",
+                              "duckdb", table_rows=BIG)
+    estimate = estimate_result(run_query(plan.stages[-1].sql), plan, 1)
+    frame = estimate.approximation.with_bounds(estimate.frame)
+    assert list(frame.columns) == ["region", "total", "± total"]
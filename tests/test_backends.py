@@ -0,0 +1,10 @@
+from backends import default_url
+from settings import Settings
+
+
+def test_default_urls_come_from_settings():
+    settings = Settings({"AGENTIC_BI_DUCKDB_PATH": "/tmp/bi.duckdb", "AGENTIC_BI_PG_PASSWORD": "p@ss",
+                         "AGENTIC_BI_PG_HOST": "db"})
+    assert default_url("duckdb", settings) == "duckdb:////tmp/bi.duckdb"
+    assert default_url("postgres", settings) == "postgresql://postgres:p%40ss@db:5432/agentic_bi"
+    assert default_url("parquet", settings) == "duckdb:///:memory:"
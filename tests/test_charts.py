@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from charts import MAX_CATEGORIES, MAX_LINE_POINTS, OTHER_LABEL, lttb, plan_chart
+from query_result import QueryResult
+
+
+def test_lttb_keeps_ends_and_the_peak():
+    x = np.arange(1_000)
+    y = np.zeros(1_000)
+    y[500] = 100.0
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert 500 in kept
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_returns_everything_below_the_threshold():
+    assert list(lttb(np.arange(10), np.arange(10), 20)) == list(range(10))
+
+
+def test_time_series_is_downsampled():
+    days = pd.date_range("2020-01-01", periods=5_000, freq="h")
+    frame = pd.DataFrame({"order_date": days, "sales": np.random.default_rng(0).random(5_000)})
+    plan = plan_chart(QueryResult(frame))
+    assert plan.kind == "line"
+    assert plan.method == "lttb"
+    assert plan.points == MAX_LINE_POINTS
+
+
+def test_many_categories_become_top_n_plus_other():
+    frame = pd.DataFrame({"product": [f"p{i % 100}" for i in range(1_000)], "sales": 1.0})
+    plan = plan_chart(QueryResult(frame))
+    assert plan.kind == "bar"
+    assert plan.points == MAX_CATEGORIES + 1
+    assert plan.frame[plan.x].iloc[-1] == OTHER_LABEL
+    assert plan.frame[plan.y].sum() == 1_000
+
+
+def test_single_measure_is_a_histogram():
+    plan = plan_chart(QueryResult(pd.DataFrame({"sales": np.arange(500, dtype=float)})))
+    assert plan.kind == "histogram"
+    assert plan.frame["count"].sum() == 500
+
+
+def test_nothing_to_chart():
+    assert plan_chart(QueryResult(pd.DataFrame({"region": ["North", "South"]}))) is None
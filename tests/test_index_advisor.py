@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("sqlglot")
+
+import index_advisor  # noqa: E402
+from index_advisor import QueryLog, speedup_report  # noqa: E402
+
+BY_REGION = "SELECT SUM(sales_amount) FROM raw_sales_data WHERE region = 'North'"
+BY_CATEGORY = "SELECT SUM(sales_amount) FROM raw_sales_data WHERE category = 'Toys'"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(index_advisor.time, "time", lambda: now[0])
+    return now
+
+
+def test_each_statement_is_split_at_its_own_indexes(tmp_path, clock):
+    log = QueryLog(str(tmp_path / "log.sqlite"))
+    log.record(BY_REGION, 0.8)
+    log.record(BY_CATEGORY, 0.6)
+    clock[0] = 2000.0
+    log.record_applied("idx_advisor_raw_sales_data_region", "raw_sales_data", ("region",))
+    clock[0] = 2500.0
+    log.record(BY_REGION, 0.1)
+    log.record(BY_CATEGORY, 0.5)
+    clock[0] = 3000.0
+    # A later index on the same table serving only the category query
+    log.record_applied("idx_advisor_raw_sales_data_category", "raw_sales_data", ("category",))
+    clock[0] = 3500.0
+    log.record(BY_CATEGORY, 0.2)
+
+    report = {row["sql"]: row for row in speedup_report(log)}
+    # The region query's run at 2500 counts as "after" even though the category index came later
+    assert report[BY_REGION]["indexes"] == ["idx_advisor_raw_sales_data_region"]
+    assert (report[BY_REGION]["before_ms"], report[BY_REGION]["after_ms"]) == (800, 100)
+    # The category query's run at 2500 predates its index
+    assert report[BY_CATEGORY]["indexes"] == ["idx_advisor_raw_sales_data_category"]
+    assert (report[BY_CATEGORY]["before_runs"], report[BY_CATEGORY]["after_runs"]) == (2, 1)
+    assert report[BY_CATEGORY]["after_ms"] == 200
+
+
+def test_statements_no_index_serves_are_left_out(tmp_path, clock):
+    log = QueryLog(str(tmp_path / "log.sqlite"))
+    log.record("SELECT COUNT(*) FROM raw_sales_data", 0.5)
+    log.record_applied("idx_advisor_raw_sales_data_region", "raw_sales_data", ("region",))
+    clock[0] = 2000.0
+    log.record("SELECT COUNT(*) FROM raw_sales_data", 0.4)
+    assert speedup_report(log) == []
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("sqlglot")
+
+from parquet_store import prune_sql
+
+
+def test_prunes_date_filter_on_the_table():
+    sql = "SELECT SUM(sales_amount) FROM raw_sales_data WHERE order_date >= '2024-03-15'"
+    assert "order_month >= '2024-03'" in prune_sql(sql)
+
+
+def test_leaves_filter_on_derived_table_alone():
+    sql = ("SELECT order_date, SUM(s) FROM (SELECT order_date, sales_amount AS s FROM raw_sales_data) sub "
+           "WHERE order_date >= '2024-01-01' GROUP BY 1")
+    # The outer SELECT reads `sub`, which has no order_month column
+    assert prune_sql(sql) == sql
+
+
+def test_prunes_inside_derived_table():
+    sql = ("SELECT order_date, SUM(s) FROM (SELECT order_date, sales_amount AS s FROM raw_sales_data "
+           "WHERE order_date >= '2024-01-01') sub GROUP BY 1")
+    pruned = prune_sql(sql)
+    inner = pruned[pruned.index("(SELECT"):pruned.index(") AS sub")]
+    assert "order_month >= '2024-01'" in inner
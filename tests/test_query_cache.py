@@ -0,0 +1,54 @@
+from query_cache import (ResultCache, TableVersions, TranslationCache, canonicalize_sql, fingerprint,
+                         normalize_question, referenced_tables)
+
+
+def test_normalize_question():
+    assert normalize_question("  What is the TOTAL   sales amount? ") == "what is the total sales amount"
+
+
+def test_fingerprint_is_short_and_stable():
+    assert fingerprint("schema") == fingerprint("schema")
+    assert fingerprint("schema") != fingerprint("schema v2")
+    assert len(fingerprint("schema")) == 16
+
+
+def test_canonicalize_sql_keeps_quoted_text():
+    sql = "SELECT  Region, SUM(x)\n FROM raw_sales_data WHERE region = 'North  East' AND \"Odd Col\" > 1;"
+    assert canonicalize_sql(sql) == ("select region, sum(x) from raw_sales_data "
+                                     "where region = 'North  East' and \"Odd Col\" > 1")
+
+
+def test_referenced_tables_includes_comma_joins_and_subqueries():
+    assert referenced_tables("SELECT * FROM a, b WHERE x IN (SELECT y FROM c)") == ["a", "b", "c"]
+    assert referenced_tables("SELECT * FROM public.raw_sales_data r JOIN d ON r.id = d.id") == ["d", "raw_sales_data"]
+
+
+def test_referenced_tables_leaves_out_ctes():
+    sql = "WITH t AS (SELECT * FROM raw_sales_data) SELECT * FROM t"
+    assert referenced_tables(sql) == ["raw_sales_data"]
+
+
+def test_translation_cache_round_trip(tmp_path):
+    cache = TranslationCache(path=str(tmp_path / "cache.sqlite"))
+    key = cache.make_key("Sales by region?", "schema")
+    assert cache.make_key("  sales by REGION ", "schema") == key
+    assert cache.make_key("Sales by region?", "other schema") != key
+    assert cache.get(key) is None
+    cache.put(key, "Sales by region?", "SELECT 1")
+    assert cache.get(key) == "SELECT 1"
+
+
+def test_result_cache_key_changes_with_table_version(tmp_path):
+    versions = TableVersions(path=str(tmp_path / "cache.sqlite"))
+    cache = ResultCache(versions=versions)
+    key = cache.make_key("SELECT COUNT(*) FROM raw_sales_data")
+    cache.put(key, [(1,)])
+    assert cache.get(cache.make_key("select count(*)  from raw_sales_data;")) == [(1,)]
+    versions.bump("raw_sales_data")
+    assert cache.get(cache.make_key("SELECT COUNT(*) FROM raw_sales_data")) is None
+
+
+def test_result_cache_skips_statements_without_tables(tmp_path):
+    cache = ResultCache(versions=TableVersions(path=str(tmp_path / "cache.sqlite")))
+    assert cache.make_key("SELECT 1") is None
+    assert cache.make_key("DELETE FROM raw_sales_data") is None
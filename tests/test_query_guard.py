@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import create_engine
+
+from query_guard import ExecutionPolicy, QueryRejected, apply_row_cap, check_read_only, fetch_result
+
+
+def test_row_cap_asks_for_one_extra_row():
+    assert apply_row_cap("SELECT * FROM raw_sales_data", 100).endswith("LIMIT 101")
+
+
+def test_row_cap_keeps_a_smaller_limit():
+    sql = "SELECT * FROM raw_sales_data LIMIT 100"
+    assert apply_row_cap(sql, 100) == sql
+
+
+def test_row_cap_leaves_aggregates_alone():
+    sql = "SELECT region, SUM(sales_amount) FROM raw_sales_data GROUP BY region"
+    assert apply_row_cap(sql, 100) == sql
+
+
+def test_check_read_only_rejects_writes():
+    check_read_only("SELECT 1")
+    with pytest.raises(QueryRejected):
+        check_read_only("DELETE FROM raw_sales_data")
+    with pytest.raises(QueryRejected):
+        check_read_only("SELECT 1; DROP TABLE raw_sales_data")
+
+
+@pytest.mark.parametrize("rows, truncated", [(4, False), (5, False), (6, True), (50, True)])
+def test_truncated_only_past_the_cap(rows, truncated):
+    engine = create_engine("sqlite://")
+    policy = ExecutionPolicy(row_cap=5, batch_size=2)
+    sql = apply_row_cap(f"WITH RECURSIVE t(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM t WHERE x < {rows}) "
+                        f"SELECT x FROM t", policy.row_cap, "sqlite")
+    with engine.connect() as conn:
+        result = fetch_result(conn, sql, policy)
+    assert result.row_count == min(rows, 5)
+    assert result.truncated is truncated
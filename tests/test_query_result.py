@@ -0,0 +1,47 @@
+import decimal
+
+import pandas as pd
+
+from query_result import ColumnarBuilder
+
+
+def build(rows, columns=("a",), type_codes=None):
+    builder = ColumnarBuilder(list(columns), type_codes)
+    builder.append(rows)
+    return builder.finish()
+
+
+def test_ints_mixed_with_floats_become_float():
+    frame = build([(1,), (2.5,), (None,)]).frame
+    assert frame["a"].dtype == "float64"
+    assert frame["a"].tolist()[:2] == [1.0, 2.5]
+
+
+def test_ints_with_decimals_become_float():
+    assert build([(1,), (decimal.Decimal("2.5"),)]).frame["a"].tolist() == [1.0, 2.5]
+
+
+def test_ints_with_nulls_stay_integers():
+    assert str(build([(1,), (None,)]).frame["a"].dtype) == "Int64"
+
+
+def test_other_mixes_stay_object():
+    frame = build([("x",), (3,)]).frame
+    assert frame["a"].dtype == object
+    assert frame["a"].tolist() == ["x", 3]
+
+
+def test_postgres_type_codes_win_over_values():
+    result = build([(1,), (2,)], type_codes=[701])
+    assert result.db_types == {"a": "double precision"}
+    assert result.frame["a"].dtype == "float64"
+
+
+def test_duplicate_column_names_are_suffixed():
+    result = build([(1, 2)], columns=("sum", "sum"))
+    assert list(result.frame.columns) == ["sum", "sum_2"]
+
+
+def test_dates_become_datetimes():
+    frame = build([(pd.Timestamp("2024-01-02").date(),), (None,)]).frame
+    assert pd.api.types.is_datetime64_any_dtype(frame["a"])
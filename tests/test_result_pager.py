@@ -0,0 +1,93 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from query_result import QueryResult
+from result_pager import ResultPager, sql_literal
+
+ROWS = [(region, amount) for region in ("North", "South", None) for amount in (3, 1, 1, 1, None, 2)]
+
+
+@pytest.fixture
+def run_query():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE sales (region TEXT, amount INTEGER)")
+    connection.executemany("INSERT INTO sales VALUES (?, ?)", ROWS)
+
+    def run(sql):
+        return QueryResult(pd.read_sql_query(sql, connection), sql=sql)
+
+    yield run
+    connection.close()
+
+
+def make_pager(run_query, **kwargs):
+    sql = "SELECT region, amount FROM sales"
+    return ResultPager(QueryResult(run_query(sql).frame, sql=sql), run_query, **kwargs)
+
+
+def all_pages(pager):
+    rows = []
+    page = pager.fetch()
+    while True:
+        rows += list(page.frame.itertuples(index=False, name=None))
+        if not page.has_next:
+            return rows
+        page = pager.fetch(page.cursor)
+
+
+def normalized(rows):
+    return [tuple(None if pd.isna(v) else v for v in row) for row in rows]
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 4, 5])
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_cover_every_row_once_in_order(run_query, page_size, descending):
+    pager = make_pager(run_query, page_size=page_size, sort="amount", descending=descending)
+    expected = run_query(f"SELECT region, amount FROM sales ORDER BY {pager.order_sql()}").frame
+    assert normalized(all_pages(pager)) == normalized(expected.itertuples(index=False, name=None))
+
+
+def test_duplicate_run_longer_than_a_page(run_query):
+    # ("North", 1) repeats three times: a page of 2 must not loop or drop one
+    pager = make_pager(run_query, page_size=2, sort="region")
+    assert sorted(normalized(all_pages(pager)), key=repr) == sorted(normalized(ROWS), key=repr)
+
+
+def test_seek_sql_expands_keys_with_nulls_last(run_query):
+    pager = make_pager(run_query, sort="amount", descending=True)
+    assert pager.seek_sql((2, "North")) == (
+        '(("amount" < 2 OR "amount" IS NULL)) OR '
+        '("amount" = 2 AND ("region" > \'North\' OR "region" IS NULL)) OR '
+        '("amount" = 2 AND "region" = \'North\')'
+    )
+
+
+def test_seek_sql_after_null_only_matches_nulls(run_query):
+    pager = make_pager(run_query, sort="amount")
+    assert pager.seek_sql((None, None)) == '("amount" IS NULL AND "region" IS NULL)'
+
+
+def test_page_sql_skips_ties_with_offset(run_query):
+    pager = make_pager(run_query, page_size=2, sort="amount")
+    sql = pager.page_sql({"values": (1, "North"), "ties": 2, "number": 2})
+    assert sql.endswith("LIMIT 3 OFFSET 2")
+
+
+def test_filters_are_pushed_down(run_query):
+    pager = make_pager(run_query, page_size=3, filters=[("region", "contains", "nor")])
+    assert all(region == "North" for region, _ in all_pages(pager))
+
+
+@pytest.mark.parametrize("value, literal", [
+    (None, "NULL"),
+    (float("nan"), "NULL"),
+    (True, "TRUE"),
+    (2.5, "2.5"),
+    ("O'Hara", "'O''Hara'"),
+    (pd.Timestamp("2024-03-01"), "'2024-03-01'"),
+    (pd.Timestamp("2024-03-01 10:30"), "'2024-03-01 10:30:00'"),
+])
+def test_sql_literal(value, literal):
+    assert sql_literal(value) == literal
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("sqlglot")
+
+from rollups import ROLLUPS, RollupRouter
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    router = RollupRouter(engine=None, audit_log_path=str(tmp_path / "rewrites.jsonl"))
+    monkeypatch.setattr(router, "available_rollups", lambda: set(ROLLUPS))
+    monkeypatch.setattr(router, "has_undated_rows", lambda: False)
+    return router
+
+
+def test_routes_sum_by_dimension(router):
+    sql = router.rewrite("SELECT region, SUM(sales_amount) FROM raw_sales_data GROUP BY region")
+    assert "mv_sales_by_dims" in sql
+    assert "SUM(total_sales)" in sql
+
+
+def test_maps_measures(router):
+    sql = router.rewrite("SELECT COUNT(*), COUNT(sales_amount), MIN(sales_amount), MAX(sales_amount) "
+                         "FROM raw_sales_data")
+    assert "SUM(order_count)" in sql
+    assert "SUM(sales_count)" in sql
+    assert "MIN(min_sales)" in sql
+    assert "MAX(max_sales)" in sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT MAX(order_date) FROM raw_sales_data",
+    "SELECT MIN(order_date) FROM raw_sales_data WHERE region = 'North'",
+    "SELECT COUNT(region) FROM raw_sales_data",
+    "SELECT SUM(sales_amount * 2) FROM raw_sales_data",
+    "SELECT region, SUM(category) FROM raw_sales_data GROUP BY region",
+])
+def test_leaves_aggregates_without_a_measure_alone(router, sql):
+    assert router.rewrite(sql) == sql
+
+
+def test_min_max_of_dimension_reads_the_dimension(router):
+    sql = router.rewrite("SELECT region, MAX(category) FROM raw_sales_data GROUP BY region")
+    assert "MAX(category)" in sql
+    assert "max_sales" not in sql
+
+
+def test_month_grain_uses_month_rollup(router):
+    sql = router.rewrite("SELECT date_trunc('month', order_date::date) AS m, SUM(sales_amount) "
+                         "FROM raw_sales_data GROUP BY 1")
+    assert "mv_sales_by_month" in sql
+
+
+def test_date_filter_stays_on_base_table_with_undated_rows(router, monkeypatch):
+    sql = ("SELECT region, SUM(sales_amount) FROM raw_sales_data "
+           "WHERE order_date >= '2024-01-01' GROUP BY region")
+    assert "mv_sales_by_day" in router.rewrite(sql)
+    monkeypatch.setattr(router, "has_undated_rows", lambda: True)
+    assert router.rewrite(sql) == sql
+    # Without a date filter the NULL day is summed like any other
+    assert "mv_sales_by_dims" in router.rewrite("SELECT SUM(sales_amount) FROM raw_sales_data")
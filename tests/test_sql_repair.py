@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("sqlglot")
+
+from sql_repair import SqlValidationError, strip_markdown, validate_sql
+
+TABLES = {"raw_sales_data": {"columns": [{"name": name} for name in (
+    "order_id", "order_date", "region", "category", "customer_id", "customer_type", "sales_amount")]}}
+
+
+def test_runnable_sql_comes_back_unchanged():
+    sql = "SELECT region, SUM(sales_amount) FROM raw_sales_data GROUP BY region"
+    checked = validate_sql(sql, TABLES)
+    assert checked.ok and not checked.repaired
+    assert checked.sql == sql
+
+
+def test_strips_fences_and_chatter():
+    sql, fixes = strip_markdown("Here you go:\n```sql\nSELECT 1\n```")
+    assert sql == "SELECT 1"
+    assert fixes
+
+
+def test_repairs_a_one_letter_typo():
+    checked = validate_sql("SELECT AVG(sale_amount) FROM raw_sales_data", TABLES)
+    assert checked.ok
+    assert "sales_amount" in checked.sql
+
+
+def test_repairs_case_of_a_quoted_column():
+    checked = validate_sql('SELECT "Region" FROM raw_sales_data', TABLES)
+    assert checked.ok
+    assert '"Region"' not in checked.sql
+
+
+def test_double_quoted_value_becomes_a_string():
+    checked = validate_sql('SELECT * FROM raw_sales_data WHERE region = "North"', TABLES)
+    assert checked.ok
+    assert "'North'" in checked.sql
+
+
+@pytest.mark.parametrize("column", ["order_time", "customer_idx_2", "order_month"])
+def test_does_not_guess_at_other_columns(column):
+    checked = validate_sql(f"SELECT {column} FROM raw_sales_data", TABLES)
+    assert not checked.ok
+    assert not checked.repaired
+
+
+def test_same_problem_is_reported_once():
+    checked = validate_sql("SELECT order_month, SUM(sales_amount) FROM raw_sales_data GROUP BY order_month", TABLES)
+    assert len(checked.problems) == 1
+    assert len(SqlValidationError(checked.problems * 2).problems) == 1
+
+
+def test_unknown_table_is_a_problem():
+    assert not validate_sql("SELECT * FROM sales", TABLES).ok
+
+
+def test_syntax_error_is_a_problem():
+    checked = validate_sql("SELECT FROM WHERE", TABLES)
+    assert not checked.ok
+
+
+def test_repair_cache_remembers_a_fix_per_schema(tmp_path):
+    from query_cache import RepairCache
+
+    cache = RepairCache(path=str(tmp_path / "cache.sqlite"))
+    broken = "SELECT AVG(sale_amount) FROM raw_sales_data"
+    fixed = validate_sql(broken, TABLES).sql
+    cache.put(cache.make_key(broken, "duckdb\nschema"), broken, fixed)
+    assert cache.get(cache.make_key("select avg(sale_amount)  from raw_sales_data;", "duckdb\nschema")) == fixed
+    assert cache.get(cache.make_key(broken, "duckdb\nschema v2")) is None
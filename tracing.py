@@ -0,0 +1,321 @@
+"""
+Tracing for Agentic BI
+Lightweight spans around every stage of answering a question (quota wait,
+Gemini call, SQL validation, execution, fetch, DataFrame build, rendering)
+and of ingestion, written as OTLP-shaped JSON lines and kept in memory for
+the Streamlit performance panel
+
+    with span("sql.execute", rows=0) as s:
+        ...
+        s.set(rows=len(rows))
+
+AGENTIC_BI_TRACE=0 turns tracing off: span() then returns a shared no-op
+object, so instrumented code pays one function call per stage.
+"""
+import atexit
+import contextvars
+import json
+import math
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+
+TRACE_ENABLED = os.getenv("AGENTIC_BI_TRACE", "1").lower() not in ("0", "false", "no", "off")
+# JSON lines file ("" keeps spans in memory only)
+TRACE_PATH = os.getenv("AGENTIC_BI_TRACE_FILE", os.path.join(".cache", "traces.jsonl"))
+# Size at which the file is rotated to <path>.1 (one old file is kept)
+TRACE_MAX_BYTES = int(float(os.getenv("AGENTIC_BI_TRACE_MAX_MB", 50)) * 1024 * 1024)
+SERVICE_NAME = "agentic-bi"
+
+_current_span = contextvars.ContextVar("agentic_bi_span", default=None)
+
+
+class Span:
+    """
+    One timed stage; nested spans share the trace id of the outermost one
+
+    Field names follow the OpenTelemetry span model (trace_id, span_id,
+    parent_span_id, start/end_time_unix_nano, attributes, status).
+    """
+    __slots__ = ("tracer", "name", "attributes", "trace_id", "span_id", "parent_span_id",
+                 "start_ns", "end_ns", "_perf_start", "duration_ms", "status", "_token")
+
+    def __init__(self, tracer, name, attributes):
+        parent = _current_span.get()
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.span_id = secrets.token_hex(8)
+        self.status = "OK"
+
+    def set(self, **attributes):
+        """Add attributes (row counts, token counts, ...)"""
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        self._perf_start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ns = time.perf_counter_ns() - self._perf_start
+        self.end_ns = self.start_ns + elapsed_ns
+        self.duration_ms = elapsed_ns / 1e6
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "ERROR"
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"[:500]
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "pid": os.getpid(),
+        }
+
+
+class _NoopSpan:
+    """What span() returns while tracing is disabled"""
+    __slots__ = ()
+
+    def set(self, **attributes):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _percentile(ordered, pct):
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)] if ordered else None
+
+
+class Tracer:
+    """
+    Collects finished spans: a ring buffer for the UI plus a JSONL exporter
+
+    Spans are buffered and appended to the file whenever a trace's root span
+    ends (or every `flush_every` spans), one JSON object per line, so the
+    file can be tailed, loaded with pandas, or converted with
+    otlp_payload() and posted to any OTLP/HTTP collector. Once the file
+    would pass `max_bytes` it is renamed to <path>.1 (replacing the previous
+    one) and a new file is started, so disk use stays below 2 x max_bytes.
+
+    Args:
+        path: JSON lines file ("" / None = memory only)
+        enabled: Record spans at all
+        keep: Finished spans kept in memory for recent_traces() / stage_stats()
+        flush_every: Max spans buffered before writing
+        max_bytes: Rotate the file at this size (None = never)
+    """
+
+    def __init__(self, path=TRACE_PATH, enabled=TRACE_ENABLED, keep=5000, flush_every=64,
+                 max_bytes=TRACE_MAX_BYTES):
+        self.path = path
+        self.enabled = enabled
+        self.flush_every = flush_every
+        self.max_bytes = max_bytes
+        self.recent = deque(maxlen=keep)
+        self._buffer = []
+        self._lock = threading.Lock()
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def span(self, name, **attributes):
+        """Context manager timing one stage (a no-op while disabled)"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def record(self, name, start_ns, duration_ms, **attributes):
+        """
+        Add a root span the caller timed itself, for work a with block can't
+        wrap (e.g. a whole Streamlit script run)
+        """
+        if not self.enabled:
+            return
+        recorded = Span(self, name, attributes)
+        recorded.start_ns = start_ns
+        recorded.end_ns = start_ns + int(duration_ms * 1e6)
+        recorded.duration_ms = duration_ms
+        self._finish(recorded)
+
+    def _finish(self, span):
+        record = span.to_dict()
+        with self._lock:
+            self.recent.append(record)
+            if not self.path:
+                return
+            self._buffer.append(record)
+            if span.parent_span_id is None or len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in self._buffer)
+        self._buffer = []
+        try:
+            self._rotate_if_full(len(lines))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"⚠️ Trace export failed: {e}", file=sys.stderr)
+
+    def _rotate_if_full(self, incoming):
+        if not self.max_bytes:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size and size + incoming > self.max_bytes:
+            os.replace(self.path, f"{self.path}.1")
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def recent_traces(self, root=None, limit=10):
+        """
+        Latest finished traces, newest first, as per-stage breakdowns
+
+        Returns:
+            [{"name", "duration_ms", "attributes", "stages": {stage: ms}}]
+            where stages sums the durations of every descendant span by name
+        """
+        with self._lock:
+            spans = list(self.recent)
+        children = {}
+        for record in spans:
+            if record["parent_span_id"] is not None:
+                children.setdefault(record["parent_span_id"], []).append(record)
+        traces = []
+        for record in reversed(spans):
+            if record["parent_span_id"] is not None or (root is not None and record["name"] != root):
+                continue
+            stages = {}
+            pending = list(children.get(record["span_id"], []))
+            while pending:
+                child = pending.pop()
+                stages[child["name"]] = stages.get(child["name"], 0.0) + child["duration_ms"]
+                pending.extend(children.get(child["span_id"], []))
+            traces.append({"name": record["name"], "duration_ms": record["duration_ms"],
+                           "attributes": record["attributes"], "stages": stages})
+            if len(traces) >= limit:
+                break
+        return traces
+
+    def stage_stats(self, window=500):
+        """Rolling count / p50 / p95 / p99 (ms) per span name over the last `window` spans"""
+        with self._lock:
+            spans = list(self.recent)[-window:]
+        durations = {}
+        for record in spans:
+            durations.setdefault(record["name"], []).append(record["duration_ms"])
+        stats = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            stats[name] = {"count": len(values), "p50_ms": _percentile(values, 50),
+                           "p95_ms": _percentile(values, 95), "p99_ms": _percentile(values, 99)}
+        return stats
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Process-wide tracer configured from AGENTIC_BI_TRACE / AGENTIC_BI_TRACE_FILE"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+                atexit.register(_tracer.flush)
+    return _tracer
+
+
+def span(name, **attributes):
+    """Time a stage with the process-wide tracer (see Tracer.span)"""
+    return get_tracer().span(name, **attributes)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(records):
+    """OTLP/HTTP JSON (ExportTraceServiceRequest) for span records from the JSONL file"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "agentic_bi.tracing"},
+            "spans": [{
+                "traceId": record["trace_id"],
+                "spanId": record["span_id"],
+                **({"parentSpanId": record["parent_span_id"]} if record["parent_span_id"] else {}),
+                "name": record["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(record["start_time_unix_nano"]),
+                "endTimeUnixNano": str(record["end_time_unix_nano"]),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in record["attributes"].items()],
+                "status": {"code": 2 if record["status"] == "ERROR" else 1},
+            } for record in records],
+        }],
+    }]}
+
+
+def load_spans(path=TRACE_PATH):
+    """Span records from a JSONL trace file"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize or convert the span log")
+    parser.add_argument("--file", default=TRACE_PATH, help="JSONL trace file")
+    parser.add_argument("--otlp", help="Write the spans as OTLP/HTTP JSON to this file")
+    args = parser.parse_args()
+
+    records = load_spans(args.file)
+    if args.otlp:
+        with open(args.otlp, "w", encoding="utf-8") as f:
+            json.dump(otlp_payload(records), f)
+        print(f"✅ {len(records):,} spans written to {args.otlp}")
+    else:
+        summary = Tracer(path="", keep=len(records) or 1)
+        summary.recent.extend(records)
+        print(f"{'stage':<28} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for name, stats in summary.stage_stats(window=len(records)).items():
+            print(f"{name:<28} {stats['count']:>7,} {stats['p50_ms']:>10.1f} "
+                  f"{stats['p95_ms']:>10.1f} {stats['p99_ms']:>10.1f}")